@@ -1,12 +1,67 @@
-"""Entrée principale pour l'API IKOMA BRIDGE.
+"""Entrée principale pour l'API IKOMA BRIDGE (FastAPI, JSON).
 
-Ce module accueillera ultérieurement un framework (FastAPI/Flask/Express via API Gateway) ;
-il liste dès à présent les endpoints attendus pour cadrer l'implémentation.
+Les déploiements passent par la file de jobs SQLite partagée avec le Runner
+(`core.store.job_store`) : `POST /deployments` répond immédiatement (202) avec
+l'identifiant du job, exécuté ensuite par un `WorkerPool`. L'identifiant d'un
+déploiement est celui de son job ; le run associé (`deployment_runs.job_id`)
+fournit le commit, le statut et la durée de chaque étape.
+
+Pour les scrutateurs :
+- chaque GET renvoie un `ETag` ; un `If-None-Match` identique donne un 304 sans corps ;
+- `GET /deployments/{id}?wait=30` attend (long-polling) jusqu'à 30 s que l'état
+  diffère de l'ETag fourni dans `If-None-Match` ;
+- `GET /deployments/{id}/events` diffuse chaque changement d'état en SSE jusqu'à la fin du job ;
+- les listes sont paginées par curseur (`cursor` = `next_cursor` de la page précédente).
+
+`POST /deployments` avec `"dry_run": true` renvoie directement (200) le plan du
+déploiement (`core.deploy.plan`) sans créer de job.
+
+`POST /hooks/git` reçoit les webhooks `push` (GitHub, Gitea) signés par
+`IKOMA_WEBHOOK_SECRET` et met en file, pour chaque app de `app_configs` suivant
+ce dépôt et cette branche, un déploiement différé qui fusionne les pushes
+rapprochés (`core.scm.webhooks`).
+
+`POST /manifests/validate` valide un `ikoma.release.json` avec le même schéma
+et le même cache que `deploy_up` et `ikoma manifest check`.
+
+Lancement : `python -m api.app` ou `uvicorn api.app:create_app --factory`.
+Par défaut l'API ne fait que mettre les jobs en file : le Runner, qui partage la
+base, les exécute. `IKOMA_API_WORKERS=N` démarre en plus N workers dans l'API
+(API seule, sans Runner). Les baux de `JobStore` empêchent les deux pools de
+reprendre les jobs l'un de l'autre.
 """
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from core.deploy.manifest import ManifestError, errors_payload, manifest_summary, parse_release_manifest
+from core.pipelines.workers import WorkerPool, default_handlers
+from core.scm import webhooks
+from core.scm.webhooks import WebhookError
+from core.store.db import get_database
+from core.store.job_store import JOB_FAILED, JOB_SUCCEEDED, Job, JobStore
+from core.store.sqlite_store import DeploymentState
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_WAIT = 60.0  # secondes, long-polling
+POLL_INTERVAL = 0.5  # secondes
+HEARTBEAT_INTERVAL = 15.0  # secondes, SSE
+DEPLOYMENT_KINDS = ("deploy", "rollback")
+_FINISHED = {JOB_SUCCEEDED, JOB_FAILED}
 
 
 @dataclass(frozen=True)
@@ -21,12 +76,16 @@ class ApiEndpoint:
 EXPECTED_ENDPOINTS: List[ApiEndpoint] = [
     ApiEndpoint("GET", "/health", "Vérifier l'état du service API."),
     ApiEndpoint("POST", "/deployments", "Déclencher un déploiement vers un environnement."),
+    ApiEndpoint("GET", "/deployments", "Lister les déploiements (paginé)."),
     ApiEndpoint(
         "POST",
         "/deployments/{id}/rollback",
         "Ordonner un rollback vers une release précédente pour un déploiement donné.",
     ),
     ApiEndpoint("GET", "/deployments/{id}", "Consulter l'état et les journaux d'un déploiement."),
+    ApiEndpoint("GET", "/deployments/{id}/events", "Suivre les changements d'état d'un déploiement (SSE)."),
+    ApiEndpoint("POST", "/hooks/git", "Webhook push Git signé : déploiements différés et fusionnés."),
+    ApiEndpoint("GET", "/apps/{app_id}/runs", "Historique des runs d'une application (paginé)."),
     ApiEndpoint("POST", "/pipelines/run", "Démarrer un pipeline Lovable → GitHub → VPS."),
     ApiEndpoint("POST", "/supabase/ensure", "Vérifier et initialiser les ressources Supabase nécessaires."),
     ApiEndpoint("POST", "/backup/run", "Lancer un backup applicatif/infra."),
@@ -34,19 +93,253 @@ EXPECTED_ENDPOINTS: List[ApiEndpoint] = [
 ]
 
 
-def create_app() -> None:
-    """Prépare et renvoie l'application serveur.
+class DeploymentRequest(BaseModel):
+    app_id: str
+    ref: Optional[str] = None  # défaut : branche de la configuration Runner, sinon `main`
+    remote_url: Optional[str] = None  # défaut : dépôt de la configuration Runner
+    force: bool = False
+    dry_run: bool = False  # renvoie le plan (200) sans créer de job
+
+
+class RollbackRequest(BaseModel):
+    to_run_id: Optional[int] = None
+    reason: Optional[str] = None
+
+
+def create_app(
+    db_path: Path | None = None, *, workers: int | None = None, webhook_secret: str | None = None
+) -> FastAPI:
+    """Construit l'application FastAPI sur la base SQLite `db_path` (défaut `data/ikoma.db`).
 
-    Cette fonction contiendra la configuration du framework (routes, middlewares, auth) et
-    branchera les handlers Core. Elle reste vide tant que la pile technique n'est pas choisie.
+    `webhook_secret` vaut par défaut `IKOMA_WEBHOOK_SECRET` ; sans secret, `/hooks/git` répond 503.
     """
+    from core.deploy.deploy_up import DB_PATH
+    from runner.config_store import AppConfigStore
+
+    db_path = Path(db_path or DB_PATH)
+    database = get_database(db_path)
+    job_store = JobStore(db_path)
+    deployment_state = DeploymentState(db_path)
+    config_store = AppConfigStore(db_path)
+    if workers is None:
+        workers = int(os.getenv("IKOMA_API_WORKERS", "0"))
+    worker_pool = WorkerPool(job_store, default_handlers(), size=workers) if workers > 0 else None
+    if webhook_secret is None:
+        webhook_secret = os.getenv("IKOMA_WEBHOOK_SECRET")
+    debounce, max_delay = webhooks.webhook_settings()
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        database.migrate()
+        if worker_pool is not None:
+            worker_pool.start()
+        try:
+            yield
+        finally:
+            if worker_pool is not None:
+                worker_pool.stop()
+
+    app = FastAPI(title="IKOMA BRIDGE API", version="0.1.0", lifespan=lifespan)
+
+    # --- Helpers ---
+    def submit(kind: str, app_id: str, payload: Dict[str, Any]) -> Tuple[Job, bool]:
+        if worker_pool is not None:
+            return worker_pool.submit(kind, app_id, payload)
+        return job_store.enqueue(kind, app_id, payload)
+
+    def deployment(job_id: int) -> Optional[Dict[str, Any]]:
+        job = job_store.get(job_id)
+        if job is None or job.kind not in DEPLOYMENT_KINDS:
+            return None
+        return {**job.to_dict(), "run": deployment_state.run_for_job(job_id)}
+
+    async def require_deployment(job_id: int) -> Dict[str, Any]:
+        payload = await run_in_threadpool(deployment, job_id)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Déploiement inconnu")
+        return payload
+
+    def accepted(job: Job, created: bool) -> JSONResponse:
+        url = f"/deployments/{job.id}"
+        return JSONResponse(
+            {"id": job.id, "kind": job.kind, "status": job.status, "created": created, "url": url},
+            status_code=202,
+            headers={"Location": url},
+        )
+
+    # --- Routes ---
+    @app.get("/health")
+    def health() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.post("/deployments", status_code=202)
+    def create_deployment(body: DeploymentRequest) -> JSONResponse:
+        app_id = body.app_id.strip()
+        if not app_id:
+            raise HTTPException(status_code=400, detail="app_id est requis")
+        config = config_store.get(app_id)
+        payload: Dict[str, Any] = {
+            "ref": (body.ref or "").strip() or (config.branch if config else "") or "main",
+            "remote_url": body.remote_url or (config.repo_git_url if config else None),
+        }
+        if body.dry_run:
+            from core.deploy.deploy_up import plan_deploy
+
+            plan = plan_deploy(app_id, payload["ref"], remote_url=payload["remote_url"])
+            return JSONResponse(plan.to_dict())
+        if body.force:
+            payload["force"] = True
+        return accepted(*submit("deploy", app_id, payload))
+
+    @app.get("/deployments")
+    def list_deployments(
+        request: Request,
+        app_id: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[int] = None,
+    ) -> Response:
+        jobs = job_store.list_jobs(app_id, limit=limit, before_id=cursor, kinds=DEPLOYMENT_KINDS)
+        items = [job.to_dict() for job in jobs]
+        return conditional_json(request, {"items": items, "next_cursor": _next_cursor(items, limit, "id")})
 
-    # Exemple futur : app = FastAPI(...); déclarer routes et dépendances ici.
-    # return app
-    return None
+    @app.get("/deployments/{job_id}")
+    async def get_deployment(
+        request: Request, job_id: int, wait: float = Query(0, ge=0, le=MAX_WAIT)
+    ) -> Response:
+        payload = await require_deployment(job_id)
+        known = _if_none_match(request)
+        deadline = time.monotonic() + wait
+        # Long-polling : on ne répond qu'au premier changement ou à l'échéance.
+        while _etag(payload) in known and time.monotonic() < deadline and not await request.is_disconnected():
+            await asyncio.sleep(POLL_INTERVAL)
+            payload = await require_deployment(job_id)
+        return conditional_json(request, payload)
+
+    @app.get("/deployments/{job_id}/events")
+    async def deployment_events(request: Request, job_id: int) -> StreamingResponse:
+        await require_deployment(job_id)
+        return StreamingResponse(
+            _status_events(job_id, deployment, request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/deployments/{job_id}/rollback", status_code=202)
+    async def rollback_deployment(job_id: int, body: Optional[RollbackRequest] = None) -> JSONResponse:
+        target = await require_deployment(job_id)
+        body = body or RollbackRequest()
+        payload = {key: value for key, value in body.model_dump().items() if value is not None}
+        return accepted(*await run_in_threadpool(submit, "rollback", target["app_id"], payload))
+
+    def enqueue_push(event: webhooks.PushEvent) -> List[Dict[str, Any]]:
+        queued = []
+        for config in webhooks.match_apps(config_store.list_configs(), event):
+            job, created = job_store.enqueue_coalesced(
+                "deploy",
+                config.app_id,
+                webhooks.deploy_payload(config, event),
+                coalesce_key=webhooks.coalesce_key(config.app_id, event.branch),
+                delay=debounce,
+                max_delay=max_delay,
+            )
+            queued.append({"id": job.id, "app_id": job.app_id, "created": created, "not_before": job.not_before})
+        return queued
+
+    @app.post("/hooks/git")
+    async def git_hook(request: Request) -> JSONResponse:
+        """Push signé → un déploiement différé par app suivie, fusionné avec le précédent encore en file."""
+
+        body = await request.body()
+        try:
+            webhooks.verify_signature(webhook_secret, body, request.headers)
+            event_name = webhooks.event_name(request.headers)
+            if event_name != "push":
+                return JSONResponse({"status": "ignored", "reason": f"événement {event_name}"})
+            event = webhooks.parse_push(body, request.headers)
+        except WebhookError as exc:
+            raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
+        if not event.deployable:
+            return JSONResponse({"status": "ignored", "reason": "tag ou branche supprimée"})
+        jobs = await run_in_threadpool(enqueue_push, event)
+        if not jobs:
+            return JSONResponse({"status": "ignored", "reason": "aucune application ne suit ce dépôt et cette branche"})
+        return JSONResponse(
+            {"status": "queued", "branch": event.branch, "commit": event.after, "jobs": jobs}, status_code=202
+        )
+
+    @app.post("/manifests/validate")
+    async def validate_manifest(request: Request) -> JSONResponse:
+        """Valide un `ikoma.release.json` envoyé tel quel : 200 et sa forme normalisée, ou 422 et les erreurs."""
+
+        try:
+            manifest = parse_release_manifest(await request.body(), "ikoma.release.json")
+        except ManifestError as exc:
+            return JSONResponse({"valid": False, "errors": errors_payload(exc.errors)}, status_code=422)
+        return JSONResponse({"valid": True, "manifest": manifest_summary(manifest)})
+
+    @app.get("/apps/{app_id}/runs")
+    def list_runs(
+        request: Request,
+        app_id: str,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[int] = None,
+    ) -> Response:
+        items = deployment_state.list_runs(app_id, limit=limit, before_run_id=cursor)
+        return conditional_json(request, {"items": items, "next_cursor": _next_cursor(items, limit, "run_id")})
+
+    return app
+
+
+def conditional_json(request: Request, payload: Dict[str, Any]) -> Response:
+    """Réponse JSON avec `ETag`, ou 304 si le client possède déjà cette version."""
+
+    etag = _etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in _if_none_match(request):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+def _etag(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'  # nosec - empreinte de cache
+
+
+def _if_none_match(request: Request) -> Set[str]:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+def _next_cursor(items: List[Dict[str, Any]], limit: int, key: str) -> Optional[int]:
+    return items[-1][key] if len(items) == limit else None
+
+
+async def _status_events(job_id: int, load, request: Request) -> AsyncIterator[str]:
+    """Un événement `status` par changement d'état, jusqu'à la fin du job."""
+
+    last_etag, idle = None, 0.0
+    while not await request.is_disconnected():
+        payload = await run_in_threadpool(load, job_id)
+        if payload is None:
+            return
+        etag = _etag(payload)
+        if etag != last_etag:
+            last_etag, idle = etag, 0.0
+            yield f"id: {etag}\nevent: status\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+            if payload["status"] in _FINISHED:
+                return
+        await asyncio.sleep(POLL_INTERVAL)
+        idle += POLL_INTERVAL
+        if idle >= HEARTBEAT_INTERVAL:
+            idle = 0.0
+            yield ": keep-alive\n\n"
 
 
 if __name__ == "__main__":
-    # Démarrage manuel (placeholder). À remplacer par un serveur réel (uvicorn/express).
-    create_app()
-    print("API IKOMA BRIDGE : serveur non implémenté (stub).")
+    import uvicorn
+
+    uvicorn.run(
+        create_app(),
+        host=os.getenv("IKOMA_API_HOST", "127.0.0.1"),
+        port=int(os.getenv("IKOMA_API_PORT", "8001")),
+    )
@@ -0,0 +1 @@
+"""Benchmarks IKOMA BRIDGE (exécution manuelle : `python -m benchmarks.<module>`)."""
@@ -0,0 +1,264 @@
+"""Surcoût du pipeline `deploy_up` de bout en bout, sans Docker ni réseau.
+
+Pour chaque taille de lot (`--apps 1,10,100`), un environnement neuf est créé :
+- faux binaire `docker` (`fixtures/fake_docker`) avec latences configurables ;
+- un remote Git local par app, de taille (`--files`, `--file-kb`) et de
+  profondeur d'historique (`--commits`) configurables ;
+- un serveur HTTP local qui répond `/health` comme `fixtures/sample_app/app.py`.
+
+Chaque app est déployée à froid (clone, pull, up, healthcheck), puis redéployée
+sans changement (chemin rapide). Les durées totales et par étape (p50/p95)
+sont affichées ; `--save` les écrit en JSON et `--compare` signale les
+régressions au-delà de `--threshold` par rapport à une référence (code 1).
+
+Usage :
+    python -m benchmarks.bench_deploy_pipeline --apps 1,10,100 --save baseline.json
+    python -m benchmarks.bench_deploy_pipeline --apps 1,10,100 --compare baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+FAKE_DOCKER_DIR = Path(__file__).resolve().parents[1] / "fixtures" / "fake_docker"
+_GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@ikoma.local",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@ikoma.local",
+}
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802 - API http.server
+        if self.path == "/health":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "16")
+            self.end_headers()
+            self.wfile.write(b'{"status": "ok"}')
+            return
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(["git", *args], cwd=repo, check=True, stdout=subprocess.DEVNULL, env={**os.environ, **_GIT_ENV})
+
+
+def build_template_remote(root: Path, health_url: str, files: int, file_kb: int, commits: int) -> Path:
+    """Dépôt applicatif : compose, manifest et `files` fichiers de `file_kb` Ko répartis sur `commits` commits."""
+
+    remote = root / "template"
+    remote.mkdir(parents=True)
+    _git(remote, "init", "-q", "-b", "main")
+    (remote / "docker-compose.yml").write_text("services:\n  web:\n    image: demo:latest\n")
+    manifest = {"compose": "docker-compose.yml", "services": ["web"], "health": {"url": health_url, "timeout": 10}}
+    (remote / "ikoma.release.json").write_text(json.dumps(manifest))
+    per_commit = max(1, math.ceil(files / max(1, commits)))
+    written = 0
+    for index in range(max(1, commits)):
+        for _ in range(min(per_commit, files - written)):
+            target = remote / "src" / f"module_{written:05d}.bin"
+            target.parent.mkdir(exist_ok=True)
+            target.write_bytes(os.urandom(file_kb * 1024))
+            written += 1
+        (remote / "VERSION").write_text(f"{index}\n")
+        _git(remote, "add", ".")
+        _git(remote, "commit", "-q", "-m", f"commit {index}")
+    return remote
+
+
+@contextlib.contextmanager
+def deploy_environment(root: Path, args: argparse.Namespace) -> Iterator[str]:
+    """Redirige `data/`, le cache Git et `docker` vers `root` ; renvoie l'URL de santé."""
+
+    deploy_module = importlib.import_module("core.deploy.deploy_up")
+    from core.logging import logger as logger_module
+    from core.scm import git_repo
+
+    data_dir = root / "data"
+    patches = {
+        (deploy_module, "DATA_DIR"): data_dir,
+        (deploy_module, "REPOS_DIR"): data_dir / "repos",
+        (deploy_module, "LOGS_DIR"): data_dir / "logs",
+        (deploy_module, "DB_PATH"): data_dir / "ikoma.db",
+        (git_repo, "GIT_CACHE_DIR"): data_dir / "git-cache",
+        (logger_module, "_COMMAND_STORE"): None,
+    }
+    env = {
+        "PATH": f"{FAKE_DOCKER_DIR}:{os.environ['PATH']}",
+        "FAKE_DOCKER_STATE": str(root / "docker-state.json"),
+        "FAKE_DOCKER_LATENCY": str(args.docker_latency),
+        "FAKE_DOCKER_UP_DELAY": str(args.up_delay),
+        "FAKE_DOCKER_PULL_DELAY": str(args.pull_delay),
+    }
+    saved_attrs = {key: getattr(*key) for key in patches}
+    saved_env = {key: os.environ.get(key) for key in env}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for (module, name), value in patches.items():
+            setattr(module, name, value)
+        os.environ.update(env)
+        yield f"http://127.0.0.1:{server.server_address[1]}/health"
+    finally:
+        server.shutdown()
+        server.server_close()
+        for (module, name), value in saved_attrs.items():
+            setattr(module, name, value)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * percent / 100)) - 1]
+
+
+def _summary(reports: List[Any], wall: float) -> Dict[str, Any]:
+    totals = [sum(stage.duration for stage in report.stages if stage.name != "pull") for report in reports]
+    stages: Dict[str, List[float]] = {}
+    for report in reports:
+        for name, duration in report.stage_durations().items():
+            stages.setdefault(name, []).append(duration)
+    return {
+        "wall_s": round(wall, 4),
+        "deploy_p50_s": round(_percentile(totals, 50), 4),
+        "deploy_p95_s": round(_percentile(totals, 95), 4),
+        "stages": {
+            name: {"p50_s": round(_percentile(values, 50), 4), "p95_s": round(_percentile(values, 95), 4)}
+            for name, values in sorted(stages.items())
+        },
+    }
+
+
+def run_batch(apps: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from core.deploy.deploy_up import deploy_up
+
+    with tempfile.TemporaryDirectory(prefix="ikoma-bench-deploy-") as tmp:
+        root = Path(tmp)
+        with deploy_environment(root, args) as health_url:
+            template = build_template_remote(root / "remotes", health_url, args.files, args.file_kb, args.commits)
+            remotes = []
+            for index in range(apps):
+                remote = root / "remotes" / f"app-{index:03d}"
+                shutil.copytree(template, remote)
+                remotes.append(remote)
+
+            results: Dict[str, Any] = {}
+            for phase, expect_fast in (("cold", False), ("warm", True)):
+                reports = []
+                start = time.perf_counter()
+                for index, remote in enumerate(remotes):
+                    report = deploy_up(f"app-{index:03d}", "main", remote_url=str(remote))
+                    if report.fast_path != expect_fast:
+                        raise RuntimeError(f"{phase}: chemin rapide inattendu pour app-{index:03d}")
+                    reports.append(report)
+                results[phase] = _summary(reports, time.perf_counter() - start)
+            return results
+
+
+def _print(apps: int, results: Dict[str, Any]) -> None:
+    for phase, summary in results.items():
+        print(
+            f"{apps:>4} app(s) {phase:<5} total {summary['wall_s']:8.2f}s   "
+            f"deploy p50 {summary['deploy_p50_s'] * 1000:7.0f} ms   p95 {summary['deploy_p95_s'] * 1000:7.0f} ms"
+        )
+        for name, stage in summary["stages"].items():
+            print(f"{'':>20}{name:<10} p50 {stage['p50_s'] * 1000:7.0f} ms   p95 {stage['p95_s'] * 1000:7.0f} ms")
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Métriques (p95 et durée totale) plus lentes que la référence de plus de `threshold`."""
+
+    regressions = []
+    for apps, phases in current["results"].items():
+        for phase, summary in phases.items():
+            reference = baseline.get("results", {}).get(apps, {}).get(phase)
+            if reference is None:
+                continue
+            pairs = [("wall_s", reference["wall_s"], summary["wall_s"])]
+            pairs.append(("deploy_p95_s", reference["deploy_p95_s"], summary["deploy_p95_s"]))
+            for name, stage in summary["stages"].items():
+                if name in reference["stages"]:
+                    pairs.append((f"{name}.p95_s", reference["stages"][name]["p95_s"], stage["p95_s"]))
+            for metric, before, after in pairs:
+                # Plancher de 5 ms : les étapes quasi nulles varient trop pour un ratio.
+                if after > max(before, 0.005) * (1 + threshold):
+                    regressions.append(f"{apps} app(s) {phase} {metric}: {before:.3f}s -> {after:.3f}s")
+    return regressions
+
+
+def _git_version() -> str:
+    return subprocess.run(["git", "--version"], capture_output=True, text=True, check=False).stdout.strip()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default="1,10,100", help="tailles de lot, séparées par des virgules")
+    parser.add_argument("--files", type=int, default=50, help="fichiers par dépôt")
+    parser.add_argument("--file-kb", type=int, default=16, help="taille de chaque fichier (Ko)")
+    parser.add_argument("--commits", type=int, default=10, help="profondeur d'historique")
+    parser.add_argument("--docker-latency", type=float, default=0.0, help="latence de chaque appel docker (s)")
+    parser.add_argument("--up-delay", type=float, default=0.0, help="durée de `compose up` (s)")
+    parser.add_argument("--pull-delay", type=float, default=0.0, help="durée de `compose pull` (s)")
+    parser.add_argument("--save", type=Path, help="écrit les résultats (JSON)")
+    parser.add_argument("--compare", type=Path, help="référence JSON à comparer")
+    parser.add_argument("--threshold", type=float, default=0.2, help="régression tolérée (0.2 = +20 %%)")
+    parser.add_argument("--verbose", action="store_true", help="affiche les logs de déploiement")
+    args = parser.parse_args()
+
+    current: Dict[str, Any] = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git": _git_version(),
+            "params": {key: value for key, value in vars(args).items() if key not in {"save", "compare", "verbose"}},
+        },
+        "results": {},
+    }
+    for apps in (int(value) for value in args.apps.split(",") if value.strip()):
+        # Les loggers de déploiement écrivent aussi sur stderr : muets sauf --verbose.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(sys.stderr if args.verbose else devnull):
+            results = run_batch(apps, args)
+        current["results"][str(apps)] = results
+        _print(apps, results)
+
+    if args.save:
+        args.save.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Résultats écrits dans {args.save}")
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), current, args.threshold)
+        for line in regressions:
+            print(f"RÉGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"Aucune régression au-delà de +{args.threshold:.0%} par rapport à {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""Mesure les requêtes de l'historique `deployment_runs` sur un gros volume.
+
+Génère N runs (1 000 000 par défaut) répartis sur plusieurs apps dans une base
+temporaire, puis chronomètre les requêtes utilisées par le Runner/CLI et la
+compaction de rétention.
+
+Usage :
+    python -m benchmarks.bench_deployment_history --rows 1000000 --apps 200
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from core.store.sqlite_store import DeploymentState, iso_ms
+
+_STATUSES = ("HEALTHY", "HEALTHY", "HEALTHY", "FAILED")
+
+
+def populate(db_path: Path, rows: int, apps: int) -> None:
+    state = DeploymentState(db_path)
+    state.ensure_schema()
+    stages = json.dumps({name: {"started_at": "", "duration_ms": 1000} for name in ("git_sync", "compose", "health")})
+    start = time.time() - 365 * 86400
+    step = 365 * 86400 / rows
+    batch = []
+    with sqlite3.connect(db_path) as conn:
+        for index in range(rows):
+            started = start + index * step
+            batch.append(
+                (
+                    f"app-{random.randrange(apps)}",
+                    "main",
+                    f"{index:040x}",
+                    random.choice(_STATUSES),
+                    iso_ms(started),
+                    iso_ms(started + 60),
+                    60000,
+                    stages,
+                    "ok",
+                )
+            )
+            if len(batch) == 50000:
+                _insert(conn, batch)
+                batch = []
+        if batch:
+            _insert(conn, batch)
+
+
+def _insert(conn: sqlite3.Connection, batch: list) -> None:
+    conn.executemany(
+        """
+        INSERT INTO deployment_runs(app_id, ref, commit_sha, status, started_at, finished_at, duration_ms, stages, exit_reason)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        batch,
+    )
+
+
+def _time(label: str, func: Callable[[], object], repeat: int = 50) -> None:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<45} médiane {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--apps", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ikoma-bench-history-") as tmp:
+        db_path = Path(tmp) / "ikoma.db"
+        start = time.perf_counter()
+        populate(db_path, args.rows, args.apps)
+        print(f"{args.rows} runs insérés en {time.perf_counter() - start:.1f}s")
+
+        state = DeploymentState(db_path)
+        _time("50 derniers runs (toutes apps)", lambda: state.list_runs(limit=50))
+        _time("50 derniers runs (une app)", lambda: state.list_runs("app-7", limit=50))
+        page = state.list_runs(limit=50)
+        _time("page suivante (curseur run_id)", lambda: state.list_runs(limit=50, before_run_id=page[-1]["run_id"]))
+        _time("dernier run HEALTHY d'une app", lambda: state.last_run("app-7"))
+
+        start = time.perf_counter()
+        deleted = state.compact_runs(keep_per_app=200, max_age_days=90)
+        print(f"compaction: {deleted} run(s) supprimé(s) en {time.perf_counter() - start:.1f}s")
+        _time("50 derniers runs après compaction", lambda: state.list_runs(limit=50))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
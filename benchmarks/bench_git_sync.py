@@ -0,0 +1,117 @@
+"""Compare `sync_repository` avec et sans miroir git partagé.
+
+Un dépôt distant local (`file://`) de plusieurs centaines de Mo est généré, puis
+N applications sont synchronisées à froid (premier clone) et à chaud (après un
+petit commit), en mode clone autonome (`IKOMA_GIT_CACHE=0`) puis en mode miroir.
+
+Usage :
+    python -m benchmarks.bench_git_sync --size-mb 300 --apps 5
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from core.scm.git_repo import sync_repository
+
+_GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@ikoma.local",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@ikoma.local",
+}
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", *args], cwd=repo, check=True, stdout=subprocess.DEVNULL, env={**os.environ, **_GIT_ENV}
+    )
+
+
+def build_remote(root: Path, size_mb: int, commits: int) -> Path:
+    """Génère un dépôt de `size_mb` Mo de données incompressibles réparties sur `commits` commits."""
+
+    remote = root / "remote"
+    remote.mkdir(parents=True)
+    _git(remote, "init", "-q", "-b", "main")
+    chunk = max(1, size_mb * 1024 * 1024 // commits)
+    for index in range(commits):
+        (remote / f"blob_{index:04d}.bin").write_bytes(os.urandom(chunk))
+        _git(remote, "add", ".")
+        _git(remote, "commit", "-q", "-m", f"commit {index}")
+    return remote
+
+
+def _dir_size_mb(path: Path) -> float:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total / (1024 * 1024)
+
+
+def _sync_all(apps: int, remote_url: str, repos_dir: Path, cache_dir: Path, logger) -> float:
+    start = time.perf_counter()
+    for index in range(apps):
+        sync_repository(f"app-{index}", "main", repos_dir, logger, remote_url=remote_url, cache_dir=cache_dir)
+    return time.perf_counter() - start
+
+
+def run(size_mb: int, commits: int, apps: int) -> Dict[str, Dict[str, float]]:
+    logger = logging.getLogger("bench.git_sync")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="ikoma-bench-git-") as tmp:
+        root = Path(tmp)
+        print(f"Génération du dépôt distant ({size_mb} Mo, {commits} commits)...")
+        remote = build_remote(root, size_mb, commits)
+        remote_url = remote.as_uri()
+
+        for mode, cache_flag in (("clone", "0"), ("mirror", "1")):
+            os.environ["IKOMA_GIT_CACHE"] = cache_flag
+            repos_dir = root / f"repos-{mode}"
+            cache_dir = root / f"cache-{mode}"
+
+            cold = _sync_all(apps, remote_url, repos_dir, cache_dir, logger)
+            (remote / "CHANGELOG").write_text(f"{mode} {time.time()}\n", encoding="utf-8")
+            _git(remote, "add", ".")
+            _git(remote, "commit", "-q", "-m", f"update {mode}")
+            warm = _sync_all(apps, remote_url, repos_dir, cache_dir, logger)
+
+            disk = _dir_size_mb(repos_dir) + (_dir_size_mb(cache_dir) if cache_dir.exists() else 0.0)
+            results[mode] = {"cold_s": cold, "warm_s": warm, "disk_mb": disk}
+            shutil.rmtree(repos_dir, ignore_errors=True)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    os.environ.pop("IKOMA_GIT_CACHE", None)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=300, help="Taille du dépôt généré (Mo)")
+    parser.add_argument("--commits", type=int, default=30, help="Nombre de commits générés")
+    parser.add_argument("--apps", type=int, default=5, help="Nombre d'applications partageant le remote")
+    args = parser.parse_args()
+
+    results = run(args.size_mb, args.commits, args.apps)
+    print(f"{'mode':<8} {'froid (s)':>10} {'chaud (s)':>10} {'disque (Mo)':>12}")
+    for mode, values in results.items():
+        print(f"{mode:<8} {values['cold_s']:>10.2f} {values['warm_s']:>10.2f} {values['disk_mb']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""Validation de `ikoma.release.json` par le schéma compilé de `core.deploy.manifest`.
+
+Génère `--manifests` manifests distincts (sondes multiples, blue/green une fois
+sur deux) puis chronomètre :
+- `json.loads` seul, comme plancher ;
+- la validation à froid (parse + schéma + objets figés, cache vidé) ;
+- le cache par empreinte (même contenu relu) ;
+- des manifests invalides (plusieurs erreurs chacun, toutes relevées).
+
+Usage :
+    python -m benchmarks.bench_manifest --manifests 10000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Callable, List
+
+from core.deploy import manifest
+from core.deploy.manifest import ManifestError, parse_release_manifest
+
+
+def build_manifests(count: int) -> List[bytes]:
+    manifests = []
+    for index in range(count):
+        payload = {
+            "compose": "docker-compose.yml",
+            "services": [f"web-{index}", "worker"],
+            "health": {
+                "probes": [
+                    {"type": "http", "url": f"http://127.0.0.1:{{port}}/health?n={index}"},
+                    {"type": "tcp", "host": "127.0.0.1", "port": 5432},
+                    {"type": "command", "command": ["pg_isready", "-h", "db"]},
+                ],
+                "mode": "quorum",
+                "quorum": 2,
+                "timeout": 60,
+                "initial_interval": 0.25,
+                "backoff": 2,
+                "jitter": 0.2,
+            },
+        }
+        if index % 2:
+            payload["blue_green"] = {
+                "ports": {"blue": 8081, "green": 8082},
+                "upstream_file": f"/etc/nginx/conf.d/app-{index}.conf",
+                "reload_command": "nginx -s reload",
+            }
+        manifests.append(json.dumps(payload).encode("utf-8"))
+    return manifests
+
+
+def build_invalid(count: int) -> List[bytes]:
+    payload = {
+        "services": ["web", ""],
+        "health": {"probes": [{"type": "tcp", "port": "x"}], "quorum": 3, "jitter": 2},
+        "blue_green": {"ports": {"blue": 80, "green": 80}, "upstream_file": "relative.conf"},
+    }
+    return [json.dumps({**payload, "compose": f"compose-{index}.yml"}).encode("utf-8") for index in range(count)]
+
+
+def _timed(label: str, fn: Callable[[bytes], object], manifests: List[bytes]) -> None:
+    start = time.perf_counter()
+    for raw in manifests:
+        fn(raw)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms   {elapsed / len(manifests) * 1e6:7.1f} µs/manifest")
+
+
+def _invalid(raw: bytes) -> None:
+    try:
+        parse_release_manifest(raw)
+    except ManifestError:
+        return
+    raise AssertionError("manifest invalide accepté")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifests", type=int, default=10_000)
+    args = parser.parse_args()
+
+    # Le cache doit contenir tout le lot pour mesurer les lectures répétées.
+    os.environ["IKOMA_MANIFEST_CACHE_SIZE"] = str(args.manifests)
+    manifests = build_manifests(args.manifests)
+    _timed("json.loads seul", json.loads, manifests)
+    manifest.clear_cache()
+    _timed("validation à froid", parse_release_manifest, manifests)
+    _timed("cache (même contenu)", parse_release_manifest, manifests)
+    manifest.clear_cache()
+    _timed("manifests invalides", _invalid, build_invalid(args.manifests))
+    manifest.clear_cache()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
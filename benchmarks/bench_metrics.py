@@ -0,0 +1,96 @@
+"""Coût de l'instrumentation `core.logging.metrics` sur les chemins instrumentés.
+
+Chronomètre une observation d'histogramme (seul et avec plusieurs threads),
+le rendu de `/metrics`, et compare le coût ajouté par `run_command` à la durée
+d'une commande triviale (`true`). Mesure aussi `_objects_bytes`, lancé avant et
+après chaque `git fetch`, sur le dépôt courant.
+
+Usage :
+    python -m benchmarks.bench_metrics --iterations 200000 --threads 8
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from core.logging.metrics import COMMAND_SECONDS, DEPLOY_STAGE_SECONDS, REGISTRY, command_label
+
+
+def _per_call_ns(fn: Callable[[], None], iterations: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def _threaded_ns(fn: Callable[[], None], iterations: int, threads: int) -> float:
+    per_thread = iterations // threads
+    workers = [
+        threading.Thread(target=lambda: [fn() for _ in range(per_thread)]) for _ in range(threads)
+    ]
+    start = time.perf_counter_ns()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter_ns() - start) / (per_thread * threads)
+
+
+def _median_ms(fn: Callable[[], None], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--commands", type=int, default=200, help="exécutions de `true` via run_command")
+    args = parser.parse_args()
+
+    child = DEPLOY_STAGE_SECONDS.labels("compose")
+    observe = _per_call_ns(lambda: child.observe(1.5), args.iterations)
+    labelled = _per_call_ns(lambda: DEPLOY_STAGE_SECONDS.labels("compose").observe(1.5), args.iterations)
+    contended = _threaded_ns(lambda: DEPLOY_STAGE_SECONDS.labels("compose").observe(1.5), args.iterations, args.threads)
+    command = ["git", "fetch", "--prune", "origin", "main"]
+    hook = _per_call_ns(
+        lambda: COMMAND_SECONDS.labels(command_label(command)).observe(0.2), args.iterations
+    )
+    print(f"observe (label résolu)          {observe:8.0f} ns")
+    print(f"labels().observe                {labelled:8.0f} ns")
+    print(f"labels().observe, {args.threads} threads     {contended:8.0f} ns")
+    print(f"hook run_command (label + obs.) {hook:8.0f} ns")
+
+    for stage in ("preflight", "git_sync", "manifest", "pull", "compose", "health", "db"):
+        DEPLOY_STAGE_SECONDS.labels(stage).observe(1.0)
+    print(f"rendu /metrics                  {_median_ms(REGISTRY.render, 200) * 1000:8.0f} µs")
+
+    from core.logging.logger import run_command
+    from core.scm.git_repo import _objects_bytes
+
+    logger = logging.getLogger("bench_metrics")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    command_ms = _median_ms(lambda: run_command(["true"], logger=logger), args.commands)
+    print(
+        f"run_command(['true'])           {command_ms * 1000:8.0f} µs"
+        f"   (instrumentation : {hook / (command_ms * 1e6) * 100:.3f} %)"
+    )
+
+    repo = Path(__file__).resolve().parents[1]
+    if (repo / ".git").is_dir():
+        print(f"_objects_bytes(dépôt courant)   {_median_ms(lambda: _objects_bytes(repo), 20) * 1000:8.0f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""Coût d'un scan du surveillant de branches (`runner.ref_watcher`) selon le nombre d'apps.
+
+Pour chaque taille de `--apps`, crée `--remotes` remotes Git locaux (branches
+`main` et `staging`), puis enregistre les apps en les répartissant sur ces
+remotes. Chronomètre ensuite trois scans :
+- le premier (relevé des SHA de référence) ;
+- un scan sans échéance, le cas courant entre deux intervalles ;
+- un scan où tout est échu, avec un commit par remote.
+
+Il affiche aussi le nombre de `git ls-remote` lancés, borné par le nombre de
+remotes et non par le nombre d'apps.
+
+Usage :
+    python -m benchmarks.bench_ref_watcher --apps 10,100,500 --remotes 20
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+def _commit(repo: Path, message: str) -> None:
+    _git(repo, "-c", "user.name=b", "-c", "user.email=b@b", "commit", "-q", "--allow-empty", "-m", message)
+
+
+def _measure(apps: int, remotes: int) -> List[str]:
+    from core.scm import git_repo
+    from runner.config_store import AppConfig, AppConfigStore
+    from runner.ref_watcher import RefWatcher
+
+    with tempfile.TemporaryDirectory(prefix="ikoma-refwatch-") as tmp:
+        root = Path(tmp)
+        paths = []
+        for index in range(remotes):
+            path = root / f"remote-{index:03d}"
+            path.mkdir()
+            _git(path, "init", "-q", "-b", "main")
+            _commit(path, "init")
+            _git(path, "branch", "staging")
+            paths.append(path)
+
+        configs = AppConfigStore(root / "ikoma.db")
+        for index in range(apps):
+            branch = "staging" if index % 4 == 3 else "main"
+            configs.upsert(AppConfig(app_id=f"app-{index:04d}", repo_git_url=str(paths[index % remotes]), branch=branch))
+
+        calls = {"count": 0}
+        ls_remote = git_repo.ls_remote_heads
+
+        def counted(url, branches):
+            calls["count"] += 1
+            return ls_remote(url, branches)
+
+        git_repo.ls_remote_heads = counted
+        try:
+            watcher = RefWatcher(root / "ikoma.db", min_interval=60, max_interval=600, jitter=0)
+            lines = []
+            now = time.time()
+            for label, at in (("premier scan", now), ("scan sans échéance", now + 1)):
+                calls["count"] = 0
+                report = watcher.scan_once(now=at)
+                lines.append(f"{apps:>6} apps  {label:<22} {report.duration * 1000:9.1f} ms   {calls['count']:>4} ls-remote")
+            for path in paths:
+                _commit(path, "change")
+            calls["count"] = 0
+            report = watcher.scan_once(now=now + 3600)
+            lines.append(
+                f"{apps:>6} apps  {'tout échu + commits':<22} {report.duration * 1000:9.1f} ms   "
+                f"{calls['count']:>4} ls-remote   {len(report.triggered)} déploiement(s)"
+            )
+            return lines
+        finally:
+            git_repo.ls_remote_heads = ls_remote
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default="10,100,500")
+    parser.add_argument("--remotes", type=int, default=20)
+    args = parser.parse_args()
+
+    for apps in (int(value) for value in args.apps.split(",")):
+        for line in _measure(apps, args.remotes):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+"""Latence des pages du Runner avec beaucoup d'applications enregistrées.
+
+Crée une base temporaire avec `--apps` applications (configuration, statut de
+déploiement et historique), puis mesure `/` et `/apps/{id}` via l'ASGI du Runner
+avec `--concurrency` requêtes simultanées, pendant qu'un thread simule un
+déploiement qui écrit en continu (statuts et runs).
+
+Usage :
+    python -m benchmarks.bench_runner_load --apps 1000 --requests 400 --concurrency 20 --write-interval 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+
+def _seed(db_path: Path, logs_dir: Path, apps: int, runs_per_app: int) -> None:
+    from core.store.db import get_database
+    from core.store.sqlite_store import iso_ms
+
+    database = get_database(db_path)
+    database.migrate()
+    now = time.time()
+    with database.transaction() as conn:
+        for index in range(apps):
+            app_id = f"app-{index:04d}"
+            conn.execute(
+                """
+                INSERT INTO app_configs(app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app)
+                VALUES(?, ?, 'main', ?, 'supabase/migrations', 'generic')
+                """,
+                (app_id, f"https://git.example.com/org/{app_id}.git", f"/opt/{app_id}"),
+            )
+            conn.execute(
+                "INSERT INTO deployments(app_id, ref, status, updated_at, message) VALUES(?, 'main', 'HEALTHY', ?, 'ok')",
+                (app_id, iso_ms(now)),
+            )
+            conn.executemany(
+                """
+                INSERT INTO deployment_runs(app_id, ref, commit_sha, status, started_at, finished_at, duration_ms, stages)
+                VALUES(?, 'main', ?, 'HEALTHY', ?, ?, 4200, '{"compose": {"duration_ms": 1200}}')
+                """,
+                [
+                    (app_id, f"{run:040x}", iso_ms(now - run * 3600), iso_ms(now - run * 3600 + 4))
+                    for run in range(runs_per_app)
+                ],
+            )
+            app_logs = logs_dir / app_id
+            app_logs.mkdir(parents=True)
+            (app_logs / "deploy.log").write_text("ok\n")
+
+
+def _writer(db_path: Path, apps: int, interval: float, stop: threading.Event, counter: List[int]) -> None:
+    """Simule un déploiement en cours : statut et runs écrits en continu."""
+    from core.store.sqlite_store import DeploymentState
+
+    state = DeploymentState(db_path)
+    while not stop.is_set():
+        app_id = f"app-{random.randrange(apps):04d}"  # nosec - charge synthétique
+        run_id = state.start_run(app_id, "main")
+        state.upsert_status(app_id, "main", "RUNNING", "Déploiement en cours")
+        state.finish_run(run_id, "HEALTHY", "ok", stages={"compose": {"duration_ms": 10}}, duration=0.01)
+        state.upsert_status(app_id, "main", "HEALTHY", "ok")
+        counter[0] += 1
+        time.sleep(interval)
+
+
+async def _measure(client: httpx.AsyncClient, paths: List[str], concurrency: int) -> List[float]:
+    queue = list(paths)
+    latencies: List[float] = []
+
+    async def worker() -> None:
+        while queue:
+            path = queue.pop()
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def _report(label: str, latencies: List[float], seconds: float) -> None:
+    samples = sorted(latencies)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(
+        f"{label:<12} {len(samples) / seconds:7.0f} req/s   médiane {statistics.median(samples):7.1f} ms"
+        f"   p95 {p95:7.1f} ms   max {samples[-1]:7.1f} ms"
+    )
+
+
+async def _run(apps: int, requests: int, concurrency: int, runs_per_app: int, write_interval: float) -> None:
+    with tempfile.TemporaryDirectory(prefix="ikoma-bench-runner-") as tmp:
+        deploy_module = importlib.import_module("core.deploy.deploy_up")
+        deploy_module.DB_PATH = Path(tmp) / "ikoma.db"
+        deploy_module.LOGS_DIR = Path(tmp) / "logs"
+        start = time.perf_counter()
+        _seed(deploy_module.DB_PATH, deploy_module.LOGS_DIR, apps, runs_per_app)
+        print(f"{apps} apps, {apps * runs_per_app} runs créés en {time.perf_counter() - start:.1f}s")
+
+        # Import après avoir redirigé DB_PATH/LOGS_DIR : le Runner lit ces constantes à l'import.
+        from runner.app import app
+
+        stop, writes = threading.Event(), [0]
+        writer = threading.Thread(target=_writer, args=(deploy_module.DB_PATH, apps, write_interval, stop, writes), daemon=True)
+        writer.start()
+        results: Dict[str, List[float]] = {}
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://runner") as client:
+                await client.get("/")  # préchauffage (templates, connexions)
+                for label, paths in (
+                    ("/", ["/"] * requests),
+                    ("/apps/{id}", [f"/apps/app-{random.randrange(apps):04d}" for _ in range(requests)]),  # nosec
+                ):
+                    start = time.perf_counter()
+                    results[label] = await _measure(client, paths, concurrency)
+                    _report(label, results[label], time.perf_counter() - start)
+        finally:
+            stop.set()
+            writer.join()
+        print(f"écritures concurrentes pendant la mesure : {writes[0]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=400, help="requêtes par route")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--runs-per-app", type=int, default=20)
+    parser.add_argument(
+        "--write-interval", type=float, default=0.05, help="pause (s) entre deux déploiements simulés"
+    )
+    args = parser.parse_args()
+    asyncio.run(_run(args.apps, args.requests, args.concurrency, args.runs_per_app, args.write_interval))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
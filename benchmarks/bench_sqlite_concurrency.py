@@ -0,0 +1,132 @@
+"""Charge concurrente lectures/écritures sur la base SQLite du Runner.
+
+Compare deux modes d'accès sur le même scénario (workers qui écrivent des runs,
+pages du Runner qui lisent l'historique) :
+- `legacy` : un `sqlite3.connect` par appel, journal rollback par défaut
+  (comportement d'avant `core.store.db`) ;
+- `pooled` : `core.store.db.Database`, connexion par thread, WAL.
+
+Usage :
+    python -m benchmarks.bench_sqlite_concurrency --writers 4 --readers 16 --seconds 10
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from core.store.db import Database
+from core.store.sqlite_store import RUN_COLUMNS, iso_ms
+
+
+def _legacy_ops(db_path: Path) -> Dict[str, Callable[[int], None]]:
+    def write(index: int) -> None:
+        with sqlite3.connect(db_path) as conn:
+            run_id = conn.execute(
+                "INSERT INTO deployment_runs(app_id, ref, status, started_at) VALUES(?, 'main', 'RUNNING', ?)",
+                (f"app-{index % 50}", iso_ms(time.time())),
+            ).lastrowid
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE deployment_runs SET status = 'HEALTHY' WHERE run_id = ?", (run_id,))
+
+    def read(index: int) -> None:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                f"SELECT {RUN_COLUMNS} FROM deployment_runs WHERE app_id = ? ORDER BY started_at DESC LIMIT 20",
+                (f"app-{index % 50}",),
+            ).fetchall()
+
+    return {"write": write, "read": read}
+
+
+def _pooled_ops(db_path: Path) -> Dict[str, Callable[[int], None]]:
+    database = Database(db_path)
+
+    def write(index: int) -> None:
+        run_id = database.execute(
+            "INSERT INTO deployment_runs(app_id, ref, status, started_at) VALUES(?, 'main', 'RUNNING', ?)",
+            (f"app-{index % 50}", iso_ms(time.time())),
+        ).lastrowid
+        database.execute("UPDATE deployment_runs SET status = 'HEALTHY' WHERE run_id = ?", (run_id,))
+
+    def read(index: int) -> None:
+        database.execute(
+            f"SELECT {RUN_COLUMNS} FROM deployment_runs WHERE app_id = ? ORDER BY started_at DESC LIMIT 20",
+            (f"app-{index % 50}",),
+        ).fetchall()
+
+    return {"write": write, "read": read}
+
+
+def run(mode: str, writers: int, readers: int, seconds: float) -> None:
+    with tempfile.TemporaryDirectory(prefix="ikoma-bench-sqlite-") as tmp:
+        db_path = Path(tmp) / "ikoma.db"
+        setup = Database(db_path)
+        setup.migrate()
+        if mode == "legacy":
+            # Le mode WAL est persistant dans le fichier : on revient au journal par défaut.
+            setup.execute("PRAGMA journal_mode=DELETE")
+        setup.close()
+        ops = _legacy_ops(db_path) if mode == "legacy" else _pooled_ops(db_path)
+
+        latencies: Dict[str, List[float]] = {"write": [], "read": []}
+        errors: Dict[str, int] = {"write": 0, "read": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(kind: str, seed: int) -> None:
+            samples: List[float] = []
+            failed = 0
+            index = seed
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    ops[kind](index)
+                    samples.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    failed += 1
+                index += 1
+            with lock:
+                latencies[kind].extend(samples)
+                errors[kind] += failed
+
+        threads = [threading.Thread(target=worker, args=("write", i)) for i in range(writers)]
+        threads += [threading.Thread(target=worker, args=("read", i)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for kind in ("write", "read"):
+            samples = sorted(latencies[kind])
+            if not samples:
+                print(f"{mode:<7} {kind:<5} aucune opération réussie, {errors[kind]} erreur(s)")
+                continue
+            p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+            print(
+                f"{mode:<7} {kind:<5} {len(samples) / seconds:9.0f} op/s   médiane {statistics.median(samples):7.2f} ms"
+                f"   p95 {p95:7.2f} ms   erreurs {errors[kind]}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mode", choices=("legacy", "pooled", "both"), default="both")
+    args = parser.parse_args()
+
+    modes = ("legacy", "pooled") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        run(mode, args.writers, args.readers, args.seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
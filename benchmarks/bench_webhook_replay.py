@@ -0,0 +1,151 @@
+"""Rejeu local de webhooks `push` contre `POST /hooks/git`.
+
+Enregistre `--apps` applications (branche `main`, et `staging` sur le même dépôt
+une fois sur cinq), puis envoie `--pushes` pushes signés via l'ASGI de l'API, sans
+worker : la plupart visent quelques branches très actives, les autres des tags,
+des branches supprimées, des dépôts inconnus ou portent une mauvaise signature.
+Les URLs varient (HTTPS avec `.git`, SSH `git@hôte:org/app`, page web).
+
+Vérifie ensuite qu'un seul déploiement est en file par app et par branche poussée,
+avec le dernier commit reçu, et affiche latence et débit du endpoint.
+
+Usage :
+    python -m benchmarks.bench_webhook_replay --pushes 1000 --apps 20
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SECRET = "replay-secret"
+HOST = "git.example.com"
+
+
+@dataclass
+class ReplayResult:
+    pushes: int
+    statuses: Counter
+    queued: int  # jobs `deploy` en file après le rejeu
+    expected: int  # couples (app, branche) poussés et suivis
+    mismatches: List[str] = field(default_factory=list)
+    latencies: List[float] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def _payload(repo: str, ref: str, after: str, *, deleted: bool = False) -> Dict[str, object]:
+    return {
+        "ref": ref,
+        "before": "0" * 40,
+        "after": after,
+        "deleted": deleted,
+        "repository": {
+            "full_name": f"org/{repo}",
+            "clone_url": random.choice([f"https://{HOST}/org/{repo}.git", f"https://{HOST}/Org/{repo}"]),
+            "ssh_url": f"git@{HOST}:org/{repo}.git",
+            "html_url": f"https://{HOST}/org/{repo}",
+        },
+    }
+
+
+def replay(pushes: int = 1000, apps: int = 20, seed: int = 0) -> ReplayResult:
+    """Rejoue `pushes` webhooks sur une base temporaire et compare la file obtenue à l'attendu."""
+
+    from fastapi.testclient import TestClient
+
+    from api.app import create_app
+    from core.scm.webhooks import sign
+    from core.store.job_store import JobStore
+    from runner.config_store import AppConfig, AppConfigStore
+
+    random.seed(seed)
+    with tempfile.TemporaryDirectory(prefix="ikoma-webhooks-") as tmp:
+        db_path = Path(tmp) / "ikoma.db"
+        configs = AppConfigStore(db_path)
+        configs.ensure_schema()
+        tracked: Dict[Tuple[str, str], List[str]] = {}
+        for index in range(apps):
+            repo = f"app-{index:03d}"
+            configs.upsert(AppConfig(app_id=repo, repo_git_url=f"https://{HOST}/org/{repo}.git"))
+            tracked.setdefault((repo, "main"), []).append(repo)
+            if index % 5 == 0:
+                configs.upsert(AppConfig(app_id=f"{repo}-staging", repo_git_url=f"git@{HOST}:org/{repo}", branch="staging"))
+                tracked.setdefault((repo, "staging"), []).append(f"{repo}-staging")
+
+        streams = list(tracked)
+        # Quelques branches concentrent l'essentiel des pushes (rafales de CI, force-push...).
+        weights = [1.0 / (rank + 1) for rank in range(len(streams))]
+        last_sha: Dict[Tuple[str, str], str] = {}
+        statuses: Counter = Counter()
+        latencies: List[float] = []
+
+        with TestClient(create_app(db_path, workers=0, webhook_secret=SECRET)) as client:
+            start = time.perf_counter()
+            for number in range(pushes):
+                draw = random.random()
+                repo, branch = random.choices(streams, weights)[0]
+                sha = hashlib.sha1(f"{repo}/{branch}/{number}".encode()).hexdigest()  # nosec - faux commit
+                secret = SECRET
+                if draw < 0.04:
+                    payload = _payload(repo, f"refs/tags/v{number}", sha)
+                elif draw < 0.06:
+                    payload = _payload(repo, f"refs/heads/{branch}", "0" * 40, deleted=True)
+                elif draw < 0.10:
+                    payload = _payload(f"unknown-{number % 7}", "refs/heads/main", sha)
+                elif draw < 0.12:
+                    payload, secret = _payload(repo, f"refs/heads/{branch}", sha), "wrong-secret"
+                else:
+                    payload = _payload(repo, f"refs/heads/{branch}", sha)
+                    last_sha[(repo, branch)] = sha
+                body = json.dumps(payload).encode("utf-8")
+                headers = {
+                    "Content-Type": "application/json",
+                    "X-GitHub-Event": "push",
+                    "X-GitHub-Delivery": f"replay-{number}",
+                    "X-Hub-Signature-256": sign(secret, body),
+                }
+                sent = time.perf_counter()
+                response = client.post("/hooks/git", content=body, headers=headers)
+                latencies.append(time.perf_counter() - sent)
+                statuses[response.status_code] += 1
+            elapsed = time.perf_counter() - start
+
+        jobs = JobStore(db_path).list_jobs(limit=pushes + 1, kinds=("deploy",))
+        mismatches = []
+        expected = {app_id: sha for stream, sha in last_sha.items() for app_id in tracked[stream]}
+        for job in jobs:
+            want = expected.get(job.app_id)
+            if job.payload.get("commit") != want:
+                mismatches.append(f"{job.app_id}: {job.payload.get('commit')} au lieu de {want}")
+        return ReplayResult(pushes, statuses, len(jobs), len(expected), mismatches, latencies, elapsed)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pushes", type=int, default=1000)
+    parser.add_argument("--apps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = replay(args.pushes, args.apps, args.seed)
+    latencies = sorted(result.latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(f"pushes envoyés        {result.pushes:>8}   ({result.pushes / result.elapsed:.0f}/s)")
+    print("réponses              " + ", ".join(f"{code}: {count}" for code, count in sorted(result.statuses.items())))
+    print(f"latence p50 / p95     {statistics.median(latencies) * 1000:8.2f} ms / {p95 * 1000:.2f} ms")
+    print(f"déploiements en file  {result.queued:>8}   (attendu {result.expected})")
+    for mismatch in result.mismatches:
+        print(f"  commit inattendu : {mismatch}")
+    return 0 if result.queued == result.expected and not result.mismatches else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
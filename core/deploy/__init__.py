@@ -4,6 +4,6 @@ Ce package rassemble les fonctions concrètes pour piloter un déploiement
 Docker Compose à partir d'un référentiel applicatif.
 """
 
-from .deploy_up import deploy_up
+from .deploy_up import deploy_up, plan_deploy, rollback_release
 
-__all__ = ["deploy_up"]
+__all__ = ["deploy_up", "plan_deploy", "rollback_release"]
@@ -0,0 +1,130 @@
+"""Déploiement blue/green piloté par la section `blue_green` du manifest.
+
+Exemple :
+
+    "blue_green": {
+        "ports": {"blue": 8081, "green": 8082},
+        "port_env": "APP_PORT",
+        "upstream_file": "/etc/nginx/ikoma/app.upstream.conf",
+        "upstream_template": "server 127.0.0.1:{port};\\n",
+        "reload_command": "nginx -s reload"
+    }
+
+La nouvelle release démarre dans le projet compose `<app>-<couleur>`, avec
+`port_env` positionnée sur le port de la couleur (le fichier compose publie
+`${APP_PORT}`). Les sondes de santé du manifest peuvent utiliser `{port}`.
+L'ancienne couleur continue de servir pendant le healthcheck. La bascule
+réécrit `upstream_file` atomiquement (fichier temporaire puis `os.replace`)
+puis lance `reload_command`. L'ancien projet n'est arrêté qu'ensuite. En cas
+d'échec avant la bascule, seul le nouveau projet est supprimé.
+"""
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+from core.deploy.deploy_up import BlueGreenConfig, DeployError, ReleaseConfig
+from core.logging.logger import run_command
+
+
+@dataclass
+class Slot:
+    color: str
+    project: str
+    port: int
+
+
+def active_slot(store, app_id: str) -> Optional[Slot]:
+    row = store.get_active_slot(app_id)
+    return Slot(row["color"], row["project"], row["port"]) if row else None
+
+
+def next_slot(app_id: str, config: BlueGreenConfig, previous: Optional[Slot]) -> Slot:
+    """Couleur inactive (`blue` au premier déploiement)."""
+
+    color = "green" if previous is not None and previous.color == "blue" else "blue"
+    return Slot(color=color, project=slot_project(app_id, color), port=config.ports[color])
+
+
+def slot_project(app_id: str, color: str) -> str:
+    # Noms de projet compose : minuscules, chiffres, `-` et `_`.
+    return re.sub(r"[^a-z0-9_-]", "-", f"{app_id}-{color}".lower())
+
+
+def slot_env(config: BlueGreenConfig, slot: Slot) -> Dict[str, str]:
+    return {**os.environ, config.port_env: str(slot.port)}
+
+
+def slot_health(health: Mapping[str, object], port: int) -> Dict[str, object]:
+    """Copie de la section `health` où `{port}` est remplacé par le port du slot."""
+
+    def substitute(value):
+        if isinstance(value, str):
+            return value.replace("{port}", str(port))
+        if isinstance(value, (list, tuple)):
+            return [substitute(item) for item in value]
+        if isinstance(value, Mapping):
+            return {key: substitute(item) for key, item in value.items()}
+        return value
+
+    return substitute(dict(health))
+
+
+def switch_upstream(config: BlueGreenConfig, slot: Slot, logger) -> float:
+    """Fait pointer l'upstream vers `slot` et renvoie la durée de la bascule (secondes).
+
+    Si le rechargement du proxy échoue, l'ancien fichier est restauré.
+    """
+
+    start = time.perf_counter()
+    target = config.upstream_file
+    previous = target.read_text(encoding="utf-8") if target.exists() else None
+    _atomic_write(target, config.upstream_template.replace("{port}", str(slot.port)))
+    if config.reload_command:
+        try:
+            run_command(config.reload_command, logger=logger, timeout=30)
+        except DeployError:
+            if previous is None:
+                target.unlink(missing_ok=True)
+            else:
+                _atomic_write(target, previous)
+            raise
+    duration = time.perf_counter() - start
+    logger.info("Bascule de l'upstream vers %s (port %s) en %.0f ms", slot.color, slot.port, duration * 1000)
+    return duration
+
+
+def remove_project(release: ReleaseConfig, repo_dir: Path, project: Optional[str], logger) -> None:
+    """`docker compose down` d'un projet ; `project=None` vise le projet compose par défaut.
+
+    N'échoue jamais : un projet résiduel n'empêche pas la release de servir.
+    """
+
+    cmd = ["docker", "compose"]
+    if project:
+        cmd.extend(["-p", project])
+    cmd.extend(["-f", str(release.compose_file), "down", "--remove-orphans"])
+    try:
+        run_command(cmd, cwd=repo_dir, logger=logger, timeout=300)
+    except DeployError as exc:
+        logger.warning("Arrêt du projet %s impossible: %s", project or "par défaut", exc)
+
+
+def _atomic_write(target: Path, content: str) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+    try:
+        os.fchmod(fd, 0o644)  # lisible par le proxy ; mkstemp crée en 0600
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(content)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
@@ -1,22 +1,145 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import tempfile
 from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Sequence, Set
 
-from core.deploy.deploy_up import ReleaseConfig
+from core.deploy.deploy_up import DEFAULT_HEALTH_TIMEOUT, ReleaseConfig
 from core.logging.logger import run_command
 
 
-def compose_up(release: ReleaseConfig, repo_dir: Path, logger) -> None:
+def compose_up(
+    release: ReleaseConfig,
+    repo_dir: Path,
+    logger,
+    capabilities=None,
+    *,
+    project: str | None = None,
+    env: Mapping[str, str] | None = None,
+    pinned_images: Mapping[str, str] | None = None,
+    services: Sequence[str] | None = None,
+) -> None:
+    """`docker compose up -d`, avec `--wait` si la version de Compose le permet.
+
+    `--wait` attend que les conteneurs soient démarrés (et `healthy` s'ils
+    déclarent un healthcheck), borné par le timeout de santé du manifest quand
+    `--wait-timeout` est disponible. `IKOMA_COMPOSE_WAIT=0` le désactive.
+    `project` et `env` servent aux slots blue/green (`core.deploy.blue_green`).
+    `pinned_images` (`{service: image@digest}`) force ces images via un fichier
+    compose de surcharge temporaire, sans rien reconstruire (`--no-build`).
+    `services` restreint le `up` (redéploiement partiel) ; par défaut ceux du manifest.
+    """
+
+    override = _pinned_override(pinned_images) if pinned_images else None
+    cmd = ["docker", "compose", *_project_args(project), "-f", str(release.compose_file)]
+    if override is not None:
+        cmd.extend(["-f", str(override)])
+    cmd.extend(["up", "-d"])
+    if override is not None:
+        cmd.append("--no-build")
+    if capabilities is not None and capabilities.compose_wait and os.getenv("IKOMA_COMPOSE_WAIT", "1") != "0":
+        cmd.append("--wait")
+        if capabilities.compose_wait_timeout:
+            timeout = float(release.health.get("timeout", DEFAULT_HEALTH_TIMEOUT))
+            cmd.extend(["--wait-timeout", str(max(1, int(timeout)))])
+    targets = release.services if services is None else services
+    if targets:
+        cmd.extend(targets)
+
+    logger.info("Exécution: %s", " ".join(cmd))
+    try:
+        run_command(cmd, cwd=repo_dir, logger=logger, env=env)
+    finally:
+        if override is not None:
+            override.unlink(missing_ok=True)
+
+
+def compose_services_running(release: ReleaseConfig, repo_dir: Path, logger, project: str | None = None) -> bool:
+    """Vérifie que les services du manifest (ou tous ceux du projet) sont `running`."""
+
+    states = compose_service_states(release, repo_dir, logger, project)
+    if not states:
+        return False
+
+    expected = release.services or list(states)
+    stopped = [service for service in expected if states.get(service) != "running"]
+    if stopped:
+        logger.info("Service(s) non démarré(s): %s", ", ".join(stopped))
+        return False
+    return True
+
+
+def compose_service_states(release: ReleaseConfig, repo_dir: Path, logger, project: str | None = None) -> Dict[str, str]:
+    """`{service: état}` d'après `docker compose ps --all`."""
+
     cmd = [
         "docker",
         "compose",
+        *_project_args(project),
         "-f",
         str(release.compose_file),
-        "up",
-        "-d",
+        "ps",
+        "--all",
+        "--format",
+        "{{.Service}}\t{{.State}}",
     ]
-    if release.services:
-        cmd.extend(release.services)
+    result = run_command(cmd, cwd=repo_dir, logger=logger, timeout=10)
+    states: Dict[str, str] = {}
+    for line in result.output.splitlines():
+        service, sep, state = line.strip().partition("\t")
+        # Service mis à l'échelle : un seul conteneur arrêté suffit à le marquer.
+        if sep and states.get(service, "running") == "running":
+            states[service] = state
+    return states
 
-    logger.info("Exécution: %s", " ".join(cmd))
-    run_command(cmd, cwd=repo_dir, logger=logger)
+
+def service_config_hashes(
+    config: Mapping[str, Mapping], images: Mapping[str, str], commit_sha: str | None = None
+) -> Dict[str, str]:
+    """Empreinte de chaque service : sa config compose résolue et le digest de son image.
+
+    `config` est la sortie de `docker compose config` (variables déjà interpolées) ;
+    `images` (`{service: image@digest}`) capte un tag déplacé vers une nouvelle image.
+    Un service construit localement (`build`) dépend aussi du commit : ses sources
+    peuvent changer sans que sa config change.
+    """
+
+    hashes = {}
+    for service, spec in config.items():
+        inputs = {"config": spec, "image": images.get(service)}
+        if spec.get("build"):
+            inputs["commit"] = commit_sha
+        raw = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+        hashes[service] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return hashes
+
+
+def with_dependents(config: Mapping[str, Mapping], changed: Iterable[str], scope: Iterable[str]) -> Set[str]:
+    """`changed` et les services de `scope` qui en dépendent (`depends_on`), transitivement."""
+
+    scope = set(scope)
+    affected = set(changed)
+    pending = list(affected)
+    while pending:
+        service = pending.pop()
+        for name in scope - affected:
+            if service in (config.get(name, {}).get("depends_on") or {}):
+                affected.add(name)
+                pending.append(name)
+    return affected
+
+
+def _project_args(project: str | None) -> List[str]:
+    return ["-p", project] if project else []
+
+
+def _pinned_override(pinned_images: Mapping[str, str]) -> Path:
+    # Le JSON est du YAML valide : pas de dépendance YAML pour écrire la surcharge.
+    services = {service: {"image": image} for service, image in pinned_images.items()}
+    fd, path = tempfile.mkstemp(prefix="ikoma-pinned-", suffix=".yml")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump({"services": services}, handle)
+    return Path(path)
@@ -8,25 +8,46 @@ Ce module implémente un chemin unique et simple :
 - journalisation dans `data/logs/<app_id>/deploy.log`
 - mise à jour du statut dans SQLite (`HEALTHY` ou `FAILED`)
 
+Le flux est découpé en deux phases réutilisables par le moteur de pipelines
+(`core.pipelines.engine`) : `prepare_release` (pré-vol, git, manifest) puis
+`apply_release` (compose, health, statut). Chaque étape est chronométrée dans un
+`DeployReport`.
+
+Le pull des images (`core.deploy.images`) démarre en tâche de fond dès la
+lecture du manifest ; `apply_release` ne l'attend qu'au moment de lancer
+`docker compose up`, qui n'a plus à contacter le registre.
+
+Chaque run enregistre l'empreinte de configuration de ses services
+(`deployment_runs.service_hashes`). Si le dernier run terminé est HEALTHY,
+`apply_release` ne relance que les services dont l'empreinte a changé, leurs
+dépendants et ceux qui ne tournent plus, et ne vérifie que leurs sondes.
+
 Le code est volontairement lisible et peu magique pour faciliter les
 prochaines itérations.
 """
 from __future__ import annotations
 
-from dataclasses import dataclass
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from core.logging.metrics import DEPLOY_SECONDS, DEPLOY_STAGE_SECONDS
 
 # --- Constantes (Top-level, utilisées par d'autres modules) ---
 ROOT_DIR = Path(__file__).resolve().parents[2]
 DATA_DIR = ROOT_DIR / "data"
 REPOS_DIR = DATA_DIR / "repos"
+GIT_CACHE_DIR = DATA_DIR / "git-cache"
 LOGS_DIR = DATA_DIR / "logs"
 DB_PATH = DATA_DIR / "ikoma.db"
 RELEASE_FILE = "ikoma.release.json"
 DEFAULT_HEALTH_TIMEOUT = 60  # secondes
 DEFAULT_HEALTH_INTERVAL = 2  # secondes
 DEFAULT_EXPECTED_STATUS = 200
+FAST_PATH_PROBE_TIMEOUT = 2  # secondes, sonde unique du chemin rapide
 
 
 # --- Exceptions et Dataclasses (Top-level, utilisées par d'autres modules) ---
@@ -34,108 +55,661 @@ class DeployError(Exception):
     """Erreur fonctionnelle lors d'un déploiement."""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class BlueGreenConfig:
+    """Section `blue_green` du manifest (voir `core.deploy.blue_green`)."""
+
+    ports: Mapping[str, int]  # {"blue": 8081, "green": 8082}
+    upstream_file: Path
+    port_env: str = "IKOMA_PORT"
+    upstream_template: str = "server 127.0.0.1:{port};\n"
+    reload_command: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
 class ReleaseConfig:
+    """Manifest validé (`core.deploy.manifest`) ; `health` est en lecture seule et partagé par le cache."""
+
     compose_file: Path
-    services: List[str]
-    health: Dict[str, object]
+    services: Tuple[str, ...]
+    health: Mapping[str, object]
+    blue_green: Optional[BlueGreenConfig] = None
+
+
+@dataclass
+class StageTiming:
+    """Durée d'une étape (`preflight`, `git_sync`, `manifest`, `pull`, `pull_wait`, `compose`, `health`, `db`).
+
+    `pull` tourne en tâche de fond et chevauche les étapes suivantes ; `pull_wait`
+    est le temps réellement passé à l'attendre avant `compose`. En blue/green,
+    `switch` mesure la bascule de l'upstream et `teardown` l'arrêt de l'ancienne couleur.
+    """
+
+    name: str
+    started_at: float  # epoch, secondes
+    duration: float  # secondes
+
+
+@dataclass
+class DeployReport:
+    """Résultat d'un déploiement : statut, commit résolu et chronométrage des étapes."""
+
+    app_id: str
+    ref: str
+    status: str = "RUNNING"
+    message: str = ""
+    commit_sha: Optional[str] = None
+    fingerprint: Optional[str] = None
+    fast_path: bool = False
+    job_id: Optional[int] = None  # job Runner/API à l'origine du run
+    images: Dict[str, str] = field(default_factory=dict)  # {service: image@digest}
+    service_hashes: Dict[str, str] = field(default_factory=dict, repr=False)  # {service: empreinte de config}
+    updated_services: Optional[List[str]] = None  # redéploiement partiel ; None : tous les services
+    run_id: Optional[int] = None
+    started_at: float = field(default_factory=time.time)
+    stages: List[StageTiming] = field(default_factory=list)
+    events: Optional[object] = field(default=None, repr=False, compare=False)  # RunEventLog (JSONL)
+
+    def stage_durations(self) -> Dict[str, float]:
+        return {stage.name: stage.duration for stage in self.stages}
+
+    def stages_payload(self) -> Dict[str, Dict[str, object]]:
+        """Étapes au format stocké dans `deployment_runs.stages`."""
+        from core.store.sqlite_store import iso_ms
+
+        return {
+            stage.name: {"started_at": iso_ms(stage.started_at), "duration_ms": int(stage.duration * 1000)}
+            for stage in self.stages
+        }
+
+
+@dataclass
+class PreparedRelease:
+    """Sortie de `prepare_release`, consommée par `apply_release`."""
+
+    app_id: str
+    ref: str
+    repo_dir: Path
+    release_config: ReleaseConfig
+    report: DeployReport
+    logger: object
+    pull: Optional[Future] = None  # Future[PullReport] du pull en tâche de fond
+    capabilities: Optional[object] = None  # DockerCapabilities détectées au pré-vol
+    pinned_images: Dict[str, str] = field(default_factory=dict)  # rollback : {service: image@digest}
+    full_redeploy: bool = False  # ignore le redéploiement partiel (`force`)
+    success_message: str = "Déploiement validé par healthcheck"
 
 
 # --- API Publique (verrouillée) ---
-def deploy_up(app_id: str, ref: str) -> None:
+def deploy_up(
+    app_id: str,
+    ref: str,
+    *,
+    remote_url: str | None = None,
+    force: bool = False,
+    job_id: int | None = None,
+) -> DeployReport:
     """Déploie une application unique via Docker Compose.
 
+    Si le dernier run de l'app est HEALTHY avec la même empreinte de release
+    (commit, manifest, compose, environnement), un chemin rapide se contente de
+    vérifier l'état des conteneurs et d'une sonde de santé.
+
     Args:
         app_id: Identifiant applicatif utilisé pour nommer les dossiers et les entrées DB.
         ref: Référence Git à déployer (branch, tag ou commit SHA).
+        remote_url: URL Git à cloner ; à défaut `IKOMA_GIT_REMOTE` est utilisée.
+        force: Ignore le chemin rapide et le redéploiement partiel : tous les services sont relancés.
+        job_id: Job de la file à l'origine du déploiement, enregistré avec le run.
+
+    Returns:
+        Le rapport du déploiement (statut, commit, durées par étape).
 
     Raises:
         DeployError: en cas d'échec (le statut SQLite est quand même mis à jour).
     """
+
+    if not force:
+        report = _try_fast_path(app_id, ref, job_id, remote_url=remote_url)
+        if report is not None:
+            return report
+
+    prepared = prepare_release(app_id, ref, remote_url=remote_url, report=DeployReport(app_id, ref, job_id=job_id))
+    prepared.full_redeploy = force
+    return apply_release(prepared)
+
+
+def plan_deploy(app_id: str, ref: str, *, remote_url: str | None = None, fetch: bool = False):
+    """Mode `dry_run` : ce que ferait `deploy_up(app_id, ref)`, sans effet de bord.
+
+    Avec `fetch`, les objets d'un commit pas encore récupéré sont téléchargés
+    (sans checkout) pour détailler le plan.
+
+    Returns:
+        Un `core.deploy.plan.DeployPlan` (action prévue, commit visé, changements
+        du manifest et des services par rapport au dernier run HEALTHY).
+    """
+    from core.deploy.plan import plan_release
+
+    return plan_release(app_id, ref, REPOS_DIR, DB_PATH, remote_url=remote_url, fetch=fetch)
+
+
+def prepare_release(
+    app_id: str,
+    ref: str,
+    *,
+    remote_url: str | None = None,
+    report: DeployReport | None = None,
+) -> PreparedRelease:
+    """Phase 1 : pré-vol, synchronisation Git et chargement du manifest.
+
+    Aucune action sur les conteneurs : cette phase peut s'exécuter en parallèle du
+    déploiement d'applications dont celle-ci dépend.
+    """
     # Imports lazy pour éviter les imports circulaires
-    from core.deploy.compose import compose_up
-    from core.deploy.health import wait_for_health
+    from core.deploy.fingerprint import release_fingerprint
+    from core.deploy.images import start_pull
     from core.deploy.preflight import ensure_directories, load_release_config, preflight_environment, preflight_release
     from core.logging.logger import build_logger
-    from core.scm.git_repo import sync_repository
+    from core.scm.git_repo import head_commit, sync_repository
     from core.store.sqlite_store import DeploymentState
 
+    report = report or DeployReport(app_id=app_id, ref=ref)
     logger = None
-    db = None
-    repo_dir = None
-    release_config = None
 
-    try:
+    with _failure_guard(report, lambda: logger):
         # 1. Initialisation et Pré-vol
         logger = build_logger(app_id, LOGS_DIR)
         logger.info("=== Déploiement %s (%s) démarré ===", app_id, ref)
 
-        ensure_directories(DATA_DIR, REPOS_DIR, LOGS_DIR)
-        preflight_environment(logger)
+        with _stage(report, "preflight"):
+            ensure_directories(DATA_DIR, REPOS_DIR, LOGS_DIR)
+            db = DeploymentState(DB_PATH)
+            db.ensure_schema()
+            report.run_id = db.start_run(app_id, ref, job_id=report.job_id)
+            logger.info("Run de déploiement #%s", report.run_id)
+            capabilities = preflight_environment(logger, db)
 
         # 2. Synchronisation Git
-        repo_dir = sync_repository(app_id, ref, REPOS_DIR, logger)
+        with _stage(report, "git_sync"):
+            repo_dir = sync_repository(app_id, ref, REPOS_DIR, logger, remote_url=remote_url)
+            report.commit_sha = head_commit(repo_dir)
 
         # 3. Chargement de la configuration
-        release_config = load_release_config(repo_dir, RELEASE_FILE)
-        preflight_release(release_config, logger)
+        with _stage(report, "manifest"):
+            release_config = load_release_config(repo_dir, RELEASE_FILE)
+            preflight_release(release_config, logger)
+            pull = start_pull(release_config, repo_dir, logger, DB_PATH)
+            report.fingerprint = release_fingerprint(report.commit_sha, repo_dir, release_config)
 
-        # 4. Déploiement Docker Compose
-        compose_up(release_config, repo_dir, logger)
+    return PreparedRelease(
+        app_id=app_id,
+        ref=ref,
+        repo_dir=repo_dir,
+        release_config=release_config,
+        report=report,
+        logger=logger,
+        pull=pull,
+        capabilities=capabilities,
+    )
 
-        # 5. Vérification de santé
-        wait_for_health(release_config.health, logger)
 
-        # 6. Mise à jour du statut SQLite (Succès)
-        db = DeploymentState(DB_PATH)
-        db.ensure_schema()
-        db.upsert_status(app_id, ref, "HEALTHY", "Déploiement validé par healthcheck")
-        logger.info("=== Déploiement %s (%s) terminé avec succès ===", app_id, ref)
+def abort_release(prepared: PreparedRelease, reason: str, status: str = "SKIPPED") -> DeployReport:
+    """Clôt un run préparé que `apply_release` n'exécutera pas (dépendance en échec, fail-fast).
+
+    Le pull d'images en tâche de fond est abandonné (annulé s'il n'a pas démarré),
+    le run est terminé avec `status` et `run_end` est émis. Ni les conteneurs ni le
+    statut `deployments` ne changent.
+    """
+    from core.store.sqlite_store import DeploymentState
+
+    report = prepared.report
+    if prepared.pull is not None:
+        prepared.pull.cancel()
+        prepared.pull = None
+    report.status = status
+    report.message = reason
+    if prepared.logger:
+        prepared.logger.warning("=== Déploiement %s (%s) abandonné : %s ===", prepared.app_id, prepared.ref, reason)
+    db = DeploymentState(DB_PATH)
+    db.ensure_schema()
+    _finish_run(db, report)
+    return report
+
+
+def rollback_release(
+    app_id: str,
+    *,
+    to_run_id: int | None = None,
+    reason: str | None = None,
+    job_id: int | None = None,
+) -> DeployReport:
+    """Revient à une release déjà validée, sans fetch Git ni rebuild.
+
+    Sans `to_run_id`, la cible est le dernier run HEALTHY (si le dernier run a
+    échoué) ou, sinon, le dernier run HEALTHY dont le commit ou les images
+    diffèrent du run actuel. Le commit est ré-extrait depuis `data/repos/<app_id>`
+    et `docker compose up` est lancé avec les digests d'images enregistrés.
+
+    Raises:
+        DeployError: cible introuvable, commit absent localement ou échec du redémarrage.
+    """
+    from core.deploy.fingerprint import release_fingerprint
+    from core.deploy.preflight import load_release_config, preflight_environment, preflight_release
+    from core.logging.logger import build_logger
+    from core.scm.git_repo import checkout_local_commit
+    from core.store.sqlite_store import DeploymentState
+
+    db = DeploymentState(DB_PATH)
+    db.ensure_schema()
+    target = _rollback_target(db, app_id, to_run_id)
+    report = DeployReport(app_id=app_id, ref=target["ref"], commit_sha=target["commit_sha"], job_id=job_id)
+    repo_dir = REPOS_DIR / app_id
+    logger = None
+
+    with _failure_guard(report, lambda: logger):
+        logger = build_logger(app_id, LOGS_DIR)
+        logger.info(
+            "=== Rollback %s vers le run #%s (%s, %s)%s ===",
+            app_id,
+            target["run_id"],
+            target["ref"],
+            target["commit_sha"][:12],
+            f" : {reason}" if reason else "",
+        )
+        with _stage(report, "preflight"):
+            report.run_id = db.start_run(app_id, target["ref"], job_id=job_id)
+            capabilities = preflight_environment(logger, db)
+
+        with _stage(report, "checkout"):
+            checkout_local_commit(repo_dir, target["commit_sha"], logger)
+
+        with _stage(report, "manifest"):
+            release_config = load_release_config(repo_dir, RELEASE_FILE)
+            preflight_release(release_config, logger)
+            report.fingerprint = release_fingerprint(target["commit_sha"], repo_dir, release_config)
+            report.images = dict(target["images"])
+            if not report.images:
+                logger.warning("Run #%s sans digests enregistrés : images locales utilisées telles quelles", target["run_id"])
+
+    prepared = PreparedRelease(
+        app_id=app_id,
+        ref=target["ref"],
+        repo_dir=repo_dir,
+        release_config=release_config,
+        report=report,
+        logger=logger,
+        capabilities=capabilities,
+        pinned_images=report.images,
+        success_message=f"Rollback vers le run #{target['run_id']} validé par healthcheck"
+        + (f" ({reason})" if reason else ""),
+    )
+    return apply_release(prepared)
+
+
+def _rollback_target(db, app_id: str, to_run_id: int | None) -> Dict[str, object]:
+    if to_run_id is not None:
+        target = db.get_run(to_run_id)
+        if target is None or target["app_id"] != app_id:
+            raise DeployError(f"Run #{to_run_id} introuvable pour {app_id}")
+        if target["status"] != "HEALTHY" or not target["commit_sha"]:
+            raise DeployError(f"Run #{to_run_id} n'est pas un run HEALTHY : cible de rollback invalide")
+        return target
+
+    # Un run SKIPPED (préparé puis abandonné) n'a pas touché aux conteneurs.
+    runs = [run for run in db.list_runs(app_id, limit=500) if run["status"] not in ("RUNNING", "SKIPPED")]
+    if not runs:
+        raise DeployError(f"Aucun run terminé pour {app_id}")
+    current = runs[0]
+    for run in runs:
+        if run["status"] != "HEALTHY" or not run["commit_sha"]:
+            continue
+        # Dernier run échoué : le dernier run sain est la cible. Sinon, on saute la release en place.
+        if current["status"] != "HEALTHY" or (run["commit_sha"], run["images"]) != (
+            current["commit_sha"],
+            current["images"],
+        ):
+            return run
+    raise DeployError(f"Aucune release HEALTHY antérieure pour {app_id}")
+
+
+def apply_release(prepared: PreparedRelease) -> DeployReport:
+    """Phase 2 : `docker compose up`, healthcheck et statut SQLite."""
+    from core.deploy.compose import compose_up, service_config_hashes
+    from core.deploy.health import wait_for_health
+    from core.store.sqlite_store import DeploymentState
+
+    report = prepared.report
+    logger = prepared.logger
+
+    with _failure_guard(report, lambda: logger):
+        # 4. Images (pull lancé par prepare_release)
+        config = None
+        if prepared.pull is not None:
+            with _stage(report, "pull_wait"):
+                pulled = prepared.pull.result()
+            _record_stage(report, "pull", pulled.started_at, pulled.duration)
+            report.images = pulled.digests()
+            config = pulled.config
+        if config:
+            report.service_hashes = service_config_hashes(config, report.images, report.commit_sha)
+
+        if prepared.release_config.blue_green is not None:
+            # 5-6. Nouveau slot, healthcheck, bascule de l'upstream
+            _apply_blue_green(prepared)
+        else:
+            # 5. Déploiement Docker Compose (services modifiés seulement si possible)
+            services, health = _partial_scope(prepared, config)
+            if services != []:
+                with _stage(report, "compose"):
+                    compose_up(
+                        prepared.release_config,
+                        prepared.repo_dir,
+                        logger,
+                        prepared.capabilities,
+                        pinned_images=prepared.pinned_images,
+                        services=services,
+                    )
+
+            # 6. Vérification de santé
+            if health is not None:
+                with _stage(report, "health"):
+                    wait_for_health(health, logger)
+
+        # 7. Mise à jour du statut SQLite (Succès)
+        with _stage(report, "db"):
+            db = DeploymentState(DB_PATH)
+            db.ensure_schema()
+            db.upsert_status(prepared.app_id, prepared.ref, "HEALTHY", prepared.success_message)
+
+        report.status = "HEALTHY"
+        report.message = prepared.success_message
+        _finish_run(db, report)
+        logger.info("=== Déploiement %s (%s) terminé avec succès ===", prepared.app_id, prepared.ref)
+
+    return report
 
+
+def _partial_scope(prepared: PreparedRelease, config: Optional[Dict[str, Dict]]):
+    """Services à relancer et section `health` à vérifier.
+
+    Renvoie `(None, health)` pour un déploiement complet. Le partiel exige la
+    config compose résolue, un run précédent terminé HEALTHY avec ses empreintes
+    par service, et ni `force` ni images épinglées (rollback). Un service est
+    relancé si son empreinte change, s'il dépend d'un service relancé ou s'il ne
+    tourne plus ; `[]` signifie qu'aucun ne l'est.
+    """
+    from core.deploy.compose import compose_service_states, with_dependents
+    from core.deploy.health import health_for_services
+    from core.deploy.images import service_closure
+    from core.store.sqlite_store import DeploymentState
+
+    report, logger, release = prepared.report, prepared.logger, prepared.release_config
+    full = (None, release.health)
+    if not config or not report.service_hashes or prepared.full_redeploy or prepared.pinned_images:
+        return full
+    db = DeploymentState(DB_PATH)
+    finished = [run for run in db.list_runs(prepared.app_id, limit=20) if run["status"] not in ("RUNNING", "SKIPPED")]
+    if not finished or finished[0]["status"] != "HEALTHY" or not finished[0]["service_hashes"]:
+        return full
+    previous = finished[0]["service_hashes"]
+
+    scope = service_closure(config, release.services)
+    changed = {service for service in scope if report.service_hashes.get(service) != previous.get(service)}
+    try:
+        states = compose_service_states(release, prepared.repo_dir, logger)
+    except DeployError as exc:
+        logger.info("État des conteneurs illisible (%s), déploiement complet", exc)
+        return full
+    stopped = {service for service in scope if states.get(service) != "running"}
+    affected = with_dependents(config, changed | stopped, scope)
+    if affected >= scope:
+        return full
+
+    report.updated_services = sorted(affected)
+    logger.info(
+        "Redéploiement partiel depuis le run #%s : %s (modifiés: %s, arrêtés: %s), %s inchangé(s)",
+        finished[0]["run_id"],
+        ", ".join(report.updated_services) or "aucun service",
+        ", ".join(sorted(changed)) or "-",
+        ", ".join(sorted(stopped)) or "-",
+        len(scope - affected),
+    )
+    return report.updated_services, health_for_services(release.health, affected)
+
+
+def _apply_blue_green(prepared: PreparedRelease) -> None:
+    """Démarre la couleur inactive, la valide puis y bascule l'upstream (voir `core.deploy.blue_green`)."""
+    from core.deploy.blue_green import active_slot, next_slot, remove_project, slot_env, slot_health, switch_upstream
+    from core.deploy.compose import compose_up
+    from core.deploy.health import wait_for_health
+    from core.store.sqlite_store import DeploymentState
+
+    report, logger, release = prepared.report, prepared.logger, prepared.release_config
+    config = release.blue_green
+    db = DeploymentState(DB_PATH)
+    previous = active_slot(db, prepared.app_id)
+    slot = next_slot(prepared.app_id, config, previous)
+    logger.info(
+        "Blue/green : %s actif, déploiement de %s (projet %s, port %s)",
+        previous.color if previous else "aucun slot",
+        slot.color,
+        slot.project,
+        slot.port,
+    )
+
+    try:
+        with _stage(report, "compose"):
+            compose_up(
+                release,
+                prepared.repo_dir,
+                logger,
+                prepared.capabilities,
+                project=slot.project,
+                env=slot_env(config, slot),
+                pinned_images=prepared.pinned_images,
+            )
+        with _stage(report, "health"):
+            wait_for_health(slot_health(release.health, slot.port), logger)
+        with _stage(report, "switch"):
+            switch_duration = switch_upstream(config, slot, logger)
+    except Exception:
+        # L'ancienne couleur sert toujours : on retire seulement la nouvelle.
+        remove_project(release, prepared.repo_dir, slot.project, logger)
+        raise
+
+    db.set_active_slot(prepared.app_id, slot.color, slot.project, slot.port, switch_duration)
+    with _stage(report, "teardown"):
+        # Premier passage en blue/green : l'ancienne release tourne dans le projet par défaut.
+        remove_project(release, prepared.repo_dir, previous.project if previous else None, logger)
+
+
+@contextmanager
+def _stage(report: DeployReport, name: str) -> Iterator[None]:
+    events = _events(report)
+    started_at = time.time()
+    start = time.perf_counter()
+    events.span_start(name, started_at)
+    error = None
+    try:
+        yield
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        report.stages.append(StageTiming(name=name, started_at=started_at, duration=duration))
+        DEPLOY_STAGE_SECONDS.labels(name).observe(duration)
+        events.bind(report.run_id)
+        events.span_end(name, started_at, duration, error)
+
+
+def _record_stage(report: DeployReport, name: str, started_at: float, duration: float) -> None:
+    """Étape déjà terminée, chronométrée ailleurs (ex. le pull en tâche de fond)."""
+
+    report.stages.append(StageTiming(name=name, started_at=started_at, duration=duration))
+    DEPLOY_STAGE_SECONDS.labels(name).observe(duration)
+    events = _events(report)
+    events.span_start(name, started_at)
+    events.span_end(name, started_at, duration)
+
+
+def _events(report: DeployReport):
+    """Journal JSONL du run (`core.logging.events`), créé à la première étape."""
+    from core.logging.events import RunEventLog
+
+    if report.events is None:
+        report.events = RunEventLog(report.app_id, LOGS_DIR)
+        report.events.emit("run_start", ts=report.started_at, ref=report.ref, job_id=report.job_id)
+    return report.events
+
+
+@contextmanager
+def _failure_guard(report: DeployReport, get_logger) -> Iterator[None]:
+    """Convertit toute erreur en `DeployError` après avoir tracé le statut FAILED."""
+
+    try:
+        yield
     except DeployError as exc:
         # Erreur fonctionnelle déjà tracée et gérée
         message = f"Déploiement échoué: {exc}"
-        if logger:
-            logger.exception(message)
-        
-        # Tentative de mise à jour du statut FAILED
-        if db is None:
-            try:
-                db = DeploymentState(DB_PATH)
-                db.ensure_schema()
-            except Exception as db_init_exc:
-                if logger:
-                    logger.error("Impossible d'initialiser la DB pour tracer l'échec: %s", db_init_exc)
-        
-        if db is not None:
-            try:
-                db.upsert_status(app_id, ref, "FAILED", str(exc))
-            except Exception as db_exc:
-                if logger:
-                    logger.error("Impossible d'écrire le statut d'échec: %s", db_exc)
-        
+        _record_failure(report, message, str(exc), get_logger())
         raise DeployError(message) from exc
-
     except Exception as exc:
         # Erreur non prévue (ex: NameError due à un import manquant, FileNotFoundError, etc.)
         message = f"Erreur critique lors du déploiement: {exc}"
-        if logger:
-            logger.exception(message)
-        
-        # Tentative de mise à jour du statut FAILED
-        if db is None:
-            try:
-                db = DeploymentState(DB_PATH)
-                db.ensure_schema()
-            except Exception as db_init_exc:
-                if logger:
-                    logger.error("Impossible d'initialiser la DB pour tracer l'échec: %s", db_init_exc)
-        
-        if db is not None:
-            try:
-                db.upsert_status(app_id, ref, "FAILED", message)
-            except Exception as db_exc:
-                if logger:
-                    logger.error("Impossible d'écrire le statut d'échec: %s", db_exc)
-        
+        _record_failure(report, message, message, get_logger())
         raise DeployError(message) from exc
+
+
+def _record_failure(report: DeployReport, message: str, db_message: str, logger) -> None:
+    from core.store.sqlite_store import DeploymentState
+
+    report.status = "FAILED"
+    report.message = db_message
+    if logger:
+        logger.exception(message)
+
+    # Tentative de mise à jour du statut FAILED
+    try:
+        db = DeploymentState(DB_PATH)
+        db.ensure_schema()
+    except Exception as db_init_exc:
+        if logger:
+            logger.error("Impossible d'initialiser la DB pour tracer l'échec: %s", db_init_exc)
+        return
+
+    try:
+        db.upsert_status(report.app_id, report.ref, "FAILED", db_message)
+        _finish_run(db, report)
+    except Exception as db_exc:
+        if logger:
+            logger.error("Impossible d'écrire le statut d'échec: %s", db_exc)
+
+
+def _finish_run(db, report: DeployReport) -> None:
+    if report.run_id is None:
+        return
+    duration = time.time() - report.started_at
+    DEPLOY_SECONDS.labels(report.status).observe(duration)
+    events = _events(report)
+    events.bind(report.run_id)
+    events.emit(
+        "run_end",
+        status=report.status,
+        message=report.message,
+        commit_sha=report.commit_sha,
+        fast_path=report.fast_path,
+        updated_services=report.updated_services,
+        duration_ms=int(duration * 1000),
+    )
+    db.finish_run(
+        report.run_id,
+        report.status,
+        report.message,
+        commit_sha=report.commit_sha,
+        stages=report.stages_payload(),
+        duration=duration,
+        fingerprint=report.fingerprint,
+        images=report.images or None,
+        service_hashes=report.service_hashes or None,
+    )
+
+
+def _try_fast_path(
+    app_id: str, ref: str, job_id: int | None = None, *, remote_url: str | None = None
+) -> Optional[DeployReport]:
+    """Redéploiement sans changement : renvoie un rapport HEALTHY, ou None pour le chemin complet.
+
+    Les vérifications vont de la moins chère à la plus chère : dernier run en base,
+    empreinte des fichiers déjà extraits, `git ls-remote`, `docker compose ps` puis
+    une seule tentative de healthcheck. Tout écart ou erreur renvoie au chemin complet,
+    y compris un `remote_url` différent de l'origine de l'extraction existante.
+    """
+    from core.deploy.blue_green import slot_health
+    from core.deploy.compose import compose_services_running
+    from core.deploy.fingerprint import release_fingerprint, resolve_remote_ref
+    from core.deploy.health import wait_for_health
+    from core.deploy.preflight import load_release_config
+    from core.logging.logger import build_logger
+    from core.scm.git_repo import head_commit, origin_url
+    from core.scm.webhooks import normalize_repo_url
+    from core.store.sqlite_store import DeploymentState
+
+    repo_dir = REPOS_DIR / app_id
+    if not (repo_dir / ".git").exists():
+        return None
+    db = DeploymentState(DB_PATH)
+    db.ensure_schema()
+    latest = db.list_runs(app_id, limit=1)
+    if not latest or latest[0]["status"] != "HEALTHY" or not latest[0]["fingerprint"]:
+        return None
+    previous = latest[0]
+
+    report = DeployReport(app_id=app_id, ref=ref, job_id=job_id)
+    logger = build_logger(app_id, LOGS_DIR)
+    try:
+        with _stage(report, "fast_path"):
+            if remote_url and normalize_repo_url(remote_url) != normalize_repo_url(origin_url(repo_dir)):
+                logger.info("Remote %s différent de l'origine de %s, déploiement complet", remote_url, repo_dir)
+                return None
+            commit_sha = head_commit(repo_dir)
+            if commit_sha != previous["commit_sha"]:
+                return None
+            release_config = load_release_config(repo_dir, RELEASE_FILE)
+            fingerprint = release_fingerprint(commit_sha, repo_dir, release_config)
+            if fingerprint != previous["fingerprint"]:
+                return None
+            if resolve_remote_ref(repo_dir, ref) != commit_sha:
+                return None
+
+            logger.info("=== Déploiement %s (%s) : empreinte inchangée, vérification rapide ===", app_id, ref)
+            health, project = release_config.health, None
+            if release_config.blue_green is not None:
+                slot = db.get_active_slot(app_id)
+                if slot is None:
+                    return None
+                health, project = slot_health(health, slot["port"]), slot["project"]
+            if not compose_services_running(release_config, repo_dir, logger, project=project):
+                logger.info("Conteneurs à relancer, déploiement complet")
+                return None
+            probe = dict(health, retries=1)
+            probe["timeout"] = min(float(probe.get("timeout", DEFAULT_HEALTH_TIMEOUT)), FAST_PATH_PROBE_TIMEOUT)
+            wait_for_health(probe, logger)
+    except Exception as exc:  # noqa: BLE001 - le chemin complet reprend la main
+        logger.info("Chemin rapide abandonné (%s), déploiement complet", exc)
+        return None
+
+    message = f"Aucun changement depuis le run #{previous['run_id']} (empreinte identique)"
+    report.commit_sha = commit_sha
+    report.fingerprint = fingerprint
+    report.images = previous["images"]
+    report.service_hashes = previous["service_hashes"]
+    report.fast_path = True
+    report.status = "HEALTHY"
+    report.message = message
+    report.run_id = db.start_run(app_id, ref, job_id=job_id)
+    db.upsert_status(app_id, ref, "HEALTHY", message)
+    _finish_run(db, report)
+    logger.info("=== Déploiement %s (%s) : %s ===", app_id, ref, message)
+    return report
@@ -0,0 +1,117 @@
+"""Empreinte d'une release pour détecter les redéploiements sans changement.
+
+L'empreinte combine tout ce qui détermine l'état des conteneurs après
+`docker compose up` :
+- le SHA du commit déployé ;
+- le contenu de `ikoma.release.json` ;
+- le contenu du fichier compose et du `.env` voisin s'il existe ;
+- les variables d'environnement interpolées par le fichier compose (`${VAR}`).
+
+Elle est stockée avec chaque run HEALTHY dans `deployment_runs.fingerprint`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+from core.deploy.deploy_up import RELEASE_FILE, ReleaseConfig
+
+FINGERPRINT_VERSION = "1"
+_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+# ${VAR}, ${VAR:-défaut}, ${VAR?erreur} et $VAR ; `$$` est un dollar littéral pour compose.
+_ENV_REF_RE = re.compile(r"(?<!\$)\$(?:\{([A-Za-z_][A-Za-z0-9_]*)[^}]*\}|([A-Za-z_][A-Za-z0-9_]*))")
+
+
+def release_fingerprint(
+    commit_sha: str,
+    repo_dir: Path,
+    release: ReleaseConfig,
+    env: Mapping[str, str] | None = None,
+) -> str:
+    """SHA-256 hexadécimal de l'empreinte d'une release extraite dans `repo_dir`."""
+
+    dotenv = release.compose_file.parent / ".env"
+    return content_fingerprint(
+        commit_sha,
+        (repo_dir / RELEASE_FILE).read_bytes(),
+        release.compose_file.read_bytes(),
+        dotenv.read_bytes() if dotenv.is_file() else None,
+        env,
+    )
+
+
+def content_fingerprint(
+    commit_sha: str,
+    manifest: bytes,
+    compose: bytes,
+    dotenv: Optional[bytes],
+    env: Mapping[str, str] | None = None,
+) -> str:
+    """Empreinte calculée à partir des contenus, sans release extraite (plan de déploiement)."""
+
+    env = os.environ if env is None else env
+    inputs = {
+        "version": FINGERPRINT_VERSION,
+        "commit": commit_sha,
+        "manifest": hashlib.sha256(manifest).hexdigest(),
+        "compose": hashlib.sha256(compose).hexdigest(),
+        "dotenv": hashlib.sha256(dotenv).hexdigest() if dotenv is not None else None,
+        "env": compose_env_inputs(compose.decode("utf-8", errors="replace"), env),
+    }
+    raw = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compose_env_inputs(compose_text: str, env: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    """Valeurs des variables d'environnement référencées par le fichier compose.
+
+    Les valeurs sont hachées : l'empreinte ne doit pas exposer de secrets.
+    """
+
+    names = {braced or bare for braced, bare in _ENV_REF_RE.findall(compose_text)}
+    return {
+        name: hashlib.sha256(env[name].encode("utf-8")).hexdigest() if name in env else None
+        for name in sorted(names)
+    }
+
+
+def resolve_remote_ref(
+    repo_dir: Optional[Path], ref: str, timeout: float = 10.0, remote: str = "origin"
+) -> Optional[str]:
+    """SHA pointé par `ref` sur `remote`, sans rien télécharger (`git ls-remote`).
+
+    `remote` peut être une URL : `repo_dir` est alors facultatif (aucun dépôt local).
+    Renvoie None si la résolution échoue (remote injoignable, ref inconnue, SHA abrégé).
+    """
+
+    if _SHA_RE.match(ref):
+        return ref
+    try:
+        result = subprocess.run(
+            ["git", "ls-remote", remote, ref, f"{ref}^{{}}"],
+            cwd=repo_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            timeout=timeout,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+
+    refs: Dict[str, str] = {}
+    for line in result.stdout.splitlines():
+        sha, _, name = line.partition("\t")
+        refs[name] = sha
+    # Même priorité que `git fetch origin <ref>` : branche, puis tag (déréférencé), puis ref exacte.
+    for candidate in (f"refs/heads/{ref}", f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}", ref):
+        if candidate in refs:
+            return refs[candidate]
+    return None
@@ -1,67 +1,394 @@
+"""Healthchecks concurrents (HTTP, TCP, commande) avec backoff adaptatif.
+
+Le bloc `health` du manifest accepte soit la forme historique (une `url` HTTP),
+soit une liste `probes` agrégée selon `mode` :
+- `all` (défaut) : toutes les sondes doivent réussir ;
+- `any` : une seule suffit ;
+- `quorum` : au moins `quorum` sondes doivent réussir.
+
+Chaque sonde est interrogée en boucle de façon indépendante : d'abord à cadence
+rapide (`initial_interval`), puis avec un délai multiplié par `backoff` à chaque
+échec, plafonné à `interval` et perturbé d'un `jitter` aléatoire. Les sondes HTTP
+conservent leur connexion keep-alive d'une tentative à l'autre, sauf après un
+timeout : le thread de la tentative abandonnée peut encore l'utiliser, elle est
+donc fermée et la tentative suivante en ouvre une neuve. Elles suivent les
+redirections 3xx vers le même hôte (au plus `MAX_REDIRECTS`) quand le statut
+attendu n'est pas lui-même une redirection ; une redirection vers un autre hôte
+est un échec.
+
+Une sonde peut nommer le `service` compose qu'elle vérifie : lors d'un
+redéploiement partiel, seules les sondes des services relancés (et celles sans
+`service`) sont exécutées (`health_for_services`).
+
+`wait_for_health` reste l'API synchrone utilisée par `deploy_up`.
+"""
 from __future__ import annotations
 
+import asyncio
+import http.client
+import random
+import shlex
+import threading
 import time
-from typing import Dict
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from dataclasses import dataclass, field
+from typing import Collection, List, Mapping, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
 
 from core.deploy.deploy_up import DEFAULT_EXPECTED_STATUS, DEFAULT_HEALTH_INTERVAL, DEFAULT_HEALTH_TIMEOUT, DeployError
+from core.logging.metrics import HEALTH_ATTEMPTS, HEALTH_PROBE_SECONDS, HEALTH_WAIT_SECONDS
 
+DEFAULT_INITIAL_INTERVAL = 0.25  # secondes
+DEFAULT_BACKOFF = 2.0
+DEFAULT_JITTER = 0.2  # fraction du délai
+DEFAULT_BASE_URL = "http://localhost:8080"
+HEALTH_MODES = ("all", "any", "quorum")
+PROBE_TYPES = ("http", "tcp", "command")
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass
+class ProbeResult:
+    name: str
+    healthy: bool = False
+    attempts: int = 0
+    last_error: Optional[str] = None
+    latencies: List[float] = field(default_factory=list)  # secondes, une par tentative
+
+
+@dataclass
+class HealthResult:
+    healthy: bool
+    mode: str
+    probes: List[ProbeResult]
+    duration: float
+
+
+@dataclass
+class _Policy:
+    timeout: float
+    interval: float
+    initial_interval: float
+    backoff: float
+    jitter: float
+    max_attempts: Optional[int]
+
+    def delays(self):
+        delay = min(self.initial_interval, self.interval)
+        while True:
+            spread = delay * self.jitter
+            yield max(0.0, delay + random.uniform(-spread, spread))  # nosec - jitter, pas de crypto
+            delay = min(self.interval, delay * self.backoff)
+
+
+def wait_for_health(health: Mapping[str, object], logger) -> HealthResult:
+    """Attend que les sondes du manifest soient saines (API synchrone).
+
+    Raises:
+        DeployError: si l'agrégat n'est pas satisfait avant le timeout.
+    """
+
+    return asyncio.run(wait_for_health_async(health, logger))
 
-def wait_for_health(health: Dict[str, object], logger) -> None:
-    url = str(health.get("url"))
-    # If URL is just a path, we need to determine the host/port.
-    # In the context of IKOMA Runner, we check against the local bind if available.
-    # For now, we assume the URL in the manifest is absolute or we'll need to improve this.
-    if url.startswith("/"):
-        # Default to localhost:8080 for the sample app logic or similar
-        # This part might need refinement based on how Runner knows the port
-        logger.warning("URL de healthcheck relative détectée (%s), utilisation de http://localhost:8080%s", url, url)
-        url = f"http://localhost:8080{url}"
-
-    expected_status = int(health.get("expected_status", DEFAULT_EXPECTED_STATUS))
-    timeout = int(health.get("timeout", DEFAULT_HEALTH_TIMEOUT))
-    interval = int(health.get("interval", DEFAULT_HEALTH_INTERVAL))
-    retries = health.get("retries")
-    max_attempts = int(retries) if retries is not None else None
+
+async def wait_for_health_async(health: Mapping[str, object], logger) -> HealthResult:
+    policy = _policy_from(health)
+    probes = [_build_probe(spec, health, logger) for spec in _probe_specs(health)]
+    mode = str(health.get("mode", "all"))
+    required = _required_successes(mode, health, len(probes))
 
     logger.info(
-        "Healthcheck HTTP sur %s (attendu=%s, timeout=%ss, interval=%ss, retries=%s)",
-        url,
-        expected_status,
-        timeout,
-        interval,
-        max_attempts or "illimité",
+        "Healthcheck de %s sonde(s) [%s] (mode=%s, timeout=%ss, interval=%s→%ss, retries=%s)",
+        len(probes),
+        ", ".join(probe.name for probe in probes),
+        mode,
+        policy.timeout,
+        policy.initial_interval,
+        policy.interval,
+        policy.max_attempts or "illimité",
     )
 
-    deadline = time.time() + timeout
-    last_error: str | None = None
-    attempts = 0
+    start = time.monotonic()
+    deadline = start + policy.timeout
+    tasks = [asyncio.create_task(_poll(probe, policy, deadline, logger)) for probe in probes]
+    successes = 0
+    finished = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            finished += 1
+            if result.healthy:
+                successes += 1
+            if successes >= required:
+                break
+            if successes + (len(tasks) - finished) < required:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for probe in probes:
+            probe.close()
 
-    while time.time() < deadline:
-        if max_attempts is not None and attempts >= max_attempts:
-            break
-        attempts += 1
+    results = [probe.result for probe in probes]
+    duration = time.monotonic() - start
+    HEALTH_WAIT_SECONDS.labels("ok" if successes >= required else "error").observe(duration)
+    if successes >= required:
+        attempts = sum(result.attempts for result in results)
+        logger.info("Healthcheck OK (%s/%s sonde(s), %s tentative(s), %.2fs)", successes, len(probes), attempts, duration)
+        return HealthResult(healthy=True, mode=mode, probes=results, duration=duration)
+
+    failures = "; ".join(f"{r.name}: {r.last_error or 'timeout'}" for r in results if not r.healthy)
+    reason = failures or f"Healthcheck expiré après {duration:.1f}s"
+    raise DeployError(reason)
 
-        remaining = max(1, int(deadline - time.time()))
-        request_timeout = min(interval, remaining)
 
+async def _poll(probe: "_Probe", policy: _Policy, deadline: float, logger) -> ProbeResult:
+    result = probe.result
+    try:
+        return await _poll_attempts(probe, policy, deadline, logger)
+    finally:
+        # Annulation comprise (sondes restantes en mode `any`/`quorum`).
+        HEALTH_ATTEMPTS.labels(probe.kind, "ok" if result.healthy else "error").observe(result.attempts)
+
+
+async def _poll_attempts(probe: "_Probe", policy: _Policy, deadline: float, logger) -> ProbeResult:
+    result = probe.result
+    delays = policy.delays()
+    while time.monotonic() < deadline:
+        if policy.max_attempts is not None and result.attempts >= policy.max_attempts:
+            break
+        result.attempts += 1
+        remaining = max(0.5, deadline - time.monotonic())
+        attempt_timeout = min(max(policy.interval, 1.0), remaining)
+
+        started = time.monotonic()
         try:
-            req = Request(url, method="GET")
-            with urlopen(req, timeout=request_timeout) as resp:  # nosec - URL contrôlée via manifest
-                if resp.status == expected_status:
-                    logger.info("Healthcheck OK (%s) après %s tentative(s)", resp.status, attempts)
-                    return
-                last_error = f"Statut inattendu: {resp.status}"
-                logger.warning(last_error)
-        except (HTTPError, URLError) as exc:
-            last_error = f"Erreur HTTP: {exc}"
-            logger.warning(last_error)
+            error = await asyncio.wait_for(probe.check(attempt_timeout), timeout=attempt_timeout + 0.5)
+        except asyncio.TimeoutError:
+            error = f"Pas de réponse après {attempt_timeout:.1f}s"
         except Exception as exc:  # noqa: BLE001
-            last_error = f"Erreur non prévue: {exc}"
-            logger.warning(last_error)
+            error = f"Erreur non prévue: {exc}"
+        latency = time.monotonic() - started
+        result.latencies.append(latency)
+        HEALTH_PROBE_SECONDS.labels(probe.kind, "ok" if error is None else "error").observe(latency)
 
-        time.sleep(interval)
+        if error is None:
+            result.healthy = True
+            logger.info("Sonde %s OK après %s tentative(s)", probe.name, result.attempts)
+            return result
+
+        result.last_error = error
+        logger.warning("Sonde %s: %s", probe.name, error)
+        await asyncio.sleep(min(next(delays), max(0.0, deadline - time.monotonic())))
+    return result
+
+
+# --- Sondes ---
+class _Probe:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.kind = name.split(" ", 1)[0]  # http, tcp, command
+        self.result = ProbeResult(name=name)
+
+    async def check(self, timeout: float) -> Optional[str]:
+        """Renvoie None si la sonde est saine, sinon la raison de l'échec."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class _HttpProbe(_Probe):
+    def __init__(self, url: str, expected_status: int) -> None:
+        super().__init__(f"http {url}")
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.expected_status = expected_status
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    async def check(self, timeout: float) -> Optional[str]:
+        # La tentative est seule propriétaire de la connexion. Si elle est annulée,
+        # son thread la ferme en terminant et `_conn` reste vide.
+        conn, self._conn = self._conn, None
+        abandoned = threading.Event()
+        try:
+            conn, error = await asyncio.to_thread(self._request, conn, timeout, abandoned)
+        except asyncio.CancelledError:
+            abandoned.set()
+            raise
+        self._conn = conn
+        return error
+
+    def _request(
+        self, conn: Optional[http.client.HTTPConnection], timeout: float, abandoned: threading.Event
+    ) -> Tuple[Optional[http.client.HTTPConnection], Optional[str]]:
+        path = self.path
+        error: Optional[str] = None
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                if conn is None:
+                    factory = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+                    conn = factory(self.host, self.port, timeout=timeout)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request("GET", path, headers={"Connection": "keep-alive"})
+                resp = conn.getresponse()
+                resp.read()  # vide la réponse pour réutiliser la connexion
+                if resp.will_close:
+                    conn.close()
+                    conn = None
+                location = resp.getheader("Location")
+                if resp.status == self.expected_status or resp.status not in REDIRECT_STATUSES or not location:
+                    break
+                path = self._same_host_path(location, path)
+                if path is None:
+                    error = f"Redirection {resp.status} vers un autre hôte: {location}"
+                    break
+            else:
+                error = f"Plus de {MAX_REDIRECTS} redirections"
+            if error is None and resp.status != self.expected_status:
+                error = f"Statut inattendu: {resp.status}"
+        except (OSError, http.client.HTTPException) as exc:
+            if conn is not None:
+                conn.close()
+            conn, error = None, f"Erreur HTTP: {exc}"
+        if abandoned.is_set() and conn is not None:
+            conn.close()
+            conn = None
+        return conn, error
+
+    def _same_host_path(self, location: str, current_path: str) -> Optional[str]:
+        """Chemin de `location` s'il vise le même schéma, hôte et port ; None sinon."""
+
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        netloc = f"{host}:{self.port}" if self.port else host
+        target = urlsplit(urljoin(f"{self.scheme}://{netloc}{current_path}", location))
+        default = _DEFAULT_PORTS.get(self.scheme)
+        if (target.scheme, target.hostname, target.port or default) != (self.scheme, self.host, self.port or default):
+            return None
+        return (target.path or "/") + (f"?{target.query}" if target.query else "")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _TcpProbe(_Probe):
+    def __init__(self, host: str, port: int) -> None:
+        super().__init__(f"tcp {host}:{port}")
+        self.host = host
+        self.port = port
+
+    async def check(self, timeout: float) -> Optional[str]:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout=timeout)
+        except (OSError, asyncio.TimeoutError) as exc:
+            return f"Connexion TCP refusée: {exc or 'timeout'}"
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return None
+
+
+class _CommandProbe(_Probe):
+    def __init__(self, command: List[str]) -> None:
+        super().__init__(f"command {' '.join(command)}")
+        self.command = command
+
+    async def check(self, timeout: float) -> Optional[str]:
+        process = await asyncio.create_subprocess_exec(
+            *self.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return f"Commande expirée après {timeout:.1f}s"
+        finally:
+            # Timeout, mais aussi annulation (mode `any`/`quorum`, échéance globale).
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        if process.returncode != 0:
+            tail = output.decode("utf-8", errors="replace").strip()[-200:]
+            return f"Code retour {process.returncode}: {tail}"
+        return None
+
+
+# --- Lecture du manifest ---
+def health_for_services(health: Mapping[str, object], services: Collection[str]) -> Optional[Mapping[str, object]]:
+    """Section `health` limitée aux sondes des `services` relancés ; None s'il ne reste aucune sonde.
+
+    Les sondes sans clé `service` (et la forme historique `url`) sont toujours conservées.
+    """
+
+    probes = health.get("probes")
+    if not probes:
+        return health
+    kept = [probe for probe in probes if probe.get("service") is None or probe.get("service") in services]
+    if len(kept) == len(probes):
+        return health
+    if not kept:
+        return None
+    scoped = dict(health, probes=kept)
+    if "quorum" in scoped:
+        scoped["quorum"] = min(int(scoped["quorum"]), len(kept))
+    return scoped
+
+
+def _probe_specs(health: Mapping[str, object]) -> List[Mapping[str, object]]:
+    probes = health.get("probes")
+    if probes:
+        return list(probes)  # type: ignore[arg-type]
+    return [{"type": "http", "url": health.get("url"), "expected_status": health.get("expected_status")}]
+
+
+def _build_probe(spec: Mapping[str, object], health: Mapping[str, object], logger) -> _Probe:
+    probe_type = str(spec.get("type", "http"))
+    if probe_type == "http":
+        url = str(spec.get("url"))
+        # If URL is just a path, we need to determine the host/port.
+        # In the context of IKOMA Runner, we check against the local bind if available.
+        if url.startswith("/"):
+            logger.warning("URL de healthcheck relative détectée (%s), utilisation de %s%s", url, DEFAULT_BASE_URL, url)
+            url = f"{DEFAULT_BASE_URL}{url}"
+        expected = spec.get("expected_status") or health.get("expected_status", DEFAULT_EXPECTED_STATUS)
+        return _HttpProbe(url, int(expected))
+    if probe_type == "tcp":
+        return _TcpProbe(str(spec.get("host", "localhost")), int(spec["port"]))
+    if probe_type == "command":
+        command = spec["command"]
+        return _CommandProbe(shlex.split(command) if isinstance(command, str) else [str(c) for c in command])
+    raise DeployError(f"Type de sonde inconnu: {probe_type}")
+
+
+def _policy_from(health: Mapping[str, object]) -> _Policy:
+    interval = float(health.get("interval", DEFAULT_HEALTH_INTERVAL))
+    retries = health.get("retries")
+    return _Policy(
+        timeout=float(health.get("timeout", DEFAULT_HEALTH_TIMEOUT)),
+        interval=interval,
+        initial_interval=float(health.get("initial_interval", min(DEFAULT_INITIAL_INTERVAL, interval))),
+        backoff=float(health.get("backoff", DEFAULT_BACKOFF)),
+        jitter=float(health.get("jitter", DEFAULT_JITTER)),
+        max_attempts=int(retries) if retries is not None else None,
+    )
+
+
+def _required_successes(mode: str, health: Mapping[str, object], count: int) -> int:
+    if mode == "any":
+        return 1
+    if mode == "quorum":
+        return min(count, int(health.get("quorum", count // 2 + 1)))
+    if mode == "all":
+        return count
+    raise DeployError(f"Mode de healthcheck inconnu: {mode}")
 
-    reason = last_error or f"Healthcheck expiré après {attempts} tentative(s)"
-    raise DeployError(reason)
@@ -0,0 +1,220 @@
+"""Pré-téléchargement des images Docker d'une release.
+
+Le pull est lancé dès que le manifest est lu (`start_pull`) et tourne en tâche
+de fond pendant le reste du pré-vol ; `apply_release` l'attend juste avant
+`docker compose up`, qui n'a alors plus qu'à recréer les conteneurs. Chaque
+service est tiré en parallèle (`IKOMA_PULL_PARALLELISM`, 4 par défaut).
+
+Les digests obtenus sont mémorisés dans la table SQLite `image_digests` :
+- une image épinglée (`repo@sha256:...`) déjà présente n'est jamais re-tirée ;
+- une image par tag vérifiée depuis moins de `IKOMA_IMAGE_CHECK_TTL` secondes
+  (300 par défaut) et dont le digest local n'a pas bougé ne consulte pas le registre.
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+from core.deploy.deploy_up import DeployError, ReleaseConfig
+from core.logging.logger import run_command
+
+DEFAULT_PULL_PARALLELISM = 4
+DEFAULT_IMAGE_CHECK_TTL = 300  # secondes
+DOCKER_QUERY_TIMEOUT = 10.0  # secondes pour `compose config` et `image inspect` (démon bloqué)
+
+
+@dataclass
+class ImagePull:
+    service: str
+    image: str
+    digest: Optional[str]
+    pulled: bool  # False : cache local jugé à jour, registre non consulté
+    duration: float
+
+
+@dataclass
+class PullReport:
+    started_at: float
+    duration: float = 0.0
+    images: List[ImagePull] = field(default_factory=list)
+    config: Dict[str, Dict] = field(default_factory=dict)  # `docker compose config` : {service: spec}
+
+    def digests(self) -> Dict[str, str]:
+        """`{service: image@digest}` des services résolus, pour épingler un rollback."""
+
+        return {pull.service: f"{image_repository(pull.image)}@{pull.digest}" for pull in self.images if pull.digest}
+
+
+def start_pull(release: ReleaseConfig, repo_dir: Path, logger, db_path: Path) -> "Future[PullReport]":
+    """Lance `pull_images` en tâche de fond et renvoie son `Future`."""
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ikoma-pull")
+    future = executor.submit(pull_images, release, repo_dir, logger, db_path)
+    executor.shutdown(wait=False)
+    return future
+
+
+def pull_images(release: ReleaseConfig, repo_dir: Path, logger, db_path: Path) -> PullReport:
+    from core.store.sqlite_store import DeploymentState
+
+    report = PullReport(started_at=time.time())
+    start = time.perf_counter()
+    report.config = compose_config(repo_dir, compose_file=release.compose_file)
+    services = service_images(report.config, release.services)
+    if not services:
+        logger.info("Aucune image à tirer (services construits localement)")
+        return report
+
+    db = DeploymentState(db_path)
+    known = db.get_image_digests(list(services.values()))
+    ttl = float(os.getenv("IKOMA_IMAGE_CHECK_TTL", DEFAULT_IMAGE_CHECK_TTL))
+    parallelism = max(1, int(os.getenv("IKOMA_PULL_PARALLELISM", DEFAULT_PULL_PARALLELISM)))
+
+    def pull(service: str, image: str) -> ImagePull:
+        pull_start = time.perf_counter()
+        local = local_digest(image, repo_dir)
+        cached = known.get(image)
+        if local and ("@sha256:" in image or (cached and cached[0] == local and time.time() - cached[1] < ttl)):
+            return ImagePull(service, image, local, pulled=False, duration=time.perf_counter() - pull_start)
+
+        run_command(
+            ["docker", "compose", "-f", str(release.compose_file), "pull", "--quiet", service],
+            cwd=repo_dir,
+            logger=logger,
+        )
+        digest = local_digest(image, repo_dir)
+        return ImagePull(service, image, digest, pulled=True, duration=time.perf_counter() - pull_start)
+
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(services)), thread_name_prefix="ikoma-pull") as pool:
+        futures = [pool.submit(pull, service, image) for service, image in sorted(services.items())]
+        errors = []
+        for future in futures:
+            try:
+                report.images.append(future.result())
+            except DeployError as exc:
+                errors.append(str(exc))
+    if errors:
+        raise DeployError(f"Pull des images échoué: {'; '.join(errors)}")
+
+    for pull in report.images:
+        if pull.pulled and pull.digest:
+            db.record_image_digest(pull.image, pull.digest)
+    report.duration = time.perf_counter() - start
+    fresh = sum(1 for pull in report.images if pull.pulled)
+    logger.info(
+        "Images prêtes en %.2fs (%s tirée(s), %s à jour en cache)",
+        report.duration,
+        fresh,
+        len(report.images) - fresh,
+    )
+    return report
+
+
+def service_images(services: Dict[str, Dict], selected: Sequence[str]) -> Dict[str, str]:
+    """`{service: image}` des services à tirer, dépendances comprises.
+
+    Les services sans clé `image` (construits par `build`) sont ignorés.
+    """
+
+    wanted = service_closure(services, selected)
+    return {
+        name: spec["image"]
+        for name, spec in services.items()
+        if name in wanted and spec.get("image") and not spec.get("build")
+    }
+
+
+def compose_config(repo_dir: Path, *, compose_file: Path | None = None, content: bytes | None = None) -> Dict[str, Dict]:
+    """Services de `docker compose config --format json`, lu depuis `compose_file` ou `content` (stdin)."""
+
+    source = "-" if compose_file is None else str(compose_file)
+    command = ["docker", "compose", "-f", source, "config", "--format", "json"]
+    result = _run_query(command, repo_dir, input=content, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise DeployError(f"docker compose config échoué: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return json.loads(result.stdout).get("services", {})
+
+
+def service_closure(services: Dict[str, Dict], selected: Sequence[str]) -> Set[str]:
+    """Services `selected` (tous si vide) et leurs `depends_on`, transitivement."""
+
+    wanted = set(selected or services)
+    pending = list(wanted)
+    while pending:
+        depends_on = services.get(pending.pop(), {}).get("depends_on") or {}
+        for dependency in depends_on:
+            if dependency not in wanted:
+                wanted.add(dependency)
+                pending.append(dependency)
+    return wanted
+
+
+def image_repository(image: str) -> str:
+    """Dépôt d'une référence d'image, sans tag ni digest (`repo:tag` -> `repo`)."""
+
+    name = image.split("@", 1)[0]
+    head, sep, tag = name.rpartition(":")
+    # `registry:5000/repo` : le `:` appartient à l'hôte, pas au tag.
+    return head if sep and "/" not in tag else name
+
+
+def local_digest(image: str, repo_dir: Path) -> Optional[str]:
+    """Digest de registre (`sha256:...`) de l'image locale, None si absente.
+
+    Une image tirée de plusieurs dépôts a plusieurs `RepoDigests` : seul celui du
+    dépôt de `image` est retenu.
+    """
+
+    command = ["docker", "image", "inspect", "--format", "{{json .RepoDigests}}", image]
+    result = _run_query(command, repo_dir, stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        return None
+    try:
+        repo_digests = json.loads(result.stdout.decode("utf-8").strip() or "[]") or []
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    repository = _canonical_repository(image_repository(image))
+    digests = [
+        digest for name, _, digest in (entry.partition("@") for entry in repo_digests)
+        if digest and _canonical_repository(name) == repository
+    ]
+    if "@sha256:" in image:
+        pinned = image.split("@", 1)[1]
+        return pinned if pinned in digests else None
+    return digests[0] if digests else None
+
+
+def _canonical_repository(repository: str) -> str:
+    """Forme comparable d'un dépôt Docker Hub : `docker.io/library/nginx` -> `nginx`."""
+
+    for prefix in ("docker.io/", "index.docker.io/", "library/"):
+        if repository.startswith(prefix):
+            repository = repository[len(prefix) :]
+    return repository
+
+
+def _run_query(command: List[str], repo_dir: Path, *, stderr: int, input: bytes | None = None):
+    """Requête courte au démon Docker, bornée par `DOCKER_QUERY_TIMEOUT`.
+
+    Raises:
+        DeployError: si le démon ne répond pas à temps.
+    """
+
+    try:
+        return subprocess.run(
+            command,
+            cwd=repo_dir,
+            input=input,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            timeout=DOCKER_QUERY_TIMEOUT,
+            check=False,
+        )
+    except subprocess.TimeoutExpired as exc:
+        raise DeployError(f"Commande expirée après {DOCKER_QUERY_TIMEOUT}s: {' '.join(command)}") from exc
@@ -0,0 +1,487 @@
+"""Schéma compilé et cache du manifest `ikoma.release.json`.
+
+Le schéma est déclaré une fois (`RELEASE_SCHEMA`) avec quelques nœuds
+(`String`, `Number`, `ListOf`, `OneOf`, `Enum`, `Object`, `Tagged`) puis compilé
+en fonctions de validation à l'import. La validation relève toutes les erreurs
+avec leur chemin (`health.probes[1].port: doit être un entier`) au lieu de
+s'arrêter à la première.
+
+Un manifest valide est converti en objets figés (`ReleaseConfig`, sections
+`health` en lecture seule) et mis en cache par empreinte SHA-256 du contenu :
+le déploiement, le chemin rapide, `ikoma manifest check` et l'API partagent ce
+cache (`IKOMA_MANIFEST_CACHE_SIZE` entrées, 256 par défaut).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import operator
+import os
+import re
+import shlex
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from core.deploy.deploy_up import BlueGreenConfig, DeployError, ReleaseConfig
+from core.deploy.health import HEALTH_MODES, PROBE_TYPES
+
+DEFAULT_MANIFEST_CACHE_SIZE = 256
+DEFAULT_COMPOSE_FILE = "docker-compose.yml"
+
+Errors = List[Tuple[str, str]]
+# `errors=None` : mode rapide, renvoie False à la première erreur sans construire de chemin.
+Validator = Callable[[Any, str, Optional[Errors]], bool]
+Check = Callable[[Mapping[str, Any], str, Optional[Errors]], bool]
+
+
+class ManifestError(DeployError):
+    """Manifest invalide ; `errors` liste les couples (chemin, message)."""
+
+    def __init__(self, source: str, errors: Errors) -> None:
+        self.source = source
+        self.errors = errors
+        details = "; ".join(f"{path}: {message}" if path else message for path, message in errors)
+        super().__init__(f"Manifest {source} invalide: {details}")
+
+
+# --- Nœuds du schéma ---
+@dataclass(frozen=True)
+class String:
+    non_empty: bool = True
+    pattern: Optional[str] = None
+    contains: Optional[str] = None
+    absolute_path: bool = False
+    description: str = "une chaîne non vide"
+
+
+@dataclass(frozen=True)
+class Number:
+    integer: bool = False
+    gt: Optional[float] = None
+    ge: Optional[float] = None
+    lt: Optional[float] = None
+    le: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Enum:
+    values: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class ListOf:
+    item: Any
+    non_empty: bool = False
+
+
+@dataclass(frozen=True)
+class OneOf:
+    options: Tuple[Any, ...]
+    description: str
+
+
+@dataclass(frozen=True)
+class Object:
+    fields: Mapping[str, Any]
+    required: Tuple[str, ...] = ()
+    closed: bool = False  # refuse les clés non déclarées
+    checks: Tuple[Check, ...] = ()
+
+
+@dataclass(frozen=True)
+class Tagged:
+    """Objet dont la forme dépend de la clé `tag` (ex. le `type` d'une sonde)."""
+
+    tag: str
+    default: str
+    variants: Mapping[str, Object] = field(default_factory=dict)
+
+
+# --- Compilation ---
+def compile_schema(node: Any) -> Validator:
+    """Transforme un nœud en fonction `(valeur, chemin, erreurs) -> valide`."""
+
+    if isinstance(node, String):
+        return _compile_string(node)
+    if isinstance(node, Number):
+        return _compile_number(node)
+    if isinstance(node, Enum):
+        allowed = frozenset(node.values)
+        message = f"doit valoir {', '.join(node.values)}"
+
+        def validate_enum(value: Any, path: str, errors: Optional[Errors]) -> bool:
+            if isinstance(value, str) and value in allowed:
+                return True
+            return _fail(errors, path, message)
+
+        return validate_enum
+    if isinstance(node, ListOf):
+        return _compile_list(node)
+    if isinstance(node, OneOf):
+        options = [compile_schema(option) for option in node.options]
+        message = f"doit être {node.description}"
+
+        def validate_one_of(value: Any, path: str, errors: Optional[Errors]) -> bool:
+            if any(option(value, path, None) for option in options):
+                return True
+            return _fail(errors, path, message)
+
+        return validate_one_of
+    if isinstance(node, Object):
+        return _compile_object(node)
+    if isinstance(node, Tagged):
+        return _compile_tagged(node)
+    raise TypeError(f"Nœud de schéma inconnu: {node!r}")
+
+
+def _fail(errors: Optional[Errors], path: str, message: str) -> bool:
+    if errors is not None:
+        errors.append((path, message))
+    return False
+
+
+def _compile_string(node: String) -> Validator:
+    pattern = re.compile(node.pattern) if node.pattern else None
+    message = f"doit être {node.description}"
+
+    def validate_string(value: Any, path: str, errors: Optional[Errors]) -> bool:
+        if not isinstance(value, str) or (node.non_empty and not value.strip()):
+            return _fail(errors, path, message)
+        if pattern is not None and not pattern.fullmatch(value):
+            return _fail(errors, path, message)
+        if node.contains is not None and node.contains not in value:
+            return _fail(errors, path, f"doit contenir '{node.contains}'")
+        if node.absolute_path and not os.path.isabs(value):
+            return _fail(errors, path, "doit être un chemin absolu")
+        return True
+
+    return validate_string
+
+
+def _compile_number(node: Number) -> Validator:
+    kind = f"doit être {'un entier' if node.integer else 'un nombre'}"
+    bounds = [
+        (node.gt, operator.gt, "strictement supérieur à"),
+        (node.ge, operator.ge, "supérieur ou égal à"),
+        (node.lt, operator.lt, "strictement inférieur à"),
+        (node.le, operator.le, "inférieur ou égal à"),
+    ]
+    limits = [(bound, test, f"doit être {label} {_format_bound(bound)}") for bound, test, label in bounds if bound is not None]
+    types = (int,) if node.integer else (int, float)
+
+    def validate_number(value: Any, path: str, errors: Optional[Errors]) -> bool:
+        # bool est un int en Python : `true` n'est pas un nombre dans un manifest.
+        if not isinstance(value, types) or isinstance(value, bool):
+            return _fail(errors, path, kind)
+        for bound, test, message in limits:
+            if not test(value, bound):
+                return _fail(errors, path, message)
+        return True
+
+    return validate_number
+
+
+def _compile_list(node: ListOf) -> Validator:
+    item = compile_schema(node.item)
+
+    def validate_list(value: Any, path: str, errors: Optional[Errors]) -> bool:
+        if not isinstance(value, list):
+            return _fail(errors, path, "doit être une liste")
+        valid = True
+        if node.non_empty and not value:
+            valid = _fail(errors, path, "doit être une liste non vide")
+        if errors is None:
+            for entry in value:
+                if not item(entry, path, None):
+                    return False
+            return valid
+        for index, entry in enumerate(value):
+            valid = item(entry, f"{path}[{index}]", errors) and valid
+        return valid
+
+    return validate_list
+
+
+def _compile_object(node: Object) -> Validator:
+    fields = {name: compile_schema(child) for name, child in node.fields.items()}
+    required = node.required
+    checks = node.checks
+    closed = node.closed
+
+    def validate_object(value: Any, path: str, errors: Optional[Errors]) -> bool:
+        if not isinstance(value, dict):
+            return _fail(errors, path, "doit être un objet JSON")
+        if errors is None:
+            for name in required:
+                if name not in value:
+                    return False
+            for name, entry in value.items():
+                validator = fields.get(name)
+                if validator is None:
+                    if closed:
+                        return False
+                elif not validator(entry, path, None):
+                    return False
+            return all(check(value, path, None) for check in checks)
+
+        valid = True
+        prefix = f"{path}." if path else ""
+        for name in required:
+            if name not in value:
+                valid = _fail(errors, f"{prefix}{name}", "clé obligatoire manquante")
+        for name, entry in value.items():
+            validator = fields.get(name)
+            if validator is not None:
+                valid = validator(entry, f"{prefix}{name}", errors) and valid
+            elif closed:
+                valid = _fail(errors, f"{prefix}{name}", "clé inconnue")
+        for check in checks:
+            valid = check(value, path, errors) and valid
+        return valid
+
+    return validate_object
+
+
+def _compile_tagged(node: Tagged) -> Validator:
+    variants = {name: _compile_object(variant) for name, variant in node.variants.items()}
+    message = f"doit valoir {', '.join(node.variants)}"
+
+    def validate_tagged(value: Any, path: str, errors: Optional[Errors]) -> bool:
+        if not isinstance(value, dict):
+            return _fail(errors, path, "doit être un objet JSON")
+        variant = variants.get(value.get(node.tag, node.default))
+        if variant is None:
+            return _fail(errors, f"{path}.{node.tag}", message)
+        return variant(value, path, errors)
+
+    return validate_tagged
+
+
+def _format_bound(bound: float) -> str:
+    return str(int(bound)) if float(bound).is_integer() else str(bound)
+
+
+# --- Schéma du manifest ---
+def _url_or_probes(health: Mapping[str, Any], path: str, errors: Optional[Errors]) -> bool:
+    if "probes" in health or "url" in health:
+        return True
+    return _fail(errors, f"{path}.url", "obligatoire sans 'probes' (healthcheck HTTP)")
+
+
+def _quorum_within_probes(health: Mapping[str, Any], path: str, errors: Optional[Errors]) -> bool:
+    quorum, probes = health.get("quorum"), health.get("probes")
+    count = len(probes) if isinstance(probes, list) and probes else 1
+    if isinstance(quorum, int) and not isinstance(quorum, bool) and quorum > count:
+        return _fail(errors, f"{path}.quorum", f"doit être compris entre 1 et {count}")
+    return True
+
+
+def _distinct_ports(ports: Mapping[str, Any], path: str, errors: Optional[Errors]) -> bool:
+    if "blue" in ports and ports.get("blue") == ports.get("green"):
+        return _fail(errors, path, "blue et green doivent utiliser deux ports distincts")
+    return True
+
+
+_COMMAND = OneOf((String(), ListOf(String(non_empty=False), non_empty=True)), "une chaîne ou une liste de chaînes")
+_RELOAD_COMMAND = OneOf((String(), ListOf(String(non_empty=False))), "une chaîne ou une liste de chaînes")
+_PORT = Number(integer=True, ge=1, le=65535)
+
+PROBE_SCHEMA = Tagged(
+    "type",
+    default="http",
+    variants={
+        "http": Object(
+            {"type": Enum(PROBE_TYPES), "service": String(), "url": String(), "expected_status": Number()}, ("url",)
+        ),
+        "tcp": Object({"type": Enum(PROBE_TYPES), "service": String(), "host": String(), "port": _PORT}, ("port",)),
+        "command": Object({"type": Enum(PROBE_TYPES), "service": String(), "command": _COMMAND}, ("command",)),
+    },
+)
+
+HEALTH_SCHEMA = Object(
+    {
+        "url": String(),
+        "probes": ListOf(PROBE_SCHEMA, non_empty=True),
+        "mode": Enum(HEALTH_MODES),
+        "quorum": Number(integer=True, ge=1),
+        "expected_status": Number(),
+        "timeout": Number(gt=0),
+        "interval": Number(gt=0),
+        "retries": Number(gt=0),
+        "initial_interval": Number(gt=0),
+        "backoff": Number(ge=1),
+        "jitter": Number(ge=0, lt=1),
+    },
+    checks=(_url_or_probes, _quorum_within_probes),
+)
+
+BLUE_GREEN_SCHEMA = Object(
+    {
+        "ports": Object({"blue": _PORT, "green": _PORT}, ("blue", "green"), closed=True, checks=(_distinct_ports,)),
+        "upstream_file": String(absolute_path=True),
+        "port_env": String(pattern=r"[A-Za-z_][A-Za-z0-9_]*", description="un nom de variable d'environnement"),
+        "upstream_template": String(contains="{port}"),
+        "reload_command": _RELOAD_COMMAND,
+    },
+    ("ports", "upstream_file"),
+)
+
+RELEASE_SCHEMA = Object(
+    {
+        "compose": String(),
+        "compose_file": String(),  # ancien nom de `compose`
+        "services": ListOf(String()),
+        "health": HEALTH_SCHEMA,
+        "blue_green": BLUE_GREEN_SCHEMA,
+    },
+    ("health",),
+)
+
+_validate_release = compile_schema(RELEASE_SCHEMA)
+
+
+def validate_release_payload(payload: Any) -> Errors:
+    """Toutes les erreurs du manifest `payload` (liste vide s'il est valide)."""
+
+    if _validate_release(payload, "", None):
+        return []
+    # Second passage, plus lent, uniquement pour un manifest invalide : chemins et messages.
+    errors: Errors = []
+    _validate_release(payload, "", errors)
+    return errors
+
+
+# --- Conversion et cache ---
+@dataclass(frozen=True, slots=True)
+class ReleaseManifest:
+    """Manifest validé, indépendant du dépôt où il a été lu."""
+
+    compose: str
+    services: Tuple[str, ...]
+    health: Mapping[str, Any]
+    blue_green: Optional[BlueGreenConfig]
+
+    def release_config(self, repo_dir: Path) -> ReleaseConfig:
+        return ReleaseConfig(
+            compose_file=Path(repo_dir) / self.compose,
+            services=self.services,
+            health=self.health,
+            blue_green=self.blue_green,
+        )
+
+
+_CACHE: "OrderedDict[str, ReleaseManifest]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def parse_release_manifest(raw: bytes, source: str = "ikoma.release.json") -> ReleaseManifest:
+    """Manifest validé et figé ; un contenu déjà vu est servi depuis le cache.
+
+    Raises:
+        ManifestError: JSON illisible ou non conforme au schéma (toutes les erreurs).
+    """
+
+    digest = hashlib.sha256(raw).hexdigest()
+    with _CACHE_LOCK:
+        cached = _CACHE.get(digest)
+        if cached is not None:
+            _CACHE.move_to_end(digest)
+            return cached
+
+    try:
+        payload = json.loads(raw)
+    except ValueError as exc:  # JSONDecodeError et UnicodeDecodeError
+        raise ManifestError(source, [("", f"JSON invalide: {exc}")]) from exc
+    errors = validate_release_payload(payload)
+    if errors:
+        raise ManifestError(source, errors)
+
+    manifest = _build(payload)
+    with _CACHE_LOCK:
+        _CACHE[digest] = manifest
+        while len(_CACHE) > _cache_size():
+            _CACHE.popitem(last=False)
+    return manifest
+
+
+def clear_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+def _cache_size() -> int:
+    return max(1, int(os.getenv("IKOMA_MANIFEST_CACHE_SIZE", DEFAULT_MANIFEST_CACHE_SIZE)))
+
+
+def _build(payload: Dict[str, Any]) -> ReleaseManifest:
+    compose_key = "compose" if "compose" in payload else "compose_file"
+    section = payload.get("blue_green")
+    return ReleaseManifest(
+        compose=payload.get(compose_key, DEFAULT_COMPOSE_FILE),
+        services=tuple(payload.get("services", ())),
+        health=freeze(payload["health"]),
+        blue_green=_blue_green_config(section) if section is not None else None,
+    )
+
+
+def _blue_green_config(section: Dict[str, Any]) -> BlueGreenConfig:
+    reload_command = section.get("reload_command") or ()
+    if isinstance(reload_command, str):
+        reload_command = shlex.split(reload_command)
+    defaults = {name: section[name] for name in ("port_env", "upstream_template") if name in section}
+    return BlueGreenConfig(
+        ports=MappingProxyType({color: int(port) for color, port in section["ports"].items()}),
+        upstream_file=Path(section["upstream_file"]),
+        reload_command=tuple(reload_command),
+        **defaults,
+    )
+
+
+def freeze(value: Any) -> Any:
+    """Copie en lecture seule : objets en `MappingProxyType`, listes en tuples."""
+
+    kind = type(value)  # sortie de json.loads : dict et list exacts
+    if kind is dict:
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if kind is list:
+        return tuple(map(freeze, value))
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Inverse de `freeze` (journalisation, JSON)."""
+
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def manifest_summary(manifest: ReleaseManifest) -> Dict[str, Any]:
+    """Forme JSON d'un manifest validé (API, CLI)."""
+
+    blue_green: Optional[Dict[str, Any]] = None
+    if manifest.blue_green is not None:
+        config = manifest.blue_green
+        blue_green = {
+            "ports": dict(config.ports),
+            "upstream_file": str(config.upstream_file),
+            "port_env": config.port_env,
+            "upstream_template": config.upstream_template,
+            "reload_command": list(config.reload_command),
+        }
+    return {
+        "compose": manifest.compose,
+        "services": list(manifest.services),
+        "health": thaw(manifest.health),
+        "blue_green": blue_green,
+    }
+
+
+def errors_payload(errors: Sequence[Tuple[str, str]]) -> List[Dict[str, str]]:
+    return [{"path": path, "message": message} for path, message in errors]
@@ -0,0 +1,309 @@
+"""Plan d'un déploiement (`dry_run`) : ce que `deploy_up` ferait, sans rien modifier.
+
+Le plan compare la release visée au dernier run HEALTHY de l'app :
+- le ref est résolu par `git ls-remote` (rien n'est téléchargé) ou, à défaut,
+  dans les objets du dépôt local `data/repos/<app>` ;
+- le manifest, le fichier compose et le `.env` des deux commits sont lus dans
+  les objets Git (`git cat-file --batch`), sans checkout ;
+- l'empreinte est celle que calculerait `deploy_up` : si elle est identique à
+  celle du run en place, le déploiement prendrait le chemin rapide ;
+- sinon `docker compose config` est évalué (deux fois si le fichier compose a
+  changé) et les services dont l'image ou la configuration change sont listés.
+  Les tags d'image ne sont pas revérifiés auprès du registre : seul le digest
+  déjà connu (`image_digests`) est comparé à celui du run en place.
+
+Aucun checkout, `docker compose up` ni écriture en base. Si le commit visé n'a
+pas encore été récupéré localement, le plan le signale sans détailler le
+contenu ; avec `fetch=True`, ses objets sont d'abord récupérés (`git fetch`,
+arbre de travail intact) pour que le plan soit complet.
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, Mapping, Optional
+
+from core.deploy.deploy_up import RELEASE_FILE, DeployError
+from core.deploy.fingerprint import content_fingerprint, resolve_remote_ref
+from core.deploy.images import compose_config, image_repository, service_closure
+from core.deploy.manifest import ManifestError, ReleaseManifest, errors_payload, manifest_summary, parse_release_manifest
+from core.scm.git_repo import fetch_objects, has_commit, read_blobs, resolve_local_ref
+
+ACTION_FAST_PATH = "fast_path"  # empreinte inchangée : vérification rapide seulement
+ACTION_DEPLOY = "deploy"  # pipeline complet
+ACTION_INVALID = "invalid"  # le déploiement échouerait (manifest invalide, ref introuvable)
+
+
+@dataclass
+class ServiceChange:
+    """Service ajouté, retiré ou modifié ; `fields` liste les clés compose qui changent."""
+
+    service: str
+    change: str  # added | removed | changed
+    fields: List[str] = field(default_factory=list)
+    image_before: Optional[str] = None
+    image_after: Optional[str] = None
+
+
+@dataclass
+class DeployPlan:
+    app_id: str
+    ref: str
+    action: str = ACTION_DEPLOY
+    reasons: List[str] = field(default_factory=list)
+    target_commit: Optional[str] = None
+    resolved_by: Optional[str] = None  # ls-remote | local | sha
+    commit_available: bool = False  # objets du commit visé présents localement
+    current_run_id: Optional[int] = None
+    current_commit: Optional[str] = None
+    fingerprint: Optional[str] = None
+    manifest_changes: List[str] = field(default_factory=list)  # chemins du manifest modifiés
+    compose_changed: bool = False
+    services: List[ServiceChange] = field(default_factory=list)
+    errors: List[Dict[str, str]] = field(default_factory=list)
+    duration: float = 0.0  # secondes
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload["duration_ms"] = int(payload.pop("duration") * 1000)
+        return payload
+
+    def summary_lines(self) -> List[str]:
+        target = (self.target_commit or "?")[:12]
+        current = (self.current_commit or "-")[:12]
+        lines = [f"{self.app_id} {self.ref}: {self.action} ({current} -> {target}, {self.duration * 1000:.0f} ms)"]
+        lines.extend(f"  - {reason}" for reason in self.reasons)
+        lines.extend(f"  manifest {path}" for path in self.manifest_changes)
+        for change in self.services:
+            images = f" {change.image_before or '-'} -> {change.image_after or '-'}" if "image" in change.fields else ""
+            fields = f" [{', '.join(change.fields)}]" if change.fields else ""
+            lines.append(f"  service {change.service}: {change.change}{fields}{images}")
+        lines.extend(f"  erreur {error['path'] or '(racine)'}: {error['message']}" for error in self.errors)
+        return lines
+
+
+@dataclass
+class _Release:
+    """Contenu d'une release lu dans les objets Git."""
+
+    manifest: ReleaseManifest
+    manifest_raw: bytes
+    compose_path: str
+    compose: Optional[bytes]
+    dotenv: Optional[bytes]
+
+
+def plan_release(
+    app_id: str,
+    ref: str,
+    repos_dir: Path,
+    db_path: Path,
+    *,
+    remote_url: str | None = None,
+    fetch: bool = False,
+    env: Mapping[str, str] | None = None,
+) -> DeployPlan:
+    """Plan de `deploy_up(app_id, ref)` (voir le docstring du module)."""
+
+    start = time.perf_counter()
+    plan = DeployPlan(app_id=app_id, ref=ref)
+    try:
+        _plan(plan, repos_dir / app_id, db_path, remote_url, fetch, os.environ if env is None else env)
+    finally:
+        plan.duration = time.perf_counter() - start
+    return plan
+
+
+def _plan(
+    plan: DeployPlan, repo_dir: Path, db_path: Path, remote_url: str | None, fetch: bool, env: Mapping[str, str]
+) -> None:
+    has_repo = (repo_dir / ".git").exists()
+    current = _current_run(db_path, plan.app_id)
+    if current is None:
+        plan.reasons.append("aucun run HEALTHY : premier déploiement")
+    else:
+        plan.current_run_id, plan.current_commit = current["run_id"], current["commit_sha"]
+
+    _resolve_target(plan, repo_dir if has_repo else None, remote_url)
+    if plan.target_commit is None:
+        plan.action = ACTION_INVALID
+        plan.reasons.append(f"ref {plan.ref} introuvable (remote injoignable et aucun dépôt local à jour)")
+        return
+    if plan.current_commit and plan.current_commit != plan.target_commit:
+        plan.reasons.append("nouveau commit")
+
+    available = has_repo and has_commit(repo_dir, plan.target_commit)
+    if not available and has_repo and fetch and fetch_objects(repo_dir, plan.ref):
+        available = has_commit(repo_dir, plan.target_commit)
+        plan.reasons.append("objets du commit récupérés (git fetch, sans checkout)")
+    if not available:
+        plan.reasons.append("commit absent du dépôt local : contenu inconnu avant le fetch du déploiement")
+        return
+    plan.commit_available = True
+    target = _read_release(repo_dir, plan.target_commit, plan)
+    if target is None:
+        plan.action = ACTION_INVALID
+        return
+    if target.compose is None:
+        plan.action = ACTION_INVALID
+        plan.errors.append({"path": "compose", "message": f"fichier {target.compose_path} absent du commit"})
+        return
+
+    plan.fingerprint = content_fingerprint(
+        plan.target_commit, target.manifest_raw, target.compose, target.dotenv, env
+    )
+    if current is not None and plan.fingerprint == current["fingerprint"]:
+        plan.action = ACTION_FAST_PATH
+        plan.reasons.append(f"empreinte identique au run #{current['run_id']} : vérification rapide seulement")
+        return
+
+    previous = None
+    if current is not None and current["commit_sha"]:
+        previous = _read_release(repo_dir, current["commit_sha"], None)
+    if previous is None:
+        plan.compose_changed = True
+    else:
+        plan.manifest_changes = _diff_paths(manifest_summary(previous.manifest), manifest_summary(target.manifest))
+        plan.compose_changed = (previous.compose_path, previous.compose) != (target.compose_path, target.compose)
+        if not plan.manifest_changes and not plan.compose_changed:
+            if previous.dotenv != target.dotenv:
+                plan.reasons.append(".env modifié")
+            elif plan.current_commit == plan.target_commit:
+                plan.reasons.append("variables d'environnement interpolées par compose modifiées")
+    _diff_services(plan, repo_dir, db_path, current, previous, target)
+
+
+def _current_run(db_path: Path, app_id: str) -> Optional[Dict[str, Any]]:
+    from core.store.sqlite_store import DeploymentState
+
+    if not db_path.exists():
+        return None  # aucune base : rien n'a jamais été déployé (et le plan n'en crée pas)
+    db = DeploymentState(db_path)
+    db.ensure_schema()
+    return db.last_run(app_id)
+
+
+def _resolve_target(plan: DeployPlan, repo_dir: Optional[Path], remote_url: str | None) -> None:
+    if repo_dir is not None:
+        sha = resolve_remote_ref(repo_dir, plan.ref)
+        if sha is not None:
+            plan.target_commit, plan.resolved_by = sha, "sha" if sha == plan.ref else "ls-remote"
+            return
+        sha = resolve_local_ref(repo_dir, plan.ref)
+        if sha is not None:
+            plan.target_commit, plan.resolved_by = sha, "local"
+            plan.reasons.append("remote injoignable : ref résolue dans le dépôt local (peut être en retard)")
+        return
+
+    remote = remote_url or os.getenv("IKOMA_GIT_REMOTE")
+    if remote:
+        sha = resolve_remote_ref(None, plan.ref, remote=remote)
+        if sha is not None:
+            plan.target_commit, plan.resolved_by = sha, "sha" if sha == plan.ref else "ls-remote"
+
+
+def _read_release(repo_dir: Path, commit: str, plan: Optional[DeployPlan]) -> Optional[_Release]:
+    """Manifest, compose et `.env` de `commit` ; None si son manifest est absent ou invalide.
+
+    Avec un `plan`, les erreurs de manifest y sont reportées.
+    """
+
+    manifest_raw = read_blobs(repo_dir, [f"{commit}:{RELEASE_FILE}"])[f"{commit}:{RELEASE_FILE}"]
+    if manifest_raw is None:
+        if plan is not None:
+            plan.errors.append({"path": "", "message": f"manifest {RELEASE_FILE} absent du commit"})
+        return None
+    try:
+        manifest = parse_release_manifest(manifest_raw, RELEASE_FILE)
+    except ManifestError as exc:
+        if plan is not None:
+            plan.errors.extend(errors_payload(exc.errors))
+        return None
+
+    compose_path = str(PurePosixPath(manifest.compose))
+    dotenv_path = str(PurePosixPath(compose_path).parent / ".env")
+    specs = [f"{commit}:{compose_path}", f"{commit}:{dotenv_path}"]
+    blobs = read_blobs(repo_dir, specs)
+    dotenv = blobs[specs[1]]
+    if dotenv is None:
+        # `.env` non versionné : celui de l'arbre de travail survit au checkout.
+        local = repo_dir / dotenv_path
+        dotenv = local.read_bytes() if local.is_file() else None
+    return _Release(manifest, manifest_raw, compose_path, blobs[specs[0]], dotenv)
+
+
+def _diff_paths(before: Any, after: Any, prefix: str = "") -> List[str]:
+    """Chemins (`health.timeout`, `services`, ...) dont la valeur diffère."""
+
+    if isinstance(before, dict) and isinstance(after, dict):
+        paths: List[str] = []
+        for key in sorted(set(before) | set(after), key=str):
+            paths.extend(_diff_paths(before.get(key), after.get(key), f"{prefix}.{key}" if prefix else str(key)))
+        return paths
+    return [] if before == after else [prefix]
+
+
+def _diff_services(
+    plan: DeployPlan,
+    repo_dir: Path,
+    db_path: Path,
+    current: Optional[Dict[str, Any]],
+    previous: Optional[_Release],
+    target: _Release,
+) -> None:
+    from core.store.sqlite_store import DeploymentState
+
+    try:
+        if previous is not None and plan.compose_changed and previous.compose is not None:
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="ikoma-plan") as executor:
+                before_future = executor.submit(compose_config, repo_dir, content=previous.compose)
+                after = compose_config(repo_dir, content=target.compose)
+                before = before_future.result()
+        else:
+            after = compose_config(repo_dir, content=target.compose)
+            before = after if previous is not None else {}
+    except DeployError as exc:
+        plan.reasons.append(f"services non comparés ({exc})")
+        return
+
+    wanted = service_closure(after, target.manifest.services)
+    if previous is not None:
+        wanted |= service_closure(before, previous.manifest.services)
+    deployed = dict(current["images"] or {}) if current is not None else {}
+    images = [spec["image"] for spec in after.values() if spec.get("image")]
+    known = DeploymentState(db_path).get_image_digests(images) if images and db_path.exists() else {}
+
+    for name in sorted(wanted):
+        old, new = before.get(name), after.get(name)
+        if new is None:
+            plan.services.append(ServiceChange(name, "removed", image_before=deployed.get(name)))
+            continue
+        image = new.get("image")
+        if old is None:
+            plan.services.append(ServiceChange(name, "added", image_after=image))
+            continue
+        fields = [key for key in sorted(set(old) | set(new)) if key != "image" and old.get(key) != new.get(key)]
+        if image and _image_changed(old.get("image"), image, deployed.get(name), known.get(image)):
+            fields.insert(0, "image")
+        if fields:
+            plan.services.append(
+                ServiceChange(name, "changed", fields, image_before=deployed.get(name) or old.get("image"), image_after=image)
+            )
+
+
+def _image_changed(before: Optional[str], after: str, deployed: Optional[str], known: Optional[tuple]) -> bool:
+    """Référence différente, ou tag dont le dernier digest connu diffère de celui déployé."""
+
+    if before != after:
+        return True
+    if deployed is None or "@" in after:
+        return False
+    deployed_digest = deployed.split("@", 1)[1]
+    return (
+        image_repository(deployed) == image_repository(after)
+        and known is not None
+        and known[0] != deployed_digest
+    )
@@ -1,24 +1,86 @@
 from __future__ import annotations
 
-import json
 import os
+import re
 import shutil
+import time
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict
+from typing import Tuple
 
 from core.deploy.deploy_up import DeployError, ReleaseConfig
+from core.deploy.manifest import parse_release_manifest, thaw
 from core.logging.logger import run_command
 
+DEFAULT_CAPABILITIES_TTL = 3600  # secondes
+COMPOSE_WAIT_VERSION = (2, 1, 1)  # `up --wait`
+COMPOSE_WAIT_TIMEOUT_VERSION = (2, 17, 0)  # `up --wait-timeout`
+_VERSION_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)")
+
+
+@dataclass
+class DockerCapabilities:
+    """Versions et options de la CLI Docker détectées par `preflight_environment`."""
+
+    binary: str
+    binary_mtime_ns: int
+    docker_version: str
+    compose_version: str
+    compose_wait: bool
+    compose_wait_timeout: bool
+    probed_at: float
+
+
+def preflight_environment(logger, store=None) -> DockerCapabilities:
+    """Vérifie la présence de Docker et de Compose et renvoie leurs capacités.
+
+    Avec un `store` (`DeploymentState`), la sonde n'est rejouée que si le binaire
+    `docker` a changé (chemin ou mtime) ou si elle date de plus de
+    `IKOMA_CAPABILITIES_TTL` secondes ; sinon aucun sous-processus n'est lancé.
+    """
+
+    binary = shutil.which("docker")
+    if not binary:
+        raise DeployError("Binaire requis introuvable: docker")
+    mtime_ns = os.stat(binary).st_mtime_ns
+
+    if store is not None:
+        cached = store.get_environment_probe("docker")
+        ttl = float(os.getenv("IKOMA_CAPABILITIES_TTL", DEFAULT_CAPABILITIES_TTL))
+        if (
+            cached
+            and cached["binary"] == binary
+            and cached["binary_mtime_ns"] == mtime_ns
+            and time.time() - cached["probed_at"] < ttl
+        ):
+            capabilities = DockerCapabilities(**cached)
+            logger.info(
+                "Docker %s / Compose %s (sonde en cache)", capabilities.docker_version, capabilities.compose_version
+            )
+            return capabilities
+
+    docker_output = run_command(["docker", "--version"], logger=logger).output
+    compose_output = run_command(["docker", "compose", "version"], logger=logger).output
+    compose_version = _parse_version(compose_output)
+    capabilities = DockerCapabilities(
+        binary=binary,
+        binary_mtime_ns=mtime_ns,
+        docker_version=".".join(map(str, _parse_version(docker_output))),
+        compose_version=".".join(map(str, compose_version)),
+        compose_wait=compose_version >= COMPOSE_WAIT_VERSION,
+        compose_wait_timeout=compose_version >= COMPOSE_WAIT_TIMEOUT_VERSION,
+        probed_at=time.time(),
+    )
+    if store is not None:
+        store.record_environment_probe("docker", asdict(capabilities))
+    return capabilities
 
-def preflight_environment(logger) -> None:
-    """Vérifie la présence des dépendances indispensables."""
-
-    for binary in ("docker",):
-        if not shutil.which(binary):
-            raise DeployError(f"Binaire requis introuvable: {binary}")
 
-    run_command(["docker", "--version"], logger=logger)
-    run_command(["docker", "compose", "version"], logger=logger)
+def _parse_version(output: str) -> Tuple[int, int, int]:
+    match = _VERSION_RE.search(output)
+    if not match:
+        raise DeployError(f"Version illisible: {output.strip()}")
+    return tuple(int(part) for part in match.groups())
 
 
 def ensure_directories(*directories: Path) -> None:
@@ -27,26 +89,14 @@ def ensure_directories(*directories: Path) -> None:
 
 
 def load_release_config(repo_dir: Path, release_file: str) -> ReleaseConfig:
-    release_path = repo_dir / release_file
-    if not release_path.exists():
-        raise DeployError(f"Manifest {release_file} introuvable dans {repo_dir}")
+    """Lit et valide le manifest ; un contenu déjà validé vient du cache (`core.deploy.manifest`)."""
 
+    release_path = repo_dir / release_file
     try:
-        with release_path.open("r", encoding="utf-8") as f:
-            payload = json.load(f)
-    except json.JSONDecodeError as exc:  # noqa: B904 - message métier
-        raise DeployError(f"Manifest {release_file} invalide: {exc}") from exc
-
-    _validate_release_payload(payload, release_path)
-
-    # Support both 'compose' and 'compose_file' keys for backward compatibility
-    compose_key = "compose" if "compose" in payload else "compose_file"
-    compose_file = repo_dir / payload.get(compose_key, "docker-compose.yml")
-    
-    services = list(payload.get("services", []))
-    health = dict(payload.get("health", {}))
-
-    return ReleaseConfig(compose_file=compose_file, services=services, health=health)
+        raw = release_path.read_bytes()
+    except FileNotFoundError:
+        raise DeployError(f"Manifest {release_file} introuvable dans {repo_dir}") from None
+    return parse_release_manifest(raw, release_file).release_config(repo_dir)
 
 
 def preflight_release(release: ReleaseConfig, logger) -> None:
@@ -60,37 +110,5 @@ def preflight_release(release: ReleaseConfig, logger) -> None:
         "Manifest validé: compose=%s, services=%s, health=%s",
         release.compose_file,
         services_list,
-        release.health,
+        thaw(release.health),
     )
-
-
-def _validate_release_payload(payload: Dict[str, object], release_path: Path) -> None:
-    if not isinstance(payload, dict):
-        raise DeployError(f"Manifest {release_path} doit être un objet JSON")
-
-    compose_key = "compose" if "compose" in payload else "compose_file"
-    compose_file = payload.get(compose_key, "docker-compose.yml")
-    if not isinstance(compose_file, str) or not compose_file.strip():
-        raise DeployError(f"La clé '{compose_key}' doit être une chaîne non vide")
-
-    services = payload.get("services", [])
-    if not isinstance(services, list) or not all(isinstance(s, str) and s for s in services):
-        raise DeployError("La clé 'services' doit être une liste de chaînes")
-
-    health = payload.get("health")
-    if not isinstance(health, dict):
-        raise DeployError("La clé 'health' doit être un objet JSON")
-
-    if not isinstance(health.get("url"), str) or not health.get("url"):
-        raise DeployError("Le healthcheck HTTP doit définir une clé 'url' non vide")
-
-    for numeric_key in ("expected_status", "timeout", "interval", "retries"):
-        if numeric_key in health and not isinstance(health[numeric_key], (int, float)):
-            raise DeployError(f"health.{numeric_key} doit être un nombre si présent")
-
-    if "interval" in health and health["interval"] <= 0:
-        raise DeployError("health.interval doit être strictement positif")
-    if "timeout" in health and health["timeout"] <= 0:
-        raise DeployError("health.timeout doit être strictement positif")
-    if "retries" in health and health["retries"] <= 0:
-        raise DeployError("health.retries doit être strictement positif")
@@ -0,0 +1,193 @@
+"""Journal structuré (JSON lines) des déploiements : un fichier par run.
+
+Chaque étape de `deploy_up` (`preflight`, `git_sync`, `manifest`, `compose`,
+`health`, `db`, ...) produit un événement `span_start` puis `span_end` (durée,
+statut, erreur éventuelle), encadrés par `run_start`/`run_end`. Les fichiers
+sont écrits dans `data/logs/<app_id>/events/run-<run_id>.jsonl`, à côté du
+`deploy.log` texte qui reste inchangé :
+
+    {"ts": "2026-10-17T08:00:00.123Z", "event": "span_end", "app_id": "app", "run_id": 42,
+     "span": "compose", "duration_ms": 1830, "status": "ok"}
+
+Un fichier qui dépasse `IKOMA_EVENTS_MAX_BYTES` (1 Mio par défaut) est renommé
+en `.1`, `.2`, ... (`IKOMA_EVENTS_BACKUPS` copies, 3 par défaut).
+`ikoma events stats` agrège les `span_end` de toutes les apps (p50/p95 par étape).
+Le job `compact` efface les fichiers des runs qu'il purge de la base (`delete_run_events`).
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from core.store.sqlite_store import iso_ms
+
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_BACKUPS = 3
+EVENTS_DIRNAME = "events"
+
+
+class RotatingJsonlWriter:
+    """Ajoute des objets JSON (un par ligne) à `path`, avec rotation par taille."""
+
+    def __init__(self, path: Path, *, max_bytes: int | None = None, backups: int | None = None) -> None:
+        self.path = Path(path)
+        if max_bytes is None:
+            max_bytes = int(os.getenv("IKOMA_EVENTS_MAX_BYTES", DEFAULT_MAX_BYTES))
+        if backups is None:
+            backups = int(os.getenv("IKOMA_EVENTS_BACKUPS", DEFAULT_BACKUPS))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        data = line.encode("utf-8")
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.max_bytes > 0 and self.path.exists() and self.path.stat().st_size + len(data) > self.max_bytes:
+                self._rotate()
+            with self.path.open("ab") as handle:
+                handle.write(data)
+
+    def _rotate(self) -> None:
+        if self.backups <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+class RunEventLog:
+    """Événements d'un run ; mis en mémoire tant que l'identifiant du run n'est pas connu.
+
+    Le run n'existe en base qu'au milieu de l'étape `preflight` : les premiers
+    événements sont écrits dès que `run_id` est fourni. Un run jamais enregistré
+    (chemin rapide abandonné) ne laisse pas de fichier.
+    """
+
+    def __init__(self, app_id: str, logs_dir: Path) -> None:
+        self.app_id = app_id
+        self.logs_dir = Path(logs_dir)
+        self.run_id: Optional[int] = None
+        self._writer: Optional[RotatingJsonlWriter] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def bind(self, run_id: Optional[int]) -> None:
+        if run_id is None or self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is not None:
+                return
+            self.run_id = run_id
+            self._writer = RotatingJsonlWriter(run_events_path(self.logs_dir, self.app_id, run_id))
+            for record in self._pending:
+                record["run_id"] = run_id
+                self._writer.write(record)
+            self._pending = []
+
+    def emit(self, event: str, *, ts: float | None = None, **fields: Any) -> None:
+        record = {
+            "ts": iso_ms(ts if ts is not None else time.time()),
+            "event": event,
+            "app_id": self.app_id,
+            "run_id": self.run_id,
+            **fields,
+        }
+        with self._lock:
+            if self._writer is None:
+                self._pending.append(record)
+            else:
+                self._writer.write(record)
+
+    def span_start(self, name: str, started_at: float) -> None:
+        self.emit("span_start", ts=started_at, span=name)
+
+    def span_end(self, name: str, started_at: float, duration: float, error: BaseException | None = None) -> None:
+        fields: Dict[str, Any] = {"span": name, "duration_ms": int(duration * 1000), "status": "ok"}
+        if error is not None:
+            fields.update(status="error", error=str(error) or type(error).__name__)
+        self.emit("span_end", ts=started_at + duration, **fields)
+
+
+def run_events_path(logs_dir: Path, app_id: str, run_id: int) -> Path:
+    return Path(logs_dir) / app_id / EVENTS_DIRNAME / f"run-{run_id}.jsonl"
+
+
+def delete_run_events(logs_dir: Path, app_id: str, run_ids: Iterable[int]) -> int:
+    """Supprime les fichiers d'événements (copies tournées comprises) des runs purgés de la base."""
+
+    events_dir = Path(logs_dir) / app_id / EVENTS_DIRNAME
+    deleted = 0
+    for run_id in run_ids:
+        for path in events_dir.glob(f"run-{run_id}.jsonl*"):
+            path.unlink(missing_ok=True)
+            deleted += 1
+    return deleted
+
+
+def iter_events(logs_dir: Path, app_id: str | None = None) -> Iterator[Dict[str, Any]]:
+    """Événements de tous les runs (fichiers tournés compris) ; ignore les lignes illisibles."""
+
+    logs_dir = Path(logs_dir)
+    app_dirs = [logs_dir / app_id] if app_id else sorted(path for path in logs_dir.glob("*") if path.is_dir())
+    for app_dir in app_dirs:
+        for path in sorted((app_dir / EVENTS_DIRNAME).glob("run-*.jsonl*")):
+            with path.open(encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+@dataclass
+class SpanStats:
+    span: str
+    count: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+def span_stats(events: Iterable[Dict[str, Any]]) -> List[SpanStats]:
+    """Latences par étape (percentile au rang le plus proche), des plus lentes au p95 aux plus rapides."""
+
+    durations: Dict[str, List[int]] = {}
+    errors: Dict[str, int] = {}
+    for event in events:
+        if event.get("event") != "span_end" or "duration_ms" not in event:
+            continue
+        name = event["span"]
+        durations.setdefault(name, []).append(event["duration_ms"])
+        if event.get("status") == "error":
+            errors[name] = errors.get(name, 0) + 1
+    stats = []
+    for name, values in durations.items():
+        values.sort()
+        stats.append(
+            SpanStats(
+                span=name,
+                count=len(values),
+                errors=errors.get(name, 0),
+                p50_ms=_percentile(values, 50),
+                p95_ms=_percentile(values, 95),
+                max_ms=values[-1],
+            )
+        )
+    return sorted(stats, key=lambda item: item.p95_ms, reverse=True)
+
+
+def _percentile(sorted_values: List[int], percent: float) -> float:
+    rank = max(1, math.ceil(len(sorted_values) * percent / 100))
+    return sorted_values[rank - 1]
@@ -1,8 +1,30 @@
 from __future__ import annotations
 
 import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Deque, Dict, List, Mapping, Optional
+
+from core.logging.metrics import COMMAND_FAILURES, COMMAND_SECONDS, command_label
+
+DEFAULT_COMMAND_TIMEOUT = 1800  # secondes, surchargeable via IKOMA_COMMAND_TIMEOUT
+DEFAULT_OUTPUT_LIMIT = 256 * 1024  # octets conservés en mémoire (moitié début, moitié fin)
+MAX_LINE_CHARS = 16 * 1024  # une ligne plus longue est lue (et journalisée) en plusieurs morceaux
+KILL_GRACE_PERIOD = 5  # secondes entre SIGTERM et SIGKILL
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Nom de logger -> app_id, renseigné par build_logger pour rattacher les commandes à une app.
+_LOGGER_APPS: Dict[str, str] = {}
+_SUBSCRIBERS: Dict[str, List["queue.Queue[str]"]] = {}
+_SUBSCRIBERS_LOCK = threading.Lock()
+_COMMAND_STORE = None
 
 
 def build_logger(app_id: str, logs_dir: Path, log_filename: str = "deploy.log") -> logging.Logger:
@@ -13,6 +35,7 @@ def build_logger(app_id: str, logs_dir: Path, log_filename: str = "deploy.log")
 
     logger = logging.getLogger(f"{log_filename}.{app_id}")
     logger.setLevel(logging.INFO)
+    _LOGGER_APPS[logger.name] = app_id
 
     if not any(isinstance(handler, logging.FileHandler) and handler.baseFilename == str(log_file) for handler in logger.handlers):
         file_handler = logging.FileHandler(log_file, encoding="utf-8")
@@ -27,17 +50,238 @@ def build_logger(app_id: str, logs_dir: Path, log_filename: str = "deploy.log")
     return logger
 
 
-def run_command(command: List[str], logger: logging.Logger, cwd: Path | None = None) -> None:
+# --- Abonnés temps réel ---
+def subscribe_output(app_id: str) -> "queue.Queue[str]":
+    """Renvoie une file recevant chaque ligne produite par les commandes de `app_id`.
+
+    Les lignes sont abandonnées si l'abonné ne consomme pas assez vite : la
+    commande n'est jamais ralentie par un lecteur lent.
+    """
+
+    subscriber: "queue.Queue[str]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _SUBSCRIBERS_LOCK:
+        _SUBSCRIBERS.setdefault(app_id, []).append(subscriber)
+    return subscriber
+
+
+def unsubscribe_output(app_id: str, subscriber: "queue.Queue[str]") -> None:
+    with _SUBSCRIBERS_LOCK:
+        subscribers = _SUBSCRIBERS.get(app_id, [])
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+        if not subscribers:
+            _SUBSCRIBERS.pop(app_id, None)
+
+
+def _publish(app_id: Optional[str], line: str) -> None:
+    if app_id is None:
+        return
+    with _SUBSCRIBERS_LOCK:
+        subscribers = list(_SUBSCRIBERS.get(app_id, ()))
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(line)
+        except queue.Full:
+            pass
+
+
+# --- Exécution de commandes ---
+@dataclass
+class CommandResult:
+    command: List[str]
+    returncode: int
+    duration: float  # secondes
+    output: str  # début + fin de la sortie si elle dépasse la limite
+    output_bytes: int
+    truncated: bool = False
+    timed_out: bool = False
+
+
+class _OutputBuffer:
+    """Conserve le début et la fin d'une sortie bornée à `limit` octets."""
+
+    def __init__(self, limit: int) -> None:
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head: List[str] = []
+        self.head_size = 0
+        self.tail: Deque[str] = deque()
+        self.tail_size = 0
+        self.total = 0
+        self.dropped = 0
+
+    def add(self, line: str) -> None:
+        size = len(line.encode("utf-8", errors="replace"))
+        self.total += size
+        if self.head_size + size <= self.head_limit and not self.tail:
+            self.head.append(line)
+            self.head_size += size
+            return
+        self.tail.append(line)
+        self.tail_size += size
+        while self.tail_size > self.tail_limit and len(self.tail) > 1:
+            removed = self.tail.popleft()
+            removed_size = len(removed.encode("utf-8", errors="replace"))
+            self.tail_size -= removed_size
+            self.dropped += removed_size
+        if self.tail_size > self.tail_limit:
+            # Un seul morceau plus grand que la fin conservée : seule sa fin est gardée.
+            encoded = self.tail[0].encode("utf-8", errors="replace")
+            kept = encoded[len(encoded) - self.tail_limit :].decode("utf-8", errors="ignore")
+            kept_size = len(kept.encode("utf-8"))
+            self.dropped += self.tail_size - kept_size
+            self.tail[0], self.tail_size = kept, kept_size
+
+    def render(self) -> str:
+        parts = ["".join(self.head)]
+        if self.dropped:
+            parts.append(f"\n[... {self.dropped} octets omis ...]\n")
+        parts.append("".join(self.tail))
+        return "".join(parts)
+
+
+def run_command(
+    command: List[str],
+    logger: logging.Logger,
+    cwd: Path | None = None,
+    *,
+    timeout: float | None = None,
+    max_output_bytes: int = DEFAULT_OUTPUT_LIMIT,
+    env: Mapping[str, str] | None = None,
+) -> CommandResult:
+    """Exécute une commande en diffusant sa sortie ligne par ligne.
+
+    Chaque ligne est écrite dans `logger` et publiée aux abonnés de l'app dès sa
+    lecture. Seuls le début et la fin de la sortie (`max_output_bytes`) sont gardés
+    en mémoire. Au-delà de `timeout` (défaut `IKOMA_COMMAND_TIMEOUT`, 1800 s), tout le
+    groupe de processus est tué. La durée est enregistrée dans la table `command_runs`.
+
+    Raises:
+        DeployError: si la commande échoue ou expire.
+    """
+
     logger.info("$ %s", " ".join(command))
-    from subprocess import PIPE, STDOUT, run
+    app_id = _LOGGER_APPS.get(logger.name)
+    timeout = timeout if timeout is not None else _default_timeout()
+    buffer = _OutputBuffer(max_output_bytes)
+    timed_out = threading.Event()
+
+    started_at = time.time()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=dict(env) if env is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        bufsize=1,
+        start_new_session=True,
+    )
+    killer = threading.Timer(timeout, _kill_process_group, args=(process, timed_out)) if timeout else None
+    if killer:
+        killer.daemon = True
+        killer.start()
+    try:
+        assert process.stdout is not None
+        # Lecture bornée : une sortie sans retour à la ligne n'est jamais chargée d'un bloc.
+        for line in iter(lambda: process.stdout.readline(MAX_LINE_CHARS), ""):
+            buffer.add(line)
+            stripped = line.rstrip()
+            if stripped:
+                logger.info(stripped)
+                _publish(app_id, stripped)
+        returncode = process.wait()
+    finally:
+        if killer:
+            killer.cancel()
+        if process.stdout is not None:
+            process.stdout.close()
 
-    result = run(command, cwd=cwd, stdout=PIPE, stderr=STDOUT, text=True, check=False)
-    if result.stdout:
-        logger.info(result.stdout.strip())
+    result = CommandResult(
+        command=list(command),
+        returncode=returncode,
+        duration=time.perf_counter() - start,
+        output=buffer.render(),
+        output_bytes=buffer.total,
+        truncated=buffer.dropped > 0,
+        timed_out=timed_out.is_set(),
+    )
+    _record_timing(app_id, result, started_at, logger)
+    label = command_label(command)
+    COMMAND_SECONDS.labels(label).observe(result.duration)
 
-    if result.returncode != 0:
-        error_msg = f"Commande échouée ({result.returncode}): {' '.join(command)}"
+    if result.timed_out or returncode != 0:
+        COMMAND_FAILURES.labels(label).inc()
+        if result.timed_out:
+            error_msg = f"Commande expirée après {timeout}s: {' '.join(command)}"
+        else:
+            error_msg = f"Commande échouée ({returncode}): {' '.join(command)}"
         logger.error(error_msg)
         from core.deploy.deploy_up import DeployError
 
         raise DeployError(error_msg)
+
+    return result
+
+
+def _default_timeout() -> float:
+    raw = os.getenv("IKOMA_COMMAND_TIMEOUT")
+    try:
+        return float(raw) if raw else DEFAULT_COMMAND_TIMEOUT
+    except ValueError:
+        return DEFAULT_COMMAND_TIMEOUT
+
+
+def _kill_process_group(process: subprocess.Popen, timed_out: threading.Event) -> None:
+    """SIGTERM au groupe, puis SIGKILL après `KILL_GRACE_PERIOD` s'il en reste un membre.
+
+    La fin du leader ne suffit pas : un descendant qui ignore SIGTERM garde la sortie
+    ouverte et bloquerait la lecture de `run_command`.
+    """
+
+    timed_out.set()
+    pgid = process.pid  # start_new_session : le groupe porte le pid du leader
+    deadline = time.monotonic() + KILL_GRACE_PERIOD
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(KILL_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        pass
+    while time.monotonic() < deadline:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.1)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _record_timing(app_id: Optional[str], result: CommandResult, started_at: float, logger: logging.Logger) -> None:
+    global _COMMAND_STORE
+    try:
+        if _COMMAND_STORE is None:
+            from core.deploy.deploy_up import DB_PATH
+            from core.store.sqlite_store import DeploymentState
+
+            store = DeploymentState(DB_PATH)
+            store.ensure_schema()
+            _COMMAND_STORE = store
+        _COMMAND_STORE.record_command(
+            app_id,
+            " ".join(result.command),
+            time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started_at)),
+            result.duration,
+            result.returncode,
+            result.timed_out,
+            result.output_bytes,
+        )
+    except Exception as exc:  # noqa: BLE001 - le chronométrage ne doit jamais casser un déploiement
+        logger.warning("Impossible d'enregistrer la durée de la commande: %s", exc)
@@ -0,0 +1,265 @@
+"""Métriques en mémoire au format texte Prometheus (`GET /metrics` du Runner).
+
+Registre minimal sans dépendance : compteurs, jauges et histogrammes à
+labels. Une observation coûte une recherche de bucket (`bisect`) et trois
+additions sous un verrou ; aucun appel système, aucune allocation une fois le
+jeu de labels créé (voir `benchmarks/bench_metrics.py`).
+
+Les valeurs vivent dans le processus : le Runner expose celles des
+déploiements exécutés par ses workers, pas celles d'un `ikoma deploy up`
+lancé à part.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Secondes : de la sonde de santé (quelques ms) au déploiement complet (plusieurs minutes).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024**2, 16 * 1024**2, 128 * 1024**2, 1024**3)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _Metric:
+    kind = ""
+    suffix = ""  # `_total` pour les compteurs, dans HELP/TYPE comme dans les échantillons
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: object):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} attend les labels {self.labelnames}, reçu {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+    suffix = "_total"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield f"{self.name}_total", self._label_dict(key), child.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield self.name, self._label_dict(key), child.value
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds: Sequence[float]) -> None:
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # dernier : +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(float(bound) for bound in buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            labels = self._label_dict(key)
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip((*self.upper_bounds, math.inf), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrique {metric.name} déjà déclarée différemment")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        """Exposition au format texte Prometheus 0.0.4."""
+
+        lines: List[str] = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            name = metric.name + metric.suffix
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample, labels, value in metric._samples():
+                lines.append(f"{sample}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Métriques du déploiement ---
+DEPLOY_STAGE_SECONDS = REGISTRY.histogram(
+    "ikoma_deploy_stage_seconds", "Durée des étapes de deploy_up.", ("stage",)
+)
+DEPLOY_SECONDS = REGISTRY.histogram(
+    "ikoma_deploy_duration_seconds", "Durée totale des runs de déploiement.", ("status",)
+)
+COMMAND_SECONDS = REGISTRY.histogram(
+    "ikoma_command_duration_seconds", "Durée des commandes lancées par run_command.", ("command",)
+)
+COMMAND_FAILURES = REGISTRY.counter(
+    "ikoma_command_failures", "Commandes en échec ou expirées.", ("command",)
+)
+HEALTH_PROBE_SECONDS = REGISTRY.histogram(
+    "ikoma_health_probe_seconds", "Latence de chaque tentative de sonde de santé.", ("probe", "result")
+)
+HEALTH_ATTEMPTS = REGISTRY.histogram(
+    "ikoma_health_attempts", "Tentatives par sonde avant succès ou abandon.", ("probe", "result"), COUNT_BUCKETS
+)
+HEALTH_WAIT_SECONDS = REGISTRY.histogram(
+    "ikoma_health_wait_seconds", "Durée d'un wait_for_health complet.", ("result",)
+)
+GIT_SYNC_SECONDS = REGISTRY.histogram("ikoma_git_sync_seconds", "Durée de sync_repository.", ("result",))
+GIT_FETCH_SECONDS = REGISTRY.histogram("ikoma_git_fetch_seconds", "Durée des git fetch.")
+GIT_LS_REMOTE_SECONDS = REGISTRY.histogram(
+    "ikoma_git_ls_remote_seconds", "Durée des git ls-remote groupés du surveillant de branches.", ("result",)
+)
+GIT_FETCH_BYTES = REGISTRY.histogram(
+    "ikoma_git_fetch_bytes", "Octets ajoutés au dépôt local par un git fetch.", buckets=BYTES_BUCKETS
+)
+MIGRATION_SECONDS = REGISTRY.histogram(
+    "ikoma_migration_apply_seconds", "Durée d'application de chaque fichier de migration Supabase."
+)
+MIGRATION_RUNS = REGISTRY.counter(
+    "ikoma_migration_runs", "Exécutions de supabase_apply_migrations.", ("status",)
+)
+JOBS = REGISTRY.gauge("ikoma_jobs", "Jobs de la file par statut.", ("status",))
+JOBS_RUNNING = REGISTRY.gauge("ikoma_jobs_running", "Jobs en cours dans les workers de ce processus.")
+
+
+def command_label(command: Sequence[str]) -> str:
+    """`git fetch`, `docker compose`, ... : programme et sous-commande, sans chemins ni options."""
+
+    if not command:
+        return ""
+    program = str(command[0]).rsplit("/", 1)[-1]
+    if len(command) > 1 and not str(command[1]).startswith("-") and "/" not in str(command[1]):
+        return f"{program} {command[1]}"
+    return program
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
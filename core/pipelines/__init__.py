@@ -0,0 +1,9 @@
+"""Orchestration des flux IKOMA BRIDGE.
+
+`run_pipeline` déploie un lot d'applications en parallèle en respectant leurs
+dépendances déclarées.
+"""
+
+from .engine import PipelineApp, PipelineReport, run_pipeline
+
+__all__ = ["PipelineApp", "PipelineReport", "run_pipeline"]
@@ -0,0 +1,292 @@
+"""Moteur de déploiement multi-applications piloté par un graphe de dépendances.
+
+Chaque application passe par deux phases (voir `core.deploy.deploy_up`) :
+- `prepare` (pré-vol, git sync, manifest) ne dépend de personne et démarre tout de suite ;
+- `apply` (compose up, health, statut) attend que toutes ses dépendances soient HEALTHY.
+
+Le nombre de phases exécutées simultanément est plafonné par `max_parallel`. En mode
+`fail_fast`, le premier échec arrête l'ordonnancement ; sinon seules les applications
+qui dépendent (transitivement) d'un échec sont ignorées. Une application ignorée
+après sa préparation est close par `abort` (`abort_release` par défaut) : son run
+passe SKIPPED et son pull d'images est abandonné.
+
+Le rapport final donne la durée murale du rollout et la durée du chemin critique
+(ce qu'obtiendrait un parallélisme illimité avec les mêmes durées par phase).
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.deploy.deploy_up import DeployError, DeployReport, PreparedRelease
+
+DEFAULT_MAX_PARALLEL = 4
+
+APP_PENDING = "PENDING"
+APP_HEALTHY = "HEALTHY"
+APP_FAILED = "FAILED"
+APP_SKIPPED = "SKIPPED"
+
+PrepareFn = Callable[..., PreparedRelease]
+ApplyFn = Callable[[PreparedRelease], DeployReport]
+AbortFn = Callable[[PreparedRelease, str], object]
+
+
+@dataclass
+class PipelineApp:
+    """Application à déployer et ses dépendances (par `app_id`)."""
+
+    app_id: str
+    ref: str
+    depends_on: List[str] = field(default_factory=list)
+    remote_url: Optional[str] = None
+
+
+@dataclass
+class AppOutcome:
+    app_id: str
+    status: str = APP_PENDING
+    error: Optional[str] = None
+    report: Optional[DeployReport] = None
+    # Fenêtres (début, fin) relatives au démarrage du pipeline, en secondes.
+    prepare_window: Optional[Tuple[float, float]] = None
+    apply_window: Optional[Tuple[float, float]] = None
+
+    @property
+    def prepare_duration(self) -> float:
+        return self.prepare_window[1] - self.prepare_window[0] if self.prepare_window else 0.0
+
+    @property
+    def apply_duration(self) -> float:
+        return self.apply_window[1] - self.apply_window[0] if self.apply_window else 0.0
+
+
+@dataclass
+class PipelineReport:
+    outcomes: Dict[str, AppOutcome]
+    wall_clock: float
+    critical_path: float
+    critical_path_apps: List[str]
+
+    @property
+    def succeeded(self) -> bool:
+        return all(outcome.status == APP_HEALTHY for outcome in self.outcomes.values())
+
+    def summary_lines(self) -> List[str]:
+        lines = []
+        for outcome in self.outcomes.values():
+            stages = outcome.report.stage_durations() if outcome.report else {}
+            stage_text = ", ".join(f"{name}={duration:.2f}s" for name, duration in stages.items()) or "-"
+            line = f"{outcome.app_id}: {outcome.status} [{stage_text}]"
+            if outcome.error:
+                line += f" ({outcome.error})"
+            lines.append(line)
+        efficiency = self.critical_path / self.wall_clock if self.wall_clock else 1.0
+        lines.append(
+            f"Durée murale {self.wall_clock:.2f}s, chemin critique {self.critical_path:.2f}s "
+            f"({' -> '.join(self.critical_path_apps) or '-'}), efficacité {efficiency:.0%}"
+        )
+        return lines
+
+
+def run_pipeline(
+    apps: Iterable[PipelineApp],
+    *,
+    max_parallel: int = DEFAULT_MAX_PARALLEL,
+    fail_fast: bool = True,
+    prepare: PrepareFn | None = None,
+    apply: ApplyFn | None = None,
+    abort: AbortFn | None = None,
+) -> PipelineReport:
+    """Déploie un ensemble d'applications en respectant leurs dépendances.
+
+    Args:
+        apps: Applications à déployer ; `depends_on` doit référencer des apps du lot.
+        max_parallel: Nombre maximal de phases exécutées simultanément.
+        fail_fast: Arrête d'ordonnancer de nouvelles phases au premier échec.
+        prepare: Phase de préparation (par défaut `prepare_release`).
+        apply: Phase d'application (par défaut `apply_release`).
+        abort: Clôture d'une app préparée mais jamais appliquée (par défaut
+            `abort_release` si `prepare` et `apply` sont ceux par défaut, sinon rien).
+
+    Raises:
+        DeployError: si le graphe est invalide (app en double, dépendance inconnue ou cycle).
+    """
+    if prepare is None or apply is None:
+        from core.deploy.deploy_up import abort_release, apply_release, prepare_release
+
+        if prepare is None and apply is None and abort is None:
+            abort = abort_release
+        prepare = prepare or prepare_release
+        apply = apply or apply_release
+
+    graph = _build_graph(apps)
+    order = _topological_order(graph)
+    dependents: Dict[str, List[str]] = {app_id: [] for app_id in graph}
+    for app in graph.values():
+        for dep in app.depends_on:
+            dependents[dep].append(app.app_id)
+    # Priorité : les apps en tête des plus longues chaînes de dépendants d'abord.
+    height = _chain_heights(order, dependents)
+
+    outcomes = {app_id: AppOutcome(app_id=app_id) for app_id in order}
+    prepared: Dict[str, PreparedRelease] = {}
+    applied: Set[str] = set()
+    ready: List[Tuple[str, str]] = [("prepare", app_id) for app_id in sorted(order, key=lambda a: -height[a])]
+    running: Dict[Future, Tuple[str, str, float]] = {}
+    stopped = False
+    origin = time.perf_counter()
+
+    def _skip_dependents(app_id: str) -> None:
+        for child in dependents[app_id]:
+            if outcomes[child].status == APP_PENDING:
+                outcomes[child].status = APP_SKIPPED
+                outcomes[child].error = f"dépendance {app_id} en échec"
+                _skip_dependents(child)
+
+    def _apply_if_ready(app_id: str) -> None:
+        if app_id not in prepared or outcomes[app_id].status != APP_PENDING:
+            return
+        if all(outcomes[dep].status == APP_HEALTHY for dep in graph[app_id].depends_on):
+            ready.insert(0, ("apply", app_id))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="ikoma-pipeline") as executor:
+        while ready or running:
+            while ready and not stopped and len(running) < max(1, max_parallel):
+                phase, app_id = ready.pop(0)
+                if outcomes[app_id].status != APP_PENDING:
+                    continue
+                app = graph[app_id]
+                if phase == "prepare":
+                    report = DeployReport(app_id=app_id, ref=app.ref)
+                    outcomes[app_id].report = report
+                    future = executor.submit(prepare, app_id, app.ref, remote_url=app.remote_url, report=report)
+                else:
+                    applied.add(app_id)
+                    future = executor.submit(apply, prepared[app_id])
+                running[future] = (phase, app_id, time.perf_counter() - origin)
+
+            if not running:
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                phase, app_id, started = running.pop(future)
+                window = (started, time.perf_counter() - origin)
+                outcome = outcomes[app_id]
+                if phase == "prepare":
+                    outcome.prepare_window = window
+                else:
+                    outcome.apply_window = window
+
+                error = future.exception()
+                if error is not None:
+                    outcome.status = APP_FAILED
+                    outcome.error = str(error)
+                    _skip_dependents(app_id)
+                    if fail_fast:
+                        stopped = True
+                    continue
+
+                if phase == "prepare":
+                    prepared[app_id] = future.result()
+                    _apply_if_ready(app_id)
+                else:
+                    outcome.report = future.result()
+                    outcome.status = APP_HEALTHY
+                    for child in dependents[app_id]:
+                        _apply_if_ready(child)
+
+            if stopped:
+                ready.clear()
+
+    wall_clock = time.perf_counter() - origin
+    for outcome in outcomes.values():
+        if outcome.status == APP_PENDING:
+            outcome.status = APP_SKIPPED
+            outcome.error = outcome.error or "pipeline interrompu (fail-fast)"
+
+    # Préparées mais jamais appliquées : le run ouvert par `prepare` est clos ici.
+    for app_id, release in prepared.items():
+        if app_id not in applied and abort is not None:
+            try:
+                abort(release, outcomes[app_id].error or "pipeline interrompu")
+            except Exception as exc:  # noqa: BLE001 - le rapport du pipeline prime
+                outcomes[app_id].error = f"{outcomes[app_id].error} ; clôture du run en échec: {exc}"
+
+    critical_path, critical_apps = _critical_path(order, graph, outcomes)
+    return PipelineReport(
+        outcomes=outcomes,
+        wall_clock=wall_clock,
+        critical_path=critical_path,
+        critical_path_apps=critical_apps,
+    )
+
+
+def _build_graph(apps: Iterable[PipelineApp]) -> Dict[str, PipelineApp]:
+    graph: Dict[str, PipelineApp] = {}
+    for app in apps:
+        if app.app_id in graph:
+            raise DeployError(f"Application listée deux fois dans le pipeline: {app.app_id}")
+        graph[app.app_id] = app
+    return graph
+
+
+def _topological_order(graph: Dict[str, PipelineApp]) -> List[str]:
+    for app in graph.values():
+        for dep in app.depends_on:
+            if dep not in graph:
+                raise DeployError(f"Dépendance inconnue pour {app.app_id}: {dep}")
+
+    remaining = {app_id: set(app.depends_on) for app_id, app in graph.items()}
+    order: List[str] = []
+    while remaining:
+        free = sorted(app_id for app_id, deps in remaining.items() if not deps)
+        if not free:
+            raise DeployError(f"Cycle de dépendances détecté entre: {', '.join(sorted(remaining))}")
+        for app_id in free:
+            order.append(app_id)
+            del remaining[app_id]
+        for deps in remaining.values():
+            deps.difference_update(free)
+    return order
+
+
+def _chain_heights(order: List[str], dependents: Dict[str, List[str]]) -> Dict[str, int]:
+    height: Dict[str, int] = {}
+    for app_id in reversed(order):
+        height[app_id] = 1 + max((height[child] for child in dependents[app_id]), default=0)
+    return height
+
+
+def _critical_path(
+    order: List[str], graph: Dict[str, PipelineApp], outcomes: Dict[str, AppOutcome]
+) -> Tuple[float, List[str]]:
+    """Fin au plus tôt de chaque app avec parallélisme illimité et les durées mesurées.
+
+    `apply` d'une app commence après sa propre préparation et après l'`apply` de
+    toutes ses dépendances : fin(a) = max(prepare(a), max(fin(dep))) + apply(a).
+    """
+
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for app_id in order:
+        outcome = outcomes[app_id]
+        start, parent = outcome.prepare_duration, None
+        for dep in graph[app_id].depends_on:
+            if finish[dep] > start:
+                start, parent = finish[dep], dep
+        finish[app_id] = start + outcome.apply_duration
+        previous[app_id] = parent
+
+    if not finish:
+        return 0.0, []
+    last = max(finish, key=finish.get)
+    chain: List[str] = []
+    cursor: Optional[str] = last
+    while cursor is not None:
+        chain.append(cursor)
+        cursor = previous[cursor]
+    return finish[last], list(reversed(chain))
@@ -0,0 +1,317 @@
+"""Pool de workers bornés consommant la file de jobs SQLite.
+
+Le Runner n'exécute plus un thread par requête : chaque POST enregistre un job et
+un nombre fixe de workers (`IKOMA_RUNNER_WORKERS`, 2 par défaut) les dépile.
+La sérialisation par `app_id` est garantie par `JobStore.claim_next`.
+
+Chaque pool réclame ses jobs sous un identifiant propre (`hôte:pid:pool`).
+Un thread de heartbeat prolonge leur bail toutes les `lease / 3` secondes et
+remet en file les jobs dont le bail a expiré (processus tué sur une autre
+machine, par exemple). Le Runner et l'API peuvent donc partager la base sans
+se voler leurs jobs.
+
+Une erreur de la file (base verrouillée, disque plein...) ne tue pas le worker :
+il la journalise et réessaie avec une attente doublée à chaque échec, bornée
+par `DEFAULT_MAX_BACKOFF`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from core.store.job_store import DEFAULT_LEASE, JOB_FAILED, JOB_SUCCEEDED, Job, JobStore, process_owner
+
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 1.0  # secondes
+DEFAULT_MAX_BACKOFF = 30.0  # secondes d'attente maximale après des erreurs répétées
+DEFAULT_HISTORY_KEEP = 200  # runs conservés par app
+DEFAULT_HISTORY_MAX_AGE_DAYS = 90
+HISTORY_JOB_APP_ID = "_history"
+
+JobHandler = Callable[[Job], Optional[str]]
+Number = TypeVar("Number", int, float)
+
+_logger = logging.getLogger("ikoma.workers")
+
+
+def env_number(name: str, default: Number, minimum: Number | None = None) -> Number:
+    """Nombre lu dans la variable `name`, du type de `default` et borné par `minimum`.
+
+    Une valeur absente vaut `default` ; une valeur invalide aussi, avec un
+    avertissement, pour qu'une faute de frappe n'empêche pas le démarrage.
+    """
+
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        value = type(default)(raw)
+    except ValueError:
+        _logger.warning("%s invalide (%s), utilisation de %s", name, raw, default)
+        return default
+    return max(minimum, value) if minimum is not None else value
+
+
+def configured_pool_size(default: int = DEFAULT_WORKERS) -> int:
+    """Taille du pool lue dans `IKOMA_RUNNER_WORKERS` (minimum 1)."""
+
+    return env_number("IKOMA_RUNNER_WORKERS", default, minimum=1)
+
+
+class WorkerPool:
+    """Exécute les jobs en file avec un nombre de threads borné."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, JobHandler],
+        size: int = DEFAULT_WORKERS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        lease: float = DEFAULT_LEASE,
+    ) -> None:
+        self.store = store
+        self.handlers = dict(handlers)
+        self.size = max(1, size)
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = process_owner(uuid.uuid4().hex[:8])
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    @property
+    def running_jobs(self) -> int:
+        return self._running
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self.store.ensure_schema()
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            _logger.info("%s job(s) interrompu(s) remis en file", requeued)
+        self._close_orphan_runs()
+
+        self._stopping.clear()
+        for index in range(self.size):
+            thread = threading.Thread(target=self._worker_loop, name=f"ikoma-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="ikoma-worker-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._stopping.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, kind: str, app_id: str, payload: Dict[str, Any]) -> Tuple[Job, bool]:
+        """Enregistre un job et réveille un worker."""
+
+        if kind not in self.handlers:
+            raise ValueError(f"Type de job inconnu: {kind}")
+        job, created = self.store.enqueue(kind, app_id, payload)
+        if created:
+            self._notify()
+        return job, created
+
+    def _notify(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _worker_loop(self) -> None:
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                claimed = self._run_next()
+                failures = 0
+            except Exception:  # noqa: BLE001 - un worker mort ne serait jamais remplacé
+                failures += 1
+                _logger.exception("Worker en échec (%s erreur(s) de suite)", failures)
+                claimed = False
+            if not claimed:
+                with self._wakeup:
+                    self._wakeup.wait(self._backoff(failures))
+
+    def _backoff(self, failures: int) -> float:
+        if not failures:
+            return self.poll_interval
+        return min(DEFAULT_MAX_BACKOFF, max(self.poll_interval, 0.1) * 2 ** min(failures, 16))
+
+    def _run_next(self) -> bool:
+        """Réclame et exécute un job ; False si la file n'a rien de prêt."""
+
+        job = self.store.claim_next(self.owner, self.lease)
+        if job is None:
+            return False
+        with self._running_lock:
+            self._running += 1
+        try:
+            self._execute(job)
+        finally:
+            with self._running_lock:
+                self._running -= 1
+            # La fin d'un job peut libérer une application bloquée.
+            self._notify()
+        return True
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stopping.wait(self.lease / 3):
+            try:
+                self.store.renew_leases(self.owner, self.lease)
+                if self.store.requeue_interrupted():
+                    self._close_orphan_runs()
+                    self._notify()
+            except Exception:  # noqa: BLE001 - un heartbeat manqué est rattrapé au suivant
+                _logger.exception("Heartbeat des jobs en échec")
+
+    def _close_orphan_runs(self) -> None:
+        from core.store.sqlite_store import DeploymentState
+
+        closed = DeploymentState(self.store.db_path).interrupt_orphan_runs()
+        if closed:
+            _logger.info("%s run(s) de déploiement orphelin(s) clos en INTERRUPTED", closed)
+
+    def _execute(self, job: Job) -> None:
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self._finish(job, JOB_FAILED, f"Type de job inconnu: {job.kind}")
+            return
+        try:
+            message = handler(job)
+        except Exception as exc:  # noqa: BLE001 - le handler trace déjà dans ses logs
+            self._finish(job, JOB_FAILED, str(exc))
+            return
+        self._finish(job, JOB_SUCCEEDED, message)
+
+    def _finish(self, job: Job, status: str, message: Optional[str]) -> None:
+        """`store.finish` réessayé : un job resté RUNNING sous notre bail ne serait jamais repris.
+
+        À l'arrêt du pool, l'erreur est propagée ; le bail expire et le job est remis en file.
+        """
+
+        failures = 0
+        while True:
+            try:
+                self.store.finish(job.id, status, message)
+                return
+            except Exception:  # noqa: BLE001 - réessayé jusqu'à l'arrêt du pool
+                failures += 1
+                if self._stopping.is_set():
+                    raise
+                _logger.exception("Clôture du job %s en échec (%s erreur(s) de suite)", job.id, failures)
+                self._stopping.wait(self._backoff(failures))
+
+
+# --- Handlers standards ---
+def _handle_deploy(job: Job) -> str:
+    from core.deploy import deploy_up
+
+    ref = job.payload["ref"]
+    report = deploy_up(
+        job.app_id,
+        ref,
+        remote_url=job.payload.get("remote_url"),
+        force=bool(job.payload.get("force")),
+        job_id=job.id,
+    )
+    if report.fast_path:
+        return f"Déploiement {ref} inchangé, vérifié par le chemin rapide"
+    return f"Déploiement {ref} terminé"
+
+
+def _handle_rollback(job: Job) -> str:
+    from core.deploy import rollback_release
+
+    report = rollback_release(
+        job.app_id,
+        to_run_id=job.payload.get("to_run_id"),
+        reason=job.payload.get("reason"),
+        job_id=job.id,
+    )
+    return f"Rollback vers {report.commit_sha[:12]} terminé"
+
+
+def _handle_sync(job: Job) -> str:
+    from core.deploy.deploy_up import LOGS_DIR
+    from core.logging.logger import build_logger
+    from core.scm.git_repo import sync_repository
+
+    ref = job.payload["ref"]
+    logger = build_logger(job.app_id, LOGS_DIR, log_filename="sync.log")
+    repo_dir = sync_repository(
+        job.app_id,
+        ref,
+        Path(job.payload["repos_dir"]),
+        logger,
+        remote_url=job.payload.get("remote_url"),
+    )
+    return f"Synchronisation {ref} terminée dans {repo_dir}"
+
+
+def _handle_migrate(job: Job) -> str:
+    from core.services.supabase import supabase_apply_migrations
+
+    applied = supabase_apply_migrations(
+        job.app_id,
+        Path(job.payload["repo_path"]),
+        job.payload["migrations_dir"],
+        single_transaction=job.payload.get("single_transaction"),
+    )
+    return f"{len(applied)} migration(s) appliquée(s)"
+
+
+def compact_history(keep_per_app: int, max_age_days: float) -> Tuple[int, int]:
+    """Applique la rétention : runs purgés avec leurs fichiers d'événements, mesures de commande anciennes.
+
+    Returns:
+        Le nombre de runs et de mesures de commande supprimés.
+    """
+
+    from core.deploy.deploy_up import DB_PATH, LOGS_DIR
+    from core.logging.events import delete_run_events
+    from core.store.sqlite_store import DeploymentState
+
+    db = DeploymentState(DB_PATH)
+    db.ensure_schema()
+    purged = db.purge_runs(keep_per_app=keep_per_app, max_age_days=max_age_days)
+    for app_id, run_ids in purged.items():
+        delete_run_events(LOGS_DIR, app_id, run_ids)
+    deleted = sum(len(run_ids) for run_ids in purged.values())
+    return deleted, db.compact_commands(max_age_days=max_age_days)
+
+
+def _handle_compact(job: Job) -> str:
+    deleted, commands = compact_history(
+        int(job.payload.get("keep_per_app", DEFAULT_HISTORY_KEEP)),
+        float(job.payload.get("max_age_days", DEFAULT_HISTORY_MAX_AGE_DAYS)),
+    )
+    return f"{deleted} run(s) et {commands} mesure(s) de commande supprimé(s) de l'historique"
+
+
+def history_retention_payload() -> Dict[str, Any]:
+    """Paramètres de rétention lus dans `IKOMA_HISTORY_KEEP` et `IKOMA_HISTORY_MAX_AGE_DAYS`."""
+
+    return {
+        "keep_per_app": env_number("IKOMA_HISTORY_KEEP", DEFAULT_HISTORY_KEEP, minimum=0),
+        "max_age_days": env_number("IKOMA_HISTORY_MAX_AGE_DAYS", float(DEFAULT_HISTORY_MAX_AGE_DAYS), minimum=0.0),
+    }
+
+
+def default_handlers() -> Dict[str, JobHandler]:
+    return {
+        "deploy": _handle_deploy,
+        "rollback": _handle_rollback,
+        "sync": _handle_sync,
+        "migrate": _handle_migrate,
+        "compact": _handle_compact,
+    }
@@ -1,31 +1,418 @@
+"""Synchronisation des dépôts applicatifs.
+
+Par défaut, chaque URL distante dispose d'un miroir bare partagé sous
+`data/git-cache/` et chaque application obtient un `git worktree` de ce miroir :
+les objets ne sont téléchargés qu'une fois, même pour plusieurs apps issues du même
+monorepo. Seule la référence demandée est récupérée, dans une ref dédiée
+(`+<ref>:refs/ikoma/fetch/<sha1(ref)>`) plutôt que `FETCH_HEAD`, que se partagent tous
+les fetchs du miroir. Le miroir est verrouillé par `flock` sur `<miroir>.lock`,
+ce qui sérialise les syncs du Runner, de l'API et de la CLI.
+
+Variables d'environnement :
+- `IKOMA_GIT_CACHE=0` désactive le miroir partagé (clone autonome par app) ;
+- `IKOMA_GIT_DEPTH` limite la profondeur d'historique récupérée ;
+- `IKOMA_GIT_FILTER` active un clone partiel (ex. `blob:none`).
+"""
 from __future__ import annotations
 
+import fcntl
+import hashlib
 import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
 
-from core.deploy.deploy_up import DeployError
+from core.deploy.deploy_up import GIT_CACHE_DIR, DeployError
 from core.logging.logger import run_command
+from core.logging.metrics import GIT_FETCH_BYTES, GIT_FETCH_SECONDS, GIT_LS_REMOTE_SECONDS, GIT_SYNC_SECONDS
+from core.scm.webhooks import normalize_repo_url
+
+_SHA_RE = re.compile(r"^[0-9a-f]{7,40}$")
+_LS_REMOTE_MAX_PATTERNS = 50  # au-delà, toutes les branches sont listées
+_MIRROR_LOCKS: Dict[str, threading.Lock] = {}
+_MIRROR_LOCKS_GUARD = threading.Lock()
+
+
+def sync_repository(
+    app_id: str,
+    ref: str,
+    repos_dir: Path,
+    logger,
+    *,
+    remote_url: str | None = None,
+    cache_dir: Path | None = None,
+) -> Path:
+    """Clone ou met à jour le dépôt applicatif.
 
+    `remote_url` prime sur `IKOMA_GIT_REMOTE` : les workers du Runner le passent
+    explicitement pour ne pas partager une variable d'environnement entre threads.
+    """
 
-def sync_repository(app_id: str, ref: str, repos_dir: Path, logger) -> Path:
-    """Clone ou met à jour le dépôt applicatif."""
+    start = time.perf_counter()
+    result = "error"
+    try:
+        repo_dir = _sync_repository(app_id, ref, repos_dir, logger, remote_url=remote_url, cache_dir=cache_dir)
+        result = "ok"
+        return repo_dir
+    finally:
+        GIT_SYNC_SECONDS.labels(result).observe(time.perf_counter() - start)
 
+
+def _sync_repository(
+    app_id: str,
+    ref: str,
+    repos_dir: Path,
+    logger,
+    *,
+    remote_url: str | None,
+    cache_dir: Path | None,
+) -> Path:
     repos_dir.mkdir(parents=True, exist_ok=True)
     repo_dir = repos_dir / app_id
-    remote_url = os.getenv("IKOMA_GIT_REMOTE")
+    if remote_url and (repo_dir / ".git").exists():
+        _follow_remote_change(app_id, repo_dir, remote_url, logger)
+    remote_url = remote_url or os.getenv("IKOMA_GIT_REMOTE")
+
+    if (repo_dir / ".git").is_dir():
+        # Clone autonome (historique ou cache désactivé) : fetch du seul ref demandé.
+        logger.info("Repo %s déjà présent, fetch %s + checkout", repo_dir, ref)
+        sha = _fetch_ref(repo_dir, ref, logger)
+        run_command(["git", "checkout", "--detach", sha], cwd=repo_dir, logger=logger)
+        return repo_dir
 
-    if repo_dir.exists():
-        logger.info("Repo %s déjà présent, fetch + checkout", repo_dir)
-        run_command(["git", "fetch", "--all", "--prune"], cwd=repo_dir, logger=logger)
-        run_command(["git", "checkout", ref], cwd=repo_dir, logger=logger)
-        run_command(["git", "pull", "--ff-only"], cwd=repo_dir, logger=logger)
+    if (repo_dir / ".git").is_file():
+        # Worktree existant : le miroir est retrouvé via le répertoire git commun.
+        mirror_dir = _common_dir(repo_dir)
+    elif not remote_url:
+        raise DeployError(
+            "Impossible de cloner : définir la variable d'environnement IKOMA_GIT_REMOTE",
+        )
+    elif not _cache_enabled():
+        logger.info("Clonage de %s dans %s", remote_url, repo_dir)
+        run_command(["git", "clone", *_transfer_options(), remote_url, str(repo_dir)], logger=logger)
+        sha = _fetch_ref(repo_dir, ref, logger)
+        run_command(["git", "checkout", "--detach", sha], cwd=repo_dir, logger=logger)
+        return repo_dir
     else:
-        if not remote_url:
-            raise DeployError(
-                "Impossible de cloner : définir la variable d'environnement IKOMA_GIT_REMOTE",
+        mirror_dir = ensure_mirror(remote_url, cache_dir or GIT_CACHE_DIR, logger)
+
+    with _mirror_lock(mirror_dir):
+        sha = _fetch_ref(mirror_dir, ref, logger)
+        # Référence dédiée : le commit déployé reste protégé d'un `git gc` du miroir.
+        run_command(["git", "update-ref", f"refs/ikoma/apps/{app_id}", sha], cwd=mirror_dir, logger=logger)
+
+        if repo_dir.exists():
+            logger.info("Worktree %s déjà présent, checkout %s", repo_dir, sha)
+            run_command(["git", "checkout", "--detach", sha], cwd=repo_dir, logger=logger)
+        else:
+            logger.info("Création du worktree %s depuis %s", repo_dir, mirror_dir)
+            run_command(["git", "worktree", "prune"], cwd=mirror_dir, logger=logger)
+            run_command(
+                ["git", "worktree", "add", "--detach", str(repo_dir), sha],
+                cwd=mirror_dir,
+                logger=logger,
             )
-        logger.info("Clonage de %s dans %s", remote_url, repo_dir)
-        run_command(["git", "clone", remote_url, str(repo_dir)], logger=logger)
-        run_command(["git", "checkout", ref], cwd=repo_dir, logger=logger)
 
     return repo_dir
+
+
+def _follow_remote_change(app_id: str, repo_dir: Path, remote_url: str, logger) -> None:
+    """Rattache l'extraction de `app_id` à `remote_url` si son origine est un autre dépôt.
+
+    Un clone autonome change simplement d'`origin`. Un worktree est retiré de l'ancien
+    miroir (avec sa ref `refs/ikoma/apps/<app>`) pour être recréé depuis celui du
+    nouveau remote.
+    """
+
+    current = origin_url(repo_dir)
+    if normalize_repo_url(current) == normalize_repo_url(remote_url):
+        return
+    logger.info("Remote de %s changé : %s → %s", app_id, current, remote_url)
+    if (repo_dir / ".git").is_dir():
+        run_command(["git", "remote", "set-url", "origin", remote_url], cwd=repo_dir, logger=logger)
+        return
+
+    old_mirror = _common_dir(repo_dir)
+    with _mirror_lock(old_mirror):
+        run_command(["git", "worktree", "remove", "--force", str(repo_dir)], cwd=old_mirror, logger=logger)
+        run_command(["git", "update-ref", "-d", f"refs/ikoma/apps/{app_id}"], cwd=old_mirror, logger=logger)
+
+
+def _common_dir(repo_dir: Path) -> Path:
+    """Répertoire git commun d'un worktree, c'est-à-dire son miroir."""
+
+    common = Path(_git_output(["rev-parse", "--git-common-dir"], cwd=repo_dir))
+    return common if common.is_absolute() else (repo_dir / common).resolve()
+
+
+def ensure_mirror(remote_url: str, cache_dir: Path, logger) -> Path:
+    """Renvoie le miroir bare partagé de `remote_url`, créé au besoin (sans fetch)."""
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    mirror_dir = cache_dir / mirror_name(remote_url)
+    with _mirror_lock(mirror_dir):
+        if (mirror_dir / "HEAD").exists():
+            return mirror_dir
+
+        logger.info("Initialisation du miroir %s pour %s", mirror_dir, remote_url)
+        run_command(["git", "init", "--bare", "--quiet", str(mirror_dir)], logger=logger)
+        run_command(["git", "remote", "add", "origin", remote_url], cwd=mirror_dir, logger=logger)
+        clone_filter = os.getenv("IKOMA_GIT_FILTER")
+        if clone_filter:
+            run_command(["git", "config", "remote.origin.promisor", "true"], cwd=mirror_dir, logger=logger)
+            run_command(
+                ["git", "config", "remote.origin.partialclonefilter", clone_filter],
+                cwd=mirror_dir,
+                logger=logger,
+            )
+    return mirror_dir
+
+
+def mirror_name(remote_url: str) -> str:
+    """Nom de dossier stable et lisible pour le miroir d'une URL."""
+
+    digest = hashlib.sha1(remote_url.encode("utf-8")).hexdigest()[:12]  # nosec - nommage uniquement
+    base = re.sub(r"[^A-Za-z0-9._-]", "_", remote_url.rstrip("/").rsplit("/", 1)[-1])
+    base = base[:-4] if base.endswith(".git") else base
+    return f"{base or 'repo'}-{digest}.git"
+
+
+def checkout_local_commit(repo_dir: Path, sha: str, logger) -> None:
+    """Extrait `sha` dans `repo_dir` sans accès réseau (rollback).
+
+    Raises:
+        DeployError: si le dépôt ou le commit n'est plus présent localement.
+    """
+
+    if not (repo_dir / ".git").exists():
+        raise DeployError(f"Dépôt {repo_dir} introuvable : rien à restaurer sans fetch")
+    if not has_commit(repo_dir, sha):
+        raise DeployError(f"Commit {sha} absent de {repo_dir} : rollback impossible sans fetch")
+    run_command(["git", "checkout", "--detach", sha], cwd=repo_dir, logger=logger)
+
+
+def head_commit(repo_dir: Path) -> str:
+    """SHA du commit actuellement extrait dans `repo_dir`."""
+
+    return _git_output(["rev-parse", "HEAD"], cwd=repo_dir)
+
+
+def origin_url(repo_dir: Path) -> str:
+    """URL du remote `origin` de `repo_dir` (celle du miroir pour un worktree)."""
+
+    return _git_output(["remote", "get-url", "origin"], cwd=repo_dir)
+
+
+def resolve_local_ref(repo_dir: Path, ref: str) -> Optional[str]:
+    """SHA de `ref` d'après les objets locaux seulement (dernier fetch, branche de suivi, tag ou SHA), sans réseau."""
+
+    for candidate in (fetch_ref_name(ref), f"origin/{ref}", ref):
+        result = subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", f"{candidate}^{{commit}}"],
+            cwd=repo_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=False,
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    return None
+
+
+def fetch_objects(repo_dir: Path, ref: str, timeout: float = 60.0) -> bool:
+    """`git fetch origin <ref>` sans checkout ni journalisation : seuls les objets et la ref de fetch changent."""
+
+    try:
+        result = subprocess.run(
+            [
+                "git", "fetch", "--quiet", "--no-tags", "--refmap=", *_transfer_options(),
+                "origin", f"+{ref}:{fetch_ref_name(ref)}",
+            ],
+            cwd=repo_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def read_blobs(repo_dir: Path, specs: Sequence[str]) -> Dict[str, Optional[bytes]]:
+    """Contenu de chaque `commit:chemin` (None si absent), en un seul `git cat-file --batch`.
+
+    Rien n'est extrait dans l'arbre de travail : sert à inspecter un commit sans checkout.
+    """
+
+    if not specs:
+        return {}
+    result = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=repo_dir,
+        input="".join(f"{spec}\n" for spec in specs).encode("utf-8"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise DeployError(f"git cat-file échoué: {result.stderr.decode('utf-8', errors='replace').strip()}")
+
+    blobs: Dict[str, Optional[bytes]] = {}
+    output, offset = result.stdout, 0
+    for spec in specs:
+        end = output.index(b"\n", offset)
+        header = output[offset:end].split()
+        offset = end + 1
+        if len(header) != 3 or header[1] != b"blob":
+            blobs[spec] = None  # `<spec> missing` (ou arbre)
+            if len(header) == 3:
+                offset += int(header[2]) + 1
+            continue
+        size = int(header[2])
+        blobs[spec] = output[offset : offset + size]
+        offset += size + 1
+    return blobs
+
+
+def ls_remote_heads(remote_url: str, branches: Sequence[str], timeout: float = 30.0) -> Dict[str, str]:
+    """SHA de tête de chaque branche de `branches` sur `remote_url`, en un seul `git ls-remote`.
+
+    Une branche absente du remote est absente du résultat. Aucun objet n'est
+    téléchargé et git ne demande jamais d'identifiants (`GIT_TERMINAL_PROMPT=0`).
+
+    Raises:
+        DeployError: remote injoignable, accès refusé ou délai dépassé.
+    """
+
+    wanted = {f"refs/heads/{branch}": branch for branch in branches}
+    patterns = sorted(wanted) if len(wanted) <= _LS_REMOTE_MAX_PATTERNS else []
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(
+            ["git", "ls-remote", "--heads", remote_url, *patterns],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout,
+            check=False,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        GIT_LS_REMOTE_SECONDS.labels("error").observe(time.perf_counter() - start)
+        raise DeployError(f"git ls-remote {remote_url} a échoué: {exc}") from exc
+    GIT_LS_REMOTE_SECONDS.labels("ok" if result.returncode == 0 else "error").observe(time.perf_counter() - start)
+    if result.returncode != 0:
+        raise DeployError(f"git ls-remote {remote_url} a échoué: {result.stderr.strip()}")
+
+    heads: Dict[str, str] = {}
+    for line in result.stdout.splitlines():
+        sha, _, name = line.partition("\t")
+        if name in wanted:
+            heads[wanted[name]] = sha
+    return heads
+
+
+def _fetch_ref(git_dir: Path, ref: str, logger) -> str:
+    """Récupère uniquement `ref` depuis `origin` et renvoie le SHA du commit."""
+
+    if _SHA_RE.match(ref) and has_commit(git_dir, ref):
+        logger.info("Commit %s déjà présent localement, pas de fetch", ref)
+        return _git_output(["rev-parse", f"{ref}^{{commit}}"], cwd=git_dir)
+
+    size_before = _objects_bytes(git_dir)
+    # Ref de destination propre à `ref` : `FETCH_HEAD` est commun à tous les fetchs
+    # du miroir. `--refmap=` n'écrit qu'elle : les branches de suivi `origin/*` ne sont
+    # plus mises à jour, ce qui évite leurs conflits (`feature` puis `feature/x`).
+    destination = fetch_ref_name(ref)
+    result = run_command(
+        ["git", "fetch", "--no-tags", "--refmap=", *_transfer_options(), "origin", f"+{ref}:{destination}"],
+        cwd=git_dir,
+        logger=logger,
+    )
+    GIT_FETCH_SECONDS.observe(result.duration)
+    GIT_FETCH_BYTES.observe(max(0, _objects_bytes(git_dir) - size_before))
+    return _git_output(["rev-parse", f"{destination}^{{commit}}"], cwd=git_dir)
+
+
+def fetch_ref_name(ref: str) -> str:
+    """Ref locale recevant le fetch de `ref` : `refs/ikoma/fetch/<sha1(ref)>`.
+
+    Un nom plat et propre à chaque ref : `feature` et `feature/x` ne se gênent pas
+    (conflit fichier/répertoire), `a.b` et `a_b` ne se confondent pas.
+    """
+
+    return f"refs/ikoma/fetch/{hashlib.sha1(ref.encode('utf-8')).hexdigest()}"  # nosec - nommage uniquement
+
+
+def _objects_bytes(git_dir: Path) -> int:
+    """Taille des objets du dépôt (packs et objets isolés), sans lancer `git count-objects`."""
+
+    objects_dir = git_dir / ".git" / "objects" if (git_dir / ".git").is_dir() else git_dir / "objects"
+    total = 0
+    for directory, _, files in os.walk(objects_dir):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(directory, name)).st_size
+            except OSError:
+                continue  # objet supprimé par un gc concurrent
+    return total
+
+
+def has_commit(git_dir: Path, ref: str) -> bool:
+    """Vrai si `ref` désigne un commit déjà présent dans les objets locaux."""
+
+    result = subprocess.run(
+        ["git", "cat-file", "-e", f"{ref}^{{commit}}"],
+        cwd=git_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    return result.returncode == 0
+
+
+def _git_output(args: List[str], cwd: Path) -> str:
+    result = subprocess.run(
+        ["git", *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False
+    )
+    if result.returncode != 0:
+        raise DeployError(f"Commande échouée ({result.returncode}): git {' '.join(args)}: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def _transfer_options() -> List[str]:
+    options: List[str] = []
+    depth = os.getenv("IKOMA_GIT_DEPTH")
+    if depth:
+        options.append(f"--depth={int(depth)}")
+    clone_filter = os.getenv("IKOMA_GIT_FILTER")
+    if clone_filter:
+        options.append(f"--filter={clone_filter}")
+    return options
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("IKOMA_GIT_CACHE", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+@contextmanager
+def _mirror_lock(mirror_dir: Path) -> Iterator[None]:
+    """Accès exclusif au miroir : verrou de thread puis `flock` sur `<miroir>.lock` (inter-processus)."""
+
+    key = str(mirror_dir)
+    with _MIRROR_LOCKS_GUARD:
+        thread_lock = _MIRROR_LOCKS.setdefault(key, threading.Lock())
+    lock_path = Path(f"{mirror_dir}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with thread_lock, open(lock_path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
@@ -1,12 +1,17 @@
-"""Interfaces de déploiement (stubs).
+"""Interfaces de déploiement.
 
-Aucune logique métier ni appel Docker n'est réalisé ici : uniquement les signatures
-et contrats documentés pour l'implémentation future.
+`rollback` délègue à `core.deploy.deploy_up.rollback_release` ; `up` en mode
+`dry_run` renvoie le plan de `core.deploy.deploy_up.plan_deploy`, sinon reste un
+stub documenté pour l'intégration Deployer.
 """
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from core.deploy.deploy_up import DeployReport
+    from core.deploy.plan import DeployPlan
 
 
 @dataclass
@@ -19,29 +24,51 @@ class DeployContext:
     dry_run: bool = False
 
 
-def up(ctx: DeployContext) -> None:
+def up(ctx: DeployContext) -> "DeployPlan":
     """Déclenche le déploiement d'une release sur un environnement donné.
 
     Args:
         ctx: Contexte décrivant l'environnement cible, le service, l'identifiant de release
             et un éventuel mode `dry_run` pour valider sans appliquer.
 
+    Returns:
+        En `dry_run`, le plan du déploiement de `release_id` (ref Git, `main` par défaut)
+        pour l'app `service`, calculé sans effet de bord.
+
     Raises:
-        NotImplementedError: toujours, tant que l'intégration Deployer n'est pas codée.
+        NotImplementedError: hors `dry_run`, tant que l'intégration Deployer n'est pas codée.
     """
+    if ctx.dry_run:
+        from core.deploy.deploy_up import plan_deploy
+
+        return plan_deploy(ctx.service, ctx.release_id or "main")
 
     raise NotImplementedError("deploy.up sera implémenté avec le pilote IKOMA Deployer")
 
 
-def rollback(ctx: DeployContext, reason: str | None = None) -> None:
+def rollback(ctx: DeployContext, reason: str | None = None) -> "DeployReport":
     """Ordonne un rollback vers une release précédente.
 
     Args:
-        ctx: Contexte identifiant l'environnement/le service et la release cible.
+        ctx: `service` est l'identifiant applicatif ; `release_id`, s'il est fourni,
+            est le numéro du run HEALTHY visé (sinon la dernière release saine précédente).
         reason: Optionnellement, la justification du rollback (audit/logs).
 
+    Returns:
+        Le rapport du rollback (statut, commit restauré, durées par étape).
+
     Raises:
-        NotImplementedError: toujours, tant que l'intégration Deployer n'est pas codée.
+        DeployError: cible introuvable, `release_id` qui n'est pas un numéro de run,
+            `dry_run` demandé ou échec du redémarrage.
     """
+    from core.deploy.deploy_up import DeployError, rollback_release
 
-    raise NotImplementedError("deploy.rollback sera implémenté avec le pilote IKOMA Deployer")
+    if ctx.dry_run:
+        raise DeployError("Le mode dry_run n'est pas disponible pour un rollback")
+    release_id = str(ctx.release_id).strip() if ctx.release_id else ""
+    if release_id and not release_id.isdigit():
+        raise DeployError(
+            f"release_id invalide pour un rollback ({ctx.release_id!r}) : attendu un numéro de run, pas une ref Git"
+        )
+    to_run_id = int(release_id) if release_id else None
+    return rollback_release(ctx.service, to_run_id=to_run_id, reason=reason)
@@ -3,15 +3,19 @@ from __future__ import annotations
 
 import hashlib
 import os
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Mapping, Optional
+from typing import Dict, Iterator, Mapping, Optional
 
 import psycopg2
 from psycopg2.extensions import connection as PgConnection
 from psycopg2 import sql
 
 from core.logging.logger import build_logger
+from core.logging.metrics import MIGRATION_RUNS, MIGRATION_SECONDS
+from core.store.checksum_cache import ChecksumCache, FileChecksum
 from core.store.sqlite_store import DeploymentState
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -19,6 +23,10 @@ DATA_DIR = ROOT_DIR / "data"
 LOGS_DIR = DATA_DIR / "logs"
 DB_PATH = DATA_DIR / "ikoma.db"
 
+# À incrémenter à chaque changement de `_ensure_tracking_table`.
+TRACKING_TABLE_VERSION = 2
+TRACKING_TABLE_COMMENT = f"ikoma-tracking:v{TRACKING_TABLE_VERSION}"
+
 
 @dataclass
 class SupabaseConfig:
@@ -76,7 +84,19 @@ def supabase_connect(env: Mapping[str, str] | None = None) -> PgConnection:
 
 
 def _ensure_tracking_table(conn: PgConnection) -> None:
+    """Crée ou met à niveau `ikoma_migrations`, sauf si elle est déjà à `TRACKING_TABLE_VERSION`.
+
+    La version est portée par le commentaire de la table : le cas courant ne coûte
+    qu'une requête au lieu de la série de DDL ci-dessous.
+    """
+
     with conn.cursor() as cur:
+        cur.execute("SELECT obj_description(to_regclass('ikoma_migrations'), 'pg_class')")
+        if cur.fetchone()[0] == TRACKING_TABLE_COMMENT:
+            return
+
+        # Verrou global le temps de la transaction : deux Runners ne font jamais ce DDL en même temps.
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_advisory_key("ikoma_migrations:schema"),))
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS ikoma_migrations (
@@ -94,7 +114,7 @@ def _ensure_tracking_table(conn: PgConnection) -> None:
             """
             SELECT column_name
             FROM information_schema.columns
-            WHERE table_name = 'ikoma_migrations'
+            WHERE table_name = 'ikoma_migrations' AND table_schema = current_schema()
             """
         )
         columns = {row[0] for row in cur.fetchall()}
@@ -120,6 +140,7 @@ def _ensure_tracking_table(conn: PgConnection) -> None:
                     SELECT 1
                     FROM information_schema.table_constraints tc
                     WHERE tc.table_name = 'ikoma_migrations'
+                      AND tc.table_schema = current_schema()
                       AND tc.constraint_name = 'ikoma_migrations_app_id_filename_key'
                 ) THEN
                     ALTER TABLE ikoma_migrations
@@ -129,29 +150,48 @@ def _ensure_tracking_table(conn: PgConnection) -> None:
             $$;
             """
         )
+        cur.execute(f"COMMENT ON TABLE ikoma_migrations IS '{TRACKING_TABLE_COMMENT}'")
 
         conn.commit()
 
 
-def _get_existing_checksum(conn: PgConnection, app_id: str, filename: str) -> tuple[bool, str | None]:
+def _advisory_key(name: str) -> int:
+    """Clé bigint stable pour `pg_advisory_lock` dérivée d'un nom."""
+
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+@contextmanager
+def _app_lock(conn: PgConnection, app_id: str, logger) -> Iterator[None]:
+    """Verrou de session par `app_id` : un seul Runner migre une app donnée à la fois."""
+
+    key = _advisory_key(f"ikoma_migrations:{app_id}")
     with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT checksum
-            FROM ikoma_migrations
-            WHERE app_id=%s AND filename=%s
-            LIMIT 1
-            """,
-            (app_id, filename),
-        )
-        row = cur.fetchone()
-        if not row:
-            return False, None
-        return True, row[0]
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+        if not cur.fetchone()[0]:
+            logger.info("Migration de %s déjà en cours ailleurs, attente du verrou", app_id)
+            cur.execute("SELECT pg_advisory_lock(%s)", (key,))
+    conn.commit()
+    try:
+        yield
+    finally:
+        if not conn.closed:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (key,))
+            conn.commit()
+
+
+def _load_applied_checksums(conn: PgConnection, app_id: str) -> Dict[str, str]:
+    """Toutes les migrations déjà appliquées pour l'app, en un seul aller-retour."""
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT filename, checksum FROM ikoma_migrations WHERE app_id=%s", (app_id,))
+        return {filename: checksum for filename, checksum in cur.fetchall()}
 
 
-def _apply_file(conn: PgConnection, app_id: str, path: Path, checksum: str) -> None:
-    sql_content = path.read_text(encoding="utf-8")
+def _apply_file(conn: PgConnection, app_id: str, migration: FileChecksum, *, commit: bool = True) -> None:
+    sql_content = migration.read_bytes().decode("utf-8")
     with conn.cursor() as cur:
         try:
             cur.execute(sql_content)
@@ -160,21 +200,86 @@ def _apply_file(conn: PgConnection, app_id: str, path: Path, checksum: str) -> N
                 INSERT INTO ikoma_migrations(app_id, filename, checksum)
                 VALUES(%s, %s, %s)
                 """,
-                (app_id, path.name, checksum),
+                (app_id, migration.name, migration.sha256),
             )
-            conn.commit()
+            if commit:
+                conn.commit()
         except Exception:
             conn.rollback()
             raise
 
 
-def supabase_apply_migrations(
+@dataclass
+class MigrationPlan:
+    """Migrations en attente pour une app, sans rien appliquer."""
+
+    app_id: str
+    files: list[str]
+    pending: list[str]
+    mismatched: list[str]  # déjà appliquées avec un autre checksum
+    source: str  # "cache" (aucun accès Postgres) ou "postgres"
+
+    @property
+    def up_to_date(self) -> bool:
+        return not self.pending and not self.mismatched
+
+
+def plan_migrations(
     app_id: str, repo_path: str | Path, migrations_dir: str = "supabase/migrations"
+) -> MigrationPlan:
+    """Calcule les migrations à appliquer.
+
+    Si tous les fichiers ont le checksum mémorisé au dernier run réussi, le plan
+    est vide et Postgres n'est pas contacté. Sinon la table `ikoma_migrations` est
+    lue (sans verrou ni écriture) pour obtenir l'état réel.
+    """
+
+    migrations_path = Path(repo_path) / migrations_dir
+    if not migrations_path.is_dir():
+        raise FileNotFoundError(f"Dossier de migrations introuvable: {migrations_path}")
+
+    files = ChecksumCache(DB_PATH).checksums(migrations_path, "*.sql")
+    names = [migration.name for migration in files]
+    snapshot = DeploymentState(DB_PATH).get_migration_snapshot(app_id, str(migrations_path.resolve()))
+    if snapshot is not None and all(snapshot.get(m.name) == m.sha256 for m in files):
+        return MigrationPlan(app_id=app_id, files=names, pending=[], mismatched=[], source="cache")
+
+    conn = supabase_connect()
+    try:
+        schema = (os.environ.get("SUPABASE_DB_SCHEMA") or "public").strip() or "public"
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+            cur.execute("SELECT to_regclass('ikoma_migrations')")
+            tracked = cur.fetchone()[0] is not None
+        existing = _load_applied_checksums(conn, app_id) if tracked else {}
+    finally:
+        conn.close()
+
+    pending = [m.name for m in files if m.name not in existing]
+    mismatched = [m.name for m in files if existing.get(m.name) and existing[m.name] != m.sha256]
+    return MigrationPlan(app_id=app_id, files=names, pending=pending, mismatched=mismatched, source="postgres")
+
+
+def single_transaction_default() -> bool:
+    return os.getenv("IKOMA_MIGRATIONS_SINGLE_TX", "0").strip().lower() in ("1", "true", "yes")
+
+
+def supabase_apply_migrations(
+    app_id: str,
+    repo_path: str | Path,
+    migrations_dir: str = "supabase/migrations",
+    *,
+    single_transaction: bool | None = None,
 ) -> list[str]:
     """Applique les migrations SQL Supabase d'un repo sur une instance Postgres.
 
     Les fichiers .sql sont appliqués dans l'ordre lexicographique et marqués dans
     la table ikoma_migrations pour éviter toute ré-application.
+
+    Les checksums sont tous vérifiés avant d'appliquer quoi que ce soit. Avec
+    `single_transaction` (défaut : `IKOMA_MIGRATIONS_SINGLE_TX`), toutes les
+    migrations en attente sont appliquées dans une seule transaction : un échec
+    n'en laisse aucune appliquée. Sinon chaque fichier est validé séparément.
     """
 
     logger = build_logger(app_id, LOGS_DIR, log_filename="supabase.log")
@@ -203,32 +308,61 @@ def supabase_apply_migrations(
         schema = (os.environ.get("SUPABASE_DB_SCHEMA") or "public").strip() or "public"
         with conn.cursor() as cur:
             cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+        # Validé tout de suite : un rollback de migration ne doit pas annuler le search_path.
+        conn.commit()
         logger.info("search_path fixé à %s", schema)
 
-        _ensure_tracking_table(conn)
-
-        for sql_file in sorted(p for p in migrations_path.glob("*.sql") if p.is_file()):
-            checksum = hashlib.sha256(sql_file.read_bytes()).hexdigest()
-            exists, existing_checksum = _get_existing_checksum(conn, app_id, sql_file.name)
-            if exists:
-                if existing_checksum and existing_checksum != checksum:
-                    error_message = (
-                        "Migration déjà appliquée avec un checksum différent: %s"
-                        % sql_file.name
-                    )
-                    raise ValueError(error_message)
-                logger.info("Migration déjà appliquée, skip: %s", sql_file.name)
-                continue
-
-            logger.info("Application de %s", sql_file.name)
-            _apply_file(conn, app_id, sql_file, checksum)
-            applied.append(sql_file.name)
+        if single_transaction is None:
+            single_transaction = single_transaction_default()
+
+        with _app_lock(conn, app_id, logger):
+            _ensure_tracking_table(conn)
+            existing = _load_applied_checksums(conn, app_id)
+
+            pending: list[FileChecksum] = []
+            skipped = 0
+            # Chaque fichier est lu au plus une fois : checksum en cache ou contenu gardé pour l'application.
+            for migration in ChecksumCache(DB_PATH).checksums(migrations_path, "*.sql"):
+                if migration.name in existing:
+                    existing_checksum = existing[migration.name]
+                    if existing_checksum and existing_checksum != migration.sha256:
+                        error_message = (
+                            "Migration déjà appliquée avec un checksum différent: %s"
+                            % migration.name
+                        )
+                        raise ValueError(error_message)
+                    skipped += 1
+                    continue
+                pending.append(migration)
+
+            if skipped:
+                logger.info("%s migration(s) déjà appliquée(s), skip", skipped)
+            if single_transaction and pending:
+                logger.info("Mode transaction unique: %s migration(s) en attente", len(pending))
+
+            for migration in pending:
+                logger.info("Application de %s", migration.name)
+                start = time.perf_counter()
+                _apply_file(conn, app_id, migration, commit=not single_transaction)
+                MIGRATION_SECONDS.observe(time.perf_counter() - start)
+                migration.content = None  # libère les gros fichiers de seed au fil de l'eau
+                if not single_transaction:
+                    applied.append(migration.name)
+
+            if single_transaction:
+                conn.commit()
+                applied.extend(migration.name for migration in pending)
+
+        existing.update((migration.name, migration.sha256) for migration in pending)
+        db_state.record_migration_snapshot(app_id, str(migrations_path.resolve()), existing)
 
         message = f"{len(applied)} migration(s) appliquée(s)"
         db_state.record_supabase_result(app_id, "COMPLETED", message, applied)
+        MIGRATION_RUNS.labels("COMPLETED").inc()
         logger.info("=== Migration Supabase terminée (%s) ===", message)
         return applied
     except Exception as exc:  # noqa: BLE001 - capture volontaire
+        MIGRATION_RUNS.labels("FAILED").inc()
         message = f"supabase_apply_migrations échoué: {exc}"
         logger.exception(message)
         try:
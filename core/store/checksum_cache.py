@@ -0,0 +1,90 @@
+"""Cache persistant des SHA-256 de fichiers, indexé par leur signature `stat`.
+
+Un fichier dont `(taille, mtime_ns, inode)` n'a pas bougé depuis le dernier
+calcul n'est ni relu ni re-haché. Les fichiers recalculés gardent leur contenu
+en mémoire pour que l'appelant n'ait pas à les relire (un seul `read` par run).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from core.store.db import get_database
+
+
+@dataclass
+class FileChecksum:
+    path: Path
+    sha256: str
+    content: Optional[bytes] = None  # renseigné seulement si le fichier vient d'être lu
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def read_bytes(self) -> bytes:
+        if self.content is None:
+            self.content = self.path.read_bytes()
+        return self.content
+
+
+class ChecksumCache:
+    """Accès SQLite à la table `file_checksums`."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db = get_database(db_path)
+
+    def checksums(self, directory: Path, pattern: str = "*") -> List[FileChecksum]:
+        """Checksums des fichiers de `directory` correspondant à `pattern`, triés par nom.
+
+        Une requête pour lire le cache du dossier, une transaction pour enregistrer
+        les entrées recalculées et oublier les fichiers disparus.
+        """
+
+        directory = directory.resolve()
+        cached: Dict[str, Tuple[int, int, int, str]] = {
+            row["path"]: (row["size"], row["mtime_ns"], row["inode"], row["sha256"])
+            for row in self.db.execute(
+                "SELECT path, size, mtime_ns, inode, sha256 FROM file_checksums WHERE directory = ?",
+                (str(directory),),
+            )
+        }
+
+        results: List[FileChecksum] = []
+        updates = []
+        for path in sorted(p for p in directory.glob(pattern) if p.is_file()):
+            stat = path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            entry = cached.get(str(path))
+            if entry is not None and entry[:3] == signature:
+                results.append(FileChecksum(path=path, sha256=entry[3]))
+                continue
+
+            content = path.read_bytes()
+            sha256 = hashlib.sha256(content).hexdigest()
+            results.append(FileChecksum(path=path, sha256=sha256, content=content))
+            # Signature relue après coup : un fichier modifié pendant la lecture n'est pas mis en cache.
+            after = os.stat(path)
+            if (after.st_size, after.st_mtime_ns, after.st_ino) == signature:
+                updates.append((str(path), str(directory), *signature, sha256))
+
+        removed = [(path,) for path in cached.keys() - {str(item.path) for item in results}]
+        if updates or removed:
+            with self.db.transaction() as conn:
+                conn.executemany("DELETE FROM file_checksums WHERE path = ?", removed)
+                conn.executemany(
+                    """
+                    INSERT INTO file_checksums(path, directory, size, mtime_ns, inode, sha256)
+                    VALUES(?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET
+                        size=excluded.size,
+                        mtime_ns=excluded.mtime_ns,
+                        inode=excluded.inode,
+                        sha256=excluded.sha256
+                    """,
+                    updates,
+                )
+        return results
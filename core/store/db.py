@@ -0,0 +1,431 @@
+"""Couche d'accès SQLite partagée par les stores du cœur et le Runner.
+
+Une seule instance `Database` par fichier (voir `get_database`) et une connexion
+par thread, réutilisée d'un appel à l'autre :
+- le mode WAL laisse les lectures avancer pendant qu'un worker écrit ;
+- `busy_timeout` fait attendre un écrivain concurrent au lieu de lever
+  "database is locked" ;
+- les requêtes SQL constantes profitent du cache de requêtes préparées de
+  `sqlite3`, qui n'a d'effet que si la connexion survit à l'appel.
+
+Le schéma est versionné dans la table `schema_version` et les `MIGRATIONS`
+manquantes sont appliquées une seule fois, à la première connexion.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+BUSY_TIMEOUT_MS = int(os.getenv("IKOMA_SQLITE_BUSY_TIMEOUT_MS", "30000"))
+STATEMENT_CACHE_SIZE = 256
+
+# (version, description, instructions). Toujours ajouter en fin de liste, ne jamais
+# modifier une migration publiée. La v1 reprend les tables historiques en
+# `IF NOT EXISTS` pour adopter sans heurt les bases créées avant le versionnage.
+MIGRATIONS: List[Tuple[int, str, Sequence[str]]] = [
+    (
+        1,
+        "schéma initial",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS deployments (
+                app_id TEXT PRIMARY KEY,
+                ref TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS supabase_runs (
+                app_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message TEXT,
+                migrations TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS app_configs (
+                app_id TEXT PRIMARY KEY,
+                repo_git_url TEXT NOT NULL,
+                branch TEXT NOT NULL,
+                path_deploiement TEXT NOT NULL,
+                migrations_dir TEXT,
+                type_app TEXT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                app_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                message TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_app ON jobs(app_id, id)",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(dedup_key, status)",
+            """
+            CREATE TABLE IF NOT EXISTS command_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                app_id TEXT,
+                command TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                duration_ms INTEGER NOT NULL,
+                returncode INTEGER NOT NULL,
+                timed_out INTEGER NOT NULL,
+                output_bytes INTEGER NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_command_runs_app ON command_runs(app_id, started_at)",
+            # Historique append-only ; `deployments` reste la vue "dernier état" par app.
+            """
+            CREATE TABLE IF NOT EXISTS deployment_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                app_id TEXT NOT NULL,
+                ref TEXT NOT NULL,
+                commit_sha TEXT,
+                status TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                duration_ms INTEGER,
+                stages TEXT NOT NULL DEFAULT '{}',
+                exit_reason TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_runs_app_started ON deployment_runs(app_id, started_at)",
+            "CREATE INDEX IF NOT EXISTS idx_runs_status ON deployment_runs(status, app_id)",
+        ),
+    ),
+    (
+        2,
+        "cache de checksums des migrations",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS file_checksums (
+                path TEXT PRIMARY KEY,
+                directory TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_file_checksums_dir ON file_checksums(directory)",
+            # Migrations connues comme appliquées à l'issue du dernier run réussi.
+            """
+            CREATE TABLE IF NOT EXISTS migration_snapshots (
+                app_id TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                checksums TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (app_id, directory)
+            )
+            """,
+        ),
+    ),
+    (3, "empreinte des releases", ("ALTER TABLE deployment_runs ADD COLUMN fingerprint TEXT",)),
+    (
+        4,
+        "digests des images tirées",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS image_digests (
+                image TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            )
+            """,
+            # `{service: image@digest}` déployé par chaque run, cible d'un rollback épinglé.
+            "ALTER TABLE deployment_runs ADD COLUMN images TEXT",
+        ),
+    ),
+    (
+        5,
+        "sonde des capacités Docker",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS environment_probes (
+                name TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                probed_at REAL NOT NULL
+            )
+            """,
+        ),
+    ),
+    (
+        6,
+        "slots blue/green actifs",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS release_slots (
+                app_id TEXT PRIMARY KEY,
+                color TEXT NOT NULL,
+                project TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                switched_at TEXT NOT NULL,
+                switch_ms INTEGER
+            )
+            """,
+        ),
+    ),
+    (
+        7,
+        "lien run / job",
+        (
+            "ALTER TABLE deployment_runs ADD COLUMN job_id INTEGER",
+            "CREATE INDEX IF NOT EXISTS idx_runs_job ON deployment_runs(job_id)",
+        ),
+    ),
+    (
+        8,
+        "compteur de changements de la liste des apps",
+        (
+            # Incrémenté par trigger à chaque écriture, y compris depuis un autre processus
+            # (CLI, workers) : sert de clé d'invalidation aux caches du Runner.
+            "CREATE TABLE IF NOT EXISTS change_counters (name TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+            "INSERT OR IGNORE INTO change_counters(name, version) VALUES('apps', 0)",
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_app_configs_insert_version AFTER INSERT ON app_configs
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_app_configs_update_version AFTER UPDATE ON app_configs
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_app_configs_delete_version AFTER DELETE ON app_configs
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_deployments_insert_version AFTER INSERT ON deployments
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_deployments_update_version AFTER UPDATE ON deployments
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_deployments_delete_version AFTER DELETE ON deployments
+            BEGIN UPDATE change_counters SET version = version + 1 WHERE name = 'apps'; END
+            """,
+        ),
+    ),
+    (
+        9,
+        "empreinte de configuration par service",
+        (
+            # `{service: sha256}` de la config compose résolue (et du digest d'image) de chaque run :
+            # le run suivant ne relance que les services dont l'empreinte change.
+            "ALTER TABLE deployment_runs ADD COLUMN service_hashes TEXT",
+        ),
+    ),
+    (
+        10,
+        "jobs différés et fusionnés (webhooks)",
+        (
+            # `not_before` (epoch) : un job n'est réclamé qu'après cette échéance.
+            # `coalesce_key` : les demandes de même clé fusionnent tant que le job est en file.
+            "ALTER TABLE jobs ADD COLUMN not_before REAL",
+            "ALTER TABLE jobs ADD COLUMN coalesce_key TEXT",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_coalesce ON jobs(coalesce_key, status)",
+        ),
+    ),
+    (
+        11,
+        "surveillance des branches par ls-remote",
+        (
+            # Dernier SHA vu et prochaine échéance par app : un scan ne lit que les lignes échues.
+            """
+            CREATE TABLE IF NOT EXISTS ref_watch (
+                app_id TEXT PRIMARY KEY,
+                remote_url TEXT NOT NULL,
+                branch TEXT NOT NULL,
+                last_sha TEXT,
+                interval REAL NOT NULL,
+                next_check REAL NOT NULL,
+                checked_at REAL,
+                changed_at REAL,
+                failures INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_ref_watch_due ON ref_watch(next_check)",
+            "CREATE INDEX IF NOT EXISTS idx_ref_watch_remote ON ref_watch(remote_url)",
+        ),
+    ),
+    (
+        12,
+        "bail des jobs en cours",
+        (
+            # `owner` = hôte:pid:pool qui exécute le job ; `lease_expires` (epoch) est prolongé
+            # par son heartbeat. Seul un job au bail expiré est remis en file par un autre processus.
+            "ALTER TABLE jobs ADD COLUMN owner TEXT",
+            "ALTER TABLE jobs ADD COLUMN lease_expires REAL",
+        ),
+    ),
+    (
+        13,
+        "purge de command_runs par âge",
+        ("CREATE INDEX IF NOT EXISTS idx_command_runs_started ON command_runs(started_at)",),
+    ),
+]
+
+
+class Database:
+    """Connexions SQLite par thread vers un fichier, schéma migré à la première utilisation."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._migrate_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._version: Optional[int] = None
+
+    # --- Connexions ---
+    def connection(self) -> sqlite3.Connection:
+        """Connexion du thread courant, ouverte (et le schéma migré) au premier appel."""
+
+        conn = self._thread_connection()
+        if self._version is None:
+            self.migrate()
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None : autocommit, les transactions sont explicites (`transaction`).
+        # check_same_thread=False uniquement pour que `close()` puisse fermer toutes les
+        # connexions ; chacune n'est utilisée que par le thread qui l'a ouverte.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL suffit en WAL : une coupure peut perdre la dernière transaction, jamais corrompre la base.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Ferme toutes les connexions ouvertes (arrêt du Runner, tests)."""
+
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    # --- Schéma ---
+    def migrate(self) -> int:
+        """Applique les migrations manquantes (une fois par processus) ; renvoie la version du schéma."""
+
+        with self._migrate_lock:
+            if self._version is not None:
+                return self._version
+            conn = self._thread_connection()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TEXT NOT NULL
+                )
+                """
+            )
+            # BEGIN IMMEDIATE : deux processus (Runner + CLI) ne migrent jamais en même temps.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+                for version, description, statements in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(
+                        """
+                        INSERT INTO schema_version(version, description, applied_at)
+                        VALUES(?, ?, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+                        """,
+                        (version, description),
+                    )
+                    current = version
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._version = current
+            return current
+
+    # --- Requêtes ---
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> sqlite3.Cursor:
+        return self.connection().executemany(sql, rows)
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchone()
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        """Transaction explicite ; `immediate` prend le verrou d'écriture dès le BEGIN.
+
+        Un appel imbriqué rejoint la transaction en cours.
+        """
+
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+
+_DATABASES: Dict[Path, Database] = {}
+_DATABASES_LOCK = threading.Lock()
+
+
+def get_database(db_path: Path) -> Database:
+    """Renvoie l'instance partagée pour `db_path` (une par fichier et par processus)."""
+
+    key = Path(db_path).expanduser().resolve()
+    with _DATABASES_LOCK:
+        database = _DATABASES.get(key)
+        if database is None:
+            database = Database(key)
+            _DATABASES[key] = database
+        return database
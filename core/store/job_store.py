@@ -0,0 +1,318 @@
+"""File d'attente persistante des jobs Runner (deploy, sync, migrate).
+
+Les jobs sont stockés dans SQLite pour survivre à un redémarrage du Runner.
+Deux garanties sont assurées au niveau de la base :
+- un job identique (même type, même app, même payload) n'est jamais mis deux fois
+  en attente : la seconde demande renvoie le job déjà en file ;
+- un job n'est réclamé que si aucun autre job de la même `app_id` n'est en cours,
+  ce qui sérialise les opérations par application.
+
+Plusieurs processus (Runner, API, CLI) peuvent partager la file. Un job
+réclamé porte son propriétaire (`hôte:pid:instance[:pool]`) et un bail que le
+pool prolonge tant qu'il tourne (`renew_leases`). `requeue_interrupted` ne remet
+en file que les jobs dont le bail a expiré, ou dont le processus propriétaire
+est mort sur cette machine. Il ne touche jamais un job en cours ailleurs.
+L'identifiant d'instance, tiré au démarrage du processus, distingue un Runner
+redémarré qui a hérité du même pid (PID 1 d'un conteneur) de celui qui l'a
+précédé : les jobs de ce dernier sont repris sans attendre la fin de leur bail.
+
+Les déclenchements en rafale (webhooks Git) passent par `enqueue_coalesced` :
+un job différé (`not_before`) absorbe les demandes suivantes de même
+`coalesce_key` tant qu'il est en file, avec le payload le plus récent.
+"""
+from __future__ import annotations
+
+import calendar
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.store.db import get_database
+
+JOB_QUEUED = "QUEUED"
+JOB_RUNNING = "RUNNING"
+JOB_SUCCEEDED = "SUCCEEDED"
+JOB_FAILED = "FAILED"
+DEFAULT_LEASE = 60.0  # secondes ; prolongé par le heartbeat du pool
+
+_INSTANCE_ID = uuid.uuid4().hex[:12]  # propre à ce processus, change à chaque démarrage
+_JOB_COLUMNS = "id, kind, app_id, payload, status, created_at, started_at, finished_at, message, not_before"
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    app_id: str
+    payload: Dict[str, Any]
+    status: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    message: Optional[str] = None
+    not_before: Optional[float] = None  # epoch avant lequel le job n'est pas réclamé
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "app_id": self.app_id,
+            "payload": self.payload,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "message": self.message,
+            "not_before": self.not_before,
+        }
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _epoch(timestamp: str) -> float:
+    return float(calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ")))
+
+
+def process_owner(pool_id: str = "") -> str:
+    """Identifiant `hôte:pid:instance[:pool]` enregistré avec les jobs réclamés par ce processus."""
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{_INSTANCE_ID}"
+    return f"{owner}:{pool_id}" if pool_id else owner
+
+
+def _owner_dead(owner: str | None) -> bool:
+    """Vrai si `owner` est un processus de cette machine qui n'existe plus.
+
+    Un propriétaire de même pid que ce processus mais d'une autre instance est
+    une exécution précédente (pid réutilisé après un redémarrage) : il est mort.
+    """
+
+    host, _, rest = (owner or "").partition(":")
+    pid, _, rest = rest.partition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return rest.partition(":")[0] != _INSTANCE_ID
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def _dedup_key(kind: str, app_id: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps([kind, app_id, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    data = dict(row)
+    data["payload"] = json.loads(data["payload"] or "{}")
+    return Job(**data)
+
+
+class JobStore:
+    """Accès SQLite à la table `jobs`."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self.db = get_database(self.db_path)
+
+    def ensure_schema(self) -> None:
+        self.db.migrate()
+
+    def enqueue(self, kind: str, app_id: str, payload: Dict[str, Any]) -> Tuple[Job, bool]:
+        """Ajoute un job en file, ou renvoie le job identique déjà en attente.
+
+        Returns:
+            Le job et un booléen indiquant s'il vient d'être créé.
+        """
+
+        key = _dedup_key(kind, app_id, payload)
+        # BEGIN IMMEDIATE : dédoublonnage et insertion atomiques face aux autres writers.
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE dedup_key = ? AND status = ? ORDER BY id LIMIT 1",
+                (key, JOB_QUEUED),
+            ).fetchone()
+            if row:
+                return _row_to_job(row), False
+
+            cursor = conn.execute(
+                """
+                INSERT INTO jobs(kind, app_id, payload, dedup_key, status, created_at)
+                VALUES(?, ?, ?, ?, ?, ?)
+                """,
+                (kind, app_id, json.dumps(payload, ensure_ascii=False), key, JOB_QUEUED, _now()),
+            )
+            row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+            return _row_to_job(row), True
+
+    def enqueue_coalesced(
+        self,
+        kind: str,
+        app_id: str,
+        payload: Dict[str, Any],
+        *,
+        coalesce_key: str,
+        delay: float = 0.0,
+        max_delay: float | None = None,
+    ) -> Tuple[Job, bool]:
+        """Met en file un job différé de `delay` secondes, fusionné avec le job en attente de même clé.
+
+        Tant que le job de `coalesce_key` n'est pas réclamé, chaque nouvel appel remplace
+        son payload et repousse son échéance de `delay` (anti-rebond) : une rafale ne
+        produit qu'un job, exécuté avec le dernier payload. `max_delay` borne l'attente
+        depuis la création du job pour qu'un flux continu finisse par être servi.
+
+        Returns:
+            Le job et un booléen indiquant s'il vient d'être créé (False : fusionné).
+        """
+
+        now = time.time()
+        key = _dedup_key(kind, app_id, payload)
+        raw_payload = json.dumps(payload, ensure_ascii=False)
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, created_at FROM jobs WHERE coalesce_key = ? AND status = ? ORDER BY id LIMIT 1",
+                (coalesce_key, JOB_QUEUED),
+            ).fetchone()
+            if row:
+                not_before = now + delay
+                if max_delay is not None:
+                    not_before = min(not_before, max(now, _epoch(row["created_at"]) + max_delay))
+                conn.execute(
+                    "UPDATE jobs SET payload = ?, dedup_key = ?, not_before = ? WHERE id = ?",
+                    (raw_payload, key, not_before, row["id"]),
+                )
+                job_id, created = row["id"], False
+            else:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO jobs(kind, app_id, payload, dedup_key, status, created_at, not_before, coalesce_key)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (kind, app_id, raw_payload, key, JOB_QUEUED, _now(), now + delay, coalesce_key),
+                )
+                job_id, created = cursor.lastrowid, True
+            row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return _row_to_job(row), created
+
+    def claim_next(self, owner: str | None = None, lease: float = DEFAULT_LEASE) -> Optional[Job]:
+        """Passe en RUNNING le plus ancien job échu dont l'application est libre.
+
+        `owner` identifie le pool qui l'exécute (défaut : `process_owner()`) et
+        `lease` la durée du bail avant qu'un autre processus puisse le reprendre.
+        """
+
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                f"""
+                SELECT {_JOB_COLUMNS} FROM jobs
+                WHERE status = ?
+                  AND (not_before IS NULL OR not_before <= ?)
+                  AND app_id NOT IN (SELECT app_id FROM jobs WHERE status = ?)
+                ORDER BY id
+                LIMIT 1
+                """,
+                (JOB_QUEUED, now, JOB_RUNNING),
+            ).fetchone()
+            if not row:
+                return None
+
+            started_at = _now()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, lease_expires = ? WHERE id = ?",
+                (JOB_RUNNING, started_at, owner or process_owner(), now + lease, row["id"]),
+            )
+        job = _row_to_job(row)
+        job.status = JOB_RUNNING
+        job.started_at = started_at
+        return job
+
+    def finish(self, job_id: int, status: str, message: str | None = None) -> None:
+        self.db.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, message = ?, lease_expires = NULL WHERE id = ?",
+            (status, _now(), message, job_id),
+        )
+
+    def renew_leases(self, owner: str, lease: float = DEFAULT_LEASE) -> int:
+        """Prolonge le bail des jobs RUNNING de `owner` (heartbeat du pool)."""
+
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE status = ? AND owner = ?",
+            (time.time() + lease, JOB_RUNNING, owner),
+        )
+        return cursor.rowcount
+
+    def requeue_interrupted(self, now: float | None = None) -> int:
+        """Remet en file les jobs RUNNING abandonnés : bail expiré ou propriétaire mort sur cette machine.
+
+        Un job en cours dans un autre processus vivant (Runner et API sur la même
+        base) garde son bail et n'est jamais repris.
+        """
+
+        now = time.time() if now is None else now
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, owner, lease_expires FROM jobs WHERE status = ?", (JOB_RUNNING,)
+            ).fetchall()
+            stale = [
+                row["id"]
+                for row in rows
+                if row["lease_expires"] is None or row["lease_expires"] < now or _owner_dead(row["owner"])
+            ]
+            conn.executemany(
+                """
+                UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_expires = NULL, message = ?
+                WHERE id = ? AND status = ?
+                """,
+                [(JOB_QUEUED, "Relancé après interruption de son worker", job_id, JOB_RUNNING) for job_id in stale],
+            )
+        return len(stale)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        row = self.db.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(
+        self,
+        app_id: str | None = None,
+        limit: int = 20,
+        *,
+        before_id: int | None = None,
+        kinds: Sequence[str] | None = None,
+    ) -> List[Job]:
+        """Jobs les plus récents d'abord ; `before_id` sert de curseur de pagination."""
+
+        clauses, params = [], []
+        if app_id is not None:
+            clauses.append("app_id = ?")
+            params.append(app_id)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if kinds:
+            clauses.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+            params.extend(kinds)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.db.execute(
+            f"SELECT {_JOB_COLUMNS} FROM jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
@@ -4,6 +4,16 @@ import json
 import sqlite3
 import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.store.db import get_database
+
+RUN_INTERRUPTED = "INTERRUPTED"
+ORPHAN_RUN_MAX_AGE = 24 * 3600.0  # secondes ; runs RUNNING sans job (CLI, pipeline)
+
+RUN_COLUMNS = (
+    "run_id, app_id, ref, commit_sha, status, started_at, finished_at, duration_ms, stages, exit_reason, fingerprint, images, job_id, service_hashes"
+)
 
 
 class DeploymentState:
@@ -11,64 +21,336 @@ class DeploymentState:
 
     def __init__(self, db_path: Path) -> None:
         self.db_path = db_path
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = get_database(db_path)
 
     def ensure_schema(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS deployments (
-                    app_id TEXT PRIMARY KEY,
-                    ref TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    message TEXT
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS supabase_runs (
-                    app_id TEXT PRIMARY KEY,
-                    status TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    message TEXT,
-                    migrations TEXT NOT NULL
-                )
-                """
-            )
+        """Migre le schéma si ce n'est pas déjà fait dans ce processus (voir `core.store.db`)."""
+
+        self.db.migrate()
 
     def upsert_status(self, app_id: str, ref: str, status: str, message: str) -> None:
         timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO deployments(app_id, ref, status, updated_at, message)
-                VALUES(?, ?, ?, ?, ?)
-                ON CONFLICT(app_id) DO UPDATE SET
-                    ref=excluded.ref,
-                    status=excluded.status,
-                    updated_at=excluded.updated_at,
-                    message=excluded.message
-                """,
-                (app_id, ref, status, timestamp, message),
-            )
+        self.db.execute(
+            """
+            INSERT INTO deployments(app_id, ref, status, updated_at, message)
+            VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT(app_id) DO UPDATE SET
+                ref=excluded.ref,
+                status=excluded.status,
+                updated_at=excluded.updated_at,
+                message=excluded.message
+            """,
+            (app_id, ref, status, timestamp, message),
+        )
 
     def record_supabase_result(
         self, app_id: str, status: str, message: str, migrations: list[str]
     ) -> None:
         timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         payload = json.dumps(migrations, ensure_ascii=False)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO supabase_runs(app_id, status, updated_at, message, migrations)
-                VALUES(?, ?, ?, ?, ?)
-                ON CONFLICT(app_id) DO UPDATE SET
-                    status=excluded.status,
-                    updated_at=excluded.updated_at,
-                    message=excluded.message,
-                    migrations=excluded.migrations
-                """,
-                (app_id, status, timestamp, message, payload),
-            )
+        self.db.execute(
+            """
+            INSERT INTO supabase_runs(app_id, status, updated_at, message, migrations)
+            VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT(app_id) DO UPDATE SET
+                status=excluded.status,
+                updated_at=excluded.updated_at,
+                message=excluded.message,
+                migrations=excluded.migrations
+            """,
+            (app_id, status, timestamp, message, payload),
+        )
+
+    def record_command(
+        self,
+        app_id: str | None,
+        command: str,
+        started_at: str,
+        duration: float,
+        returncode: int,
+        timed_out: bool,
+        output_bytes: int,
+    ) -> None:
+        self.db.execute(
+            """
+            INSERT INTO command_runs(app_id, command, started_at, duration_ms, returncode, timed_out, output_bytes)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+            """,
+            (app_id, command, started_at, int(duration * 1000), returncode, int(timed_out), output_bytes),
+        )
+
+    def record_migration_snapshot(self, app_id: str, directory: str, checksums: Dict[str, str]) -> None:
+        """Mémorise `{fichier: sha256}` des migrations appliquées après un run réussi."""
+
+        self.db.execute(
+            """
+            INSERT INTO migration_snapshots(app_id, directory, checksums, updated_at)
+            VALUES(?, ?, ?, ?)
+            ON CONFLICT(app_id, directory) DO UPDATE SET
+                checksums=excluded.checksums,
+                updated_at=excluded.updated_at
+            """,
+            (app_id, directory, json.dumps(checksums, sort_keys=True), iso_ms(time.time())),
+        )
+
+    def get_migration_snapshot(self, app_id: str, directory: str) -> Optional[Dict[str, str]]:
+        row = self.db.execute(
+            "SELECT checksums FROM migration_snapshots WHERE app_id = ? AND directory = ?", (app_id, directory)
+        ).fetchone()
+        return json.loads(row["checksums"]) if row else None
+
+    def get_image_digests(self, images: List[str]) -> Dict[str, Tuple[str, float]]:
+        """`{image: (digest, checked_at)}` des images déjà tirées parmi `images`."""
+
+        if not images:
+            return {}
+        placeholders = ", ".join("?" for _ in images)
+        rows = self.db.execute(
+            f"SELECT image, digest, checked_at FROM image_digests WHERE image IN ({placeholders})", tuple(images)
+        ).fetchall()
+        return {row["image"]: (row["digest"], row["checked_at"]) for row in rows}
+
+    def record_image_digest(self, image: str, digest: str) -> None:
+        self.db.execute(
+            """
+            INSERT INTO image_digests(image, digest, checked_at) VALUES(?, ?, ?)
+            ON CONFLICT(image) DO UPDATE SET digest=excluded.digest, checked_at=excluded.checked_at
+            """,
+            (image, digest, time.time()),
+        )
+
+    def get_environment_probe(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute("SELECT payload FROM environment_probes WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def record_environment_probe(self, name: str, payload: Dict[str, Any]) -> None:
+        self.db.execute(
+            """
+            INSERT INTO environment_probes(name, payload, probed_at) VALUES(?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET payload=excluded.payload, probed_at=excluded.probed_at
+            """,
+            (name, json.dumps(payload, sort_keys=True), time.time()),
+        )
+
+    def get_active_slot(self, app_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT app_id, color, project, port, switched_at, switch_ms FROM release_slots WHERE app_id = ?",
+            (app_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def set_active_slot(self, app_id: str, color: str, project: str, port: int, switch_duration: float) -> None:
+        self.db.execute(
+            """
+            INSERT INTO release_slots(app_id, color, project, port, switched_at, switch_ms)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(app_id) DO UPDATE SET
+                color=excluded.color,
+                project=excluded.project,
+                port=excluded.port,
+                switched_at=excluded.switched_at,
+                switch_ms=excluded.switch_ms
+            """,
+            (app_id, color, project, port, iso_ms(time.time()), int(switch_duration * 1000)),
+        )
+
+    # --- Lectures du Runner ---
+    def list_deployments(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT app_id, ref, status, message, updated_at FROM deployments ORDER BY updated_at DESC"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_deployment(self, app_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT app_id, ref, status, message, updated_at FROM deployments WHERE app_id = ?", (app_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_supabase_run(self, app_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT app_id, status, message, updated_at, migrations FROM supabase_runs WHERE app_id = ?", (app_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    # --- Historique des déploiements ---
+    def start_run(self, app_id: str, ref: str, job_id: int | None = None) -> int:
+        cursor = self.db.execute(
+            "INSERT INTO deployment_runs(app_id, ref, status, started_at, job_id) VALUES(?, ?, 'RUNNING', ?, ?)",
+            (app_id, ref, iso_ms(time.time()), job_id),
+        )
+        return int(cursor.lastrowid)
+
+    def finish_run(
+        self,
+        run_id: int,
+        status: str,
+        exit_reason: str,
+        commit_sha: str | None = None,
+        stages: Dict[str, Dict[str, Any]] | None = None,
+        duration: float | None = None,
+        fingerprint: str | None = None,
+        images: Dict[str, str] | None = None,
+        service_hashes: Dict[str, str] | None = None,
+    ) -> None:
+        self.db.execute(
+            """
+            UPDATE deployment_runs
+            SET status = ?, exit_reason = ?, commit_sha = COALESCE(?, commit_sha),
+                stages = ?, finished_at = ?, duration_ms = ?, fingerprint = COALESCE(?, fingerprint),
+                images = COALESCE(?, images), service_hashes = COALESCE(?, service_hashes)
+            WHERE run_id = ?
+            """,
+            (
+                status,
+                exit_reason,
+                commit_sha,
+                json.dumps(stages or {}, ensure_ascii=False),
+                iso_ms(time.time()),
+                int(duration * 1000) if duration is not None else None,
+                fingerprint,
+                json.dumps(images, sort_keys=True) if images else None,
+                json.dumps(service_hashes, sort_keys=True) if service_hashes else None,
+                run_id,
+            ),
+        )
+
+    def interrupt_orphan_runs(self, max_age: float = ORPHAN_RUN_MAX_AGE) -> int:
+        """Clôt en INTERRUPTED les runs RUNNING qu'aucun processus ne terminera.
+
+        Un run lié à un job est orphelin dès que ce job n'est plus RUNNING (worker
+        arrêté, job remis en file : la reprise ouvre un nouveau run). Un run sans
+        job (CLI, pipeline) l'est après `max_age` secondes. Ces runs redeviennent
+        ainsi visibles pour `compact_runs`.
+        """
+
+        now = time.time()
+        cursor = self.db.execute(
+            """
+            UPDATE deployment_runs
+            SET status = ?, finished_at = ?, exit_reason = 'Run interrompu (worker arrêté avant la fin)'
+            WHERE status = 'RUNNING'
+              AND (
+                (job_id IS NOT NULL AND job_id NOT IN (SELECT id FROM jobs WHERE status = 'RUNNING'))
+                OR (job_id IS NULL AND started_at < ?)
+              )
+            """,
+            (RUN_INTERRUPTED, iso_ms(now), iso_ms(now - max_age)),
+        )
+        return cursor.rowcount
+
+    def get_run(self, run_id: int) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(f"SELECT {RUN_COLUMNS} FROM deployment_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return _run_to_dict(row) if row else None
+
+    def run_for_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Dernier run créé par le job `job_id` (un job relancé après redémarrage en crée un nouveau)."""
+
+        row = self.db.execute(
+            f"SELECT {RUN_COLUMNS} FROM deployment_runs WHERE job_id = ? ORDER BY run_id DESC LIMIT 1", (job_id,)
+        ).fetchone()
+        return _run_to_dict(row) if row else None
+
+    def list_runs(
+        self, app_id: str | None = None, limit: int = 50, before_run_id: int | None = None
+    ) -> List[Dict[str, Any]]:
+        """Runs les plus récents d'abord ; `before_run_id` sert de curseur de pagination."""
+
+        clauses, params = [], []
+        if app_id is not None:
+            clauses.append("app_id = ?")
+            params.append(app_id)
+        if before_run_id is not None:
+            clauses.append("run_id < ?")
+            params.append(before_run_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Par app, l'ordre (started_at, run_id) suit l'index idx_runs_app_started.
+        order = "started_at DESC, run_id DESC" if app_id is not None else "run_id DESC"
+        rows = self.db.execute(
+            f"SELECT {RUN_COLUMNS} FROM deployment_runs {where} ORDER BY {order} LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [_run_to_dict(row) for row in rows]
+
+    def last_run(self, app_id: str, status: str = "HEALTHY") -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            f"""
+            SELECT {RUN_COLUMNS} FROM deployment_runs
+            WHERE app_id = ? AND status = ?
+            ORDER BY run_id DESC LIMIT 1
+            """,
+            (app_id, status),
+        ).fetchone()
+        return _run_to_dict(row) if row else None
+
+    def compact_runs(self, keep_per_app: int = 200, max_age_days: float = 90) -> int:
+        """Supprime les runs au-delà des `keep_per_app` plus récents par app ou plus vieux que `max_age_days`.
+
+        Voir `purge_runs`, dont c'est le décompte.
+        """
+
+        return sum(len(run_ids) for run_ids in self.purge_runs(keep_per_app, max_age_days).values())
+
+    def purge_runs(self, keep_per_app: int = 200, max_age_days: float = 90) -> Dict[str, List[int]]:
+        """Comme `compact_runs`, mais renvoie les `run_id` supprimés par app (fichiers d'événements à effacer).
+
+        Le dernier run HEALTHY de chaque app (cible de rollback) et les runs en cours
+        sont toujours conservés. Une transaction courte par app, appuyée sur l'index
+        `(app_id, started_at)`, évite de bloquer les écritures concurrentes.
+        """
+
+        cutoff = iso_ms(time.time() - max_age_days * 86400)
+        purged: Dict[str, List[int]] = {}
+        app_ids = [row[0] for row in self.db.execute("SELECT DISTINCT app_id FROM deployment_runs")]
+
+        for app_id in app_ids:
+            with self.db.transaction() as conn:
+                boundary = conn.execute(
+                    """
+                    SELECT run_id FROM deployment_runs WHERE app_id = ?
+                    ORDER BY started_at DESC, run_id DESC LIMIT 1 OFFSET ?
+                    """,
+                    (app_id, keep_per_app),
+                ).fetchone()
+                healthy = conn.execute(
+                    "SELECT MAX(run_id) FROM deployment_runs WHERE status = 'HEALTHY' AND app_id = ?",
+                    (app_id,),
+                ).fetchone()
+                run_ids = [
+                    row[0]
+                    for row in conn.execute(
+                        """
+                        SELECT run_id FROM deployment_runs
+                        WHERE app_id = ?
+                          AND (run_id <= ? OR started_at < ?)
+                          AND status != 'RUNNING'
+                          AND run_id != ?
+                        """,
+                        (app_id, boundary[0] if boundary else -1, cutoff, healthy[0] if healthy[0] is not None else -1),
+                    )
+                ]
+                conn.executemany("DELETE FROM deployment_runs WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+            if run_ids:
+                purged[app_id] = run_ids
+        return purged
+
+    def compact_commands(self, max_age_days: float = 90) -> int:
+        """Supprime les mesures de `command_runs` plus vieilles que `max_age_days`."""
+
+        cutoff = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - max_age_days * 86400))
+        with self.db.transaction() as conn:
+            return conn.execute("DELETE FROM command_runs WHERE started_at < ?", (cutoff,)).rowcount
+
+
+def iso_ms(timestamp: float) -> str:
+    """Horodatage ISO 8601 UTC à la milliseconde."""
+
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}Z"
+
+
+def _run_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    data["stages"] = json.loads(data["stages"] or "{}")
+    data["images"] = json.loads(data["images"] or "{}")
+    data["service_hashes"] = json.loads(data["service_hashes"] or "{}")
+    return data
@@ -1,74 +1,86 @@
 from __future__ import annotations
 
-import os
-import sqlite3
-import threading
-from contextlib import contextmanager
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote
 
-from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
+from fastapi import FastAPI, Form, Header, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from core.deploy import deploy_up
 from core.deploy.deploy_up import DB_PATH, LOGS_DIR
-from core.logging.logger import build_logger
-from core.scm.git_repo import sync_repository
-from core.services.supabase import supabase_apply_migrations
+from core.logging.metrics import CONTENT_TYPE, JOBS, JOBS_RUNNING, REGISTRY
+from core.pipelines.workers import (
+    HISTORY_JOB_APP_ID,
+    WorkerPool,
+    configured_pool_size,
+    default_handlers,
+    history_retention_payload,
+)
+from core.store.db import get_database
+from core.store.job_store import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobStore
+from core.store.sqlite_store import DeploymentState
 from runner.config_store import AppConfig, AppConfigStore
+from runner.data import VersionedCache, run_blocking, shutdown_executor
+from runner.ref_watcher import RefWatcher, ref_watch_enabled
+from runner.log_tail import DEFAULT_CHUNK_BYTES, follow, read_tail
 
-app = FastAPI(title="IKOMA Runner UI", version="0.0.1")
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
+database = get_database(DB_PATH)
 config_store = AppConfigStore(DB_PATH)
+deployment_state = DeploymentState(DB_PATH)
+job_store = JobStore(DB_PATH)
+worker_pool = WorkerPool(job_store, default_handlers(), size=configured_pool_size())
+# Scrutation `git ls-remote` des branches suivies, pour les remotes sans webhook.
+ref_watcher = RefWatcher(DB_PATH) if ref_watch_enabled() else None
+# Vue d'ensemble (et page d'accueil rendue) invalidée par le compteur `apps`,
+# incrémenté par trigger à chaque écriture de configuration ou de statut.
+overview_cache: VersionedCache[Any] = VersionedCache(config_store.list_version)
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    # Migration du schéma une seule fois, avant le premier job ou la première page.
+    database.migrate()
+    worker_pool.start()
+    # Compaction de l'historique des déploiements à chaque démarrage du Runner.
+    worker_pool.submit("compact", HISTORY_JOB_APP_ID, history_retention_payload())
+    if ref_watcher is not None:
+        ref_watcher.start()
+    try:
+        yield
+    finally:
+        if ref_watcher is not None:
+            ref_watcher.stop()
+        worker_pool.stop()
+        shutdown_executor()
+        database.close()
 
 
-# --- Helpers ---
-def _ensure_schema() -> None:
-    from core.store.sqlite_store import DeploymentState
-
-    DeploymentState(DB_PATH).ensure_schema()
+app = FastAPI(title="IKOMA Runner UI", version="0.0.1", lifespan=_lifespan)
 
 
-def _fetch_configs() -> List[AppConfig]:
-    return config_store.list_configs()
+# --- Helpers ---
+def _fetch_overview() -> Tuple[List[AppConfig], Dict[str, Dict[str, Any]]]:
+    return overview_cache.get("overview", config_store.list_with_deployments)
 
 
 def _get_config(app_id: str) -> Optional[AppConfig]:
     return config_store.get(app_id)
 
 
-def _fetch_deployments() -> List[Dict[str, Any]]:
-    _ensure_schema()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        rows = conn.execute(
-            "SELECT app_id, ref, status, message, updated_at FROM deployments ORDER BY updated_at DESC"
-        ).fetchall()
-        return [dict(row) for row in rows]
+def _fetch_deployment(app_id: str) -> Optional[Dict[str, Any]]:
+    return deployment_state.get_deployment(app_id)
 
 
-def _fetch_deployment(app_id: str) -> Optional[Dict[str, Any]]:
-    _ensure_schema()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        row = conn.execute(
-            "SELECT app_id, ref, status, message, updated_at FROM deployments WHERE app_id = ?",
-            (app_id,),
-        ).fetchone()
-        return dict(row) if row else None
+def _fetch_runs(app_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    return deployment_state.list_runs(app_id, limit=limit)
 
 
 def _fetch_supabase_run(app_id: str) -> Optional[Dict[str, Any]]:
-    _ensure_schema()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        row = conn.execute(
-            "SELECT app_id, status, message, updated_at, migrations FROM supabase_runs WHERE app_id = ?",
-            (app_id,),
-        ).fetchone()
-        return dict(row) if row else None
+    return deployment_state.get_supabase_run(app_id)
 
 
 def _get_logs(app_id: str) -> List[Path]:
@@ -78,22 +90,31 @@ def _get_logs(app_id: str) -> List[Path]:
     return [p for p in app_log_dir.iterdir() if p.is_file() and p.suffix == ".log"]
 
 
-@contextmanager
-def _with_git_remote(remote_url: str):
-    previous = os.environ.get("IKOMA_GIT_REMOTE")
-    os.environ["IKOMA_GIT_REMOTE"] = remote_url
-    try:
-        yield
-    finally:
-        if previous is None:
-            os.environ.pop("IKOMA_GIT_REMOTE", None)
-        else:
-            os.environ["IKOMA_GIT_REMOTE"] = previous
+def _render(template: str, context: Dict[str, Any]) -> str:
+    return templates.get_template(template).render(context)
 
 
-def _start_thread(target: Any, *, args: tuple) -> None:
-    thread = threading.Thread(target=target, args=args, daemon=True)
-    thread.start()
+def _render_index(status: str | None, message: str | None) -> str:
+    def render() -> str:
+        configs, deployments = _fetch_overview()
+        context = {
+            "configs": configs,
+            "deployments": deployments,
+            "count": len(configs),
+            "status_message": status,
+            "status_detail": message,
+        }
+        return _render("index.html", context)
+
+    if status is None and message is None:
+        return overview_cache.get("index.html", render)
+    return render()
+
+
+def _queued_message(label: str, job_id: int, created: bool) -> str:
+    if created:
+        return quote(f"{label} en file (job {job_id})")
+    return quote(f"{label} déjà en file (job {job_id})")
 
 
 def _default_path(app_id: str) -> str:
@@ -102,18 +123,8 @@ def _default_path(app_id: str) -> str:
 
 # --- Routes ---
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request, status: str | None = None, message: str | None = None) -> HTMLResponse:
-    configs = _fetch_configs()
-    deployments = {dep["app_id"]: dep for dep in _fetch_deployments()}
-    context = {
-        "request": request,
-        "configs": configs,
-        "deployments": deployments,
-        "count": len(configs),
-        "status_message": status,
-        "status_detail": message,
-    }
-    return templates.TemplateResponse("index.html", context)
+async def index(status: str | None = None, message: str | None = None) -> HTMLResponse:
+    return HTMLResponse(await run_blocking(_render_index, status, message))
 
 
 @app.post("/apps")
@@ -155,25 +166,30 @@ def create_app(
 
 
 @app.get("/apps/{app_id}", response_class=HTMLResponse)
-def app_detail(request: Request, app_id: str, status: str | None = None, message: str | None = None) -> HTMLResponse:
-    config = _get_config(app_id)
+async def app_detail(app_id: str, status: str | None = None, message: str | None = None) -> HTMLResponse:
+    config = await run_blocking(_get_config, app_id)
     if not config:
         raise HTTPException(status_code=404, detail="Application inconnue")
 
-    deployment = _fetch_deployment(app_id)
-    supabase_run = _fetch_supabase_run(app_id)
-    logs = _get_logs(app_id)
+    deployment, supabase_run, logs, jobs, runs = await asyncio.gather(
+        run_blocking(_fetch_deployment, app_id),
+        run_blocking(_fetch_supabase_run, app_id),
+        run_blocking(_get_logs, app_id),
+        run_blocking(job_store.list_jobs, app_id, limit=10),
+        run_blocking(_fetch_runs, app_id),
+    )
     context = {
-        "request": request,
         "app_id": app_id,
         "config": config,
         "deployment": deployment,
         "supabase_run": supabase_run,
         "logs": logs,
+        "jobs": jobs,
+        "runs": runs,
         "status_message": status,
         "status_detail": message,
     }
-    return templates.TemplateResponse("app_detail.html", context)
+    return HTMLResponse(await run_blocking(_render, "app_detail.html", context))
 
 
 @app.post("/apps/{app_id}/update")
@@ -220,27 +236,22 @@ def trigger_sync(app_id: str) -> RedirectResponse:
     repo_base = target_dir.parent
     branch = config.branch or "main"
 
-    def _run() -> None:
-        logger = build_logger(app_id, LOGS_DIR, log_filename="sync.log")
-        try:
-            with _with_git_remote(config.repo_git_url):
-                sync_repository(app_id, branch, repo_base, logger)
-        except Exception:
-            # sync_repository trace déjà dans les logs
-            pass
-
-    _start_thread(_run, args=())
+    job, created = worker_pool.submit(
+        "sync",
+        app_id,
+        {"ref": branch, "repos_dir": str(repo_base), "remote_url": config.repo_git_url},
+    )
     return RedirectResponse(
         url=(
-            f"/apps/{quote(app_id)}?status=sync_started"
-            f"&message=Synchronisation%20git%20lanc%C3%A9e%20({quote(branch)})"
+            f"/apps/{quote(app_id)}?status=sync_queued"
+            f"&message={_queued_message(f'Synchronisation git ({branch})', job.id, created)}"
         ),
         status_code=303,
     )
 
 
 @app.post("/apps/{app_id}/deploy")
-def trigger_deploy(app_id: str, ref: str = Form("")) -> RedirectResponse:
+def trigger_deploy(app_id: str, ref: str = Form(""), force: bool = Form(False)) -> RedirectResponse:
     config = _get_config(app_id)
     if not config:
         raise HTTPException(status_code=404, detail="Application inconnue")
@@ -249,19 +260,14 @@ def trigger_deploy(app_id: str, ref: str = Form("")) -> RedirectResponse:
     if not chosen_ref:
         raise HTTPException(status_code=400, detail="ref est requis")
 
-    def _run() -> None:
-        try:
-            with _with_git_remote(config.repo_git_url):
-                deploy_up(app_id, chosen_ref)
-        except Exception:
-            # deploy_up trace déjà dans les logs
-            pass
-
-    _start_thread(_run, args=())
+    payload: Dict[str, Any] = {"ref": chosen_ref, "remote_url": config.repo_git_url}
+    if force:
+        payload["force"] = True
+    job, created = worker_pool.submit("deploy", app_id, payload)
     return RedirectResponse(
         url=(
-            f"/apps/{quote(app_id)}?status=deploy_started"
-            f"&message=D%C3%A9ploiement%20lanc%C3%A9%20pour%20{quote(chosen_ref)}"
+            f"/apps/{quote(app_id)}?status=deploy_queued"
+            f"&message={_queued_message(f'Déploiement de {chosen_ref}', job.id, created)}"
         ),
         status_code=303,
     )
@@ -280,38 +286,104 @@ def trigger_migration(
     cleaned_repo = repo_path.strip() or config.path_deploiement or _default_path(app_id)
     cleaned_dir = migrations_dir.strip() or config.migrations_dir or "supabase/migrations"
 
-    def _run() -> None:
-        try:
-            supabase_apply_migrations(app_id, Path(cleaned_repo), cleaned_dir)
-        except Exception:
-            # supabase_apply_migrations trace déjà dans les logs
-            pass
-
-    _start_thread(_run, args=())
-    encoded_dir = quote(cleaned_dir)
+    job, created = worker_pool.submit(
+        "migrate", app_id, {"repo_path": cleaned_repo, "migrations_dir": cleaned_dir}
+    )
     return RedirectResponse(
         url=(
-            f"/apps/{quote(app_id)}?status=migrate_started"
-            f"&message=Migration%20lanc%C3%A9e%20({encoded_dir})"
+            f"/apps/{quote(app_id)}?status=migrate_queued"
+            f"&message={_queued_message(f'Migration ({cleaned_dir})', job.id, created)}"
         ),
         status_code=303,
     )
 
 
-@app.get("/apps/{app_id}/logs/{log_name}", response_class=PlainTextResponse)
-def view_log(app_id: str, log_name: str) -> PlainTextResponse:
+def _log_path(app_id: str, log_name: str) -> Path:
     safe_names = {"deploy.log", "supabase.log", "sync.log"}
     if log_name not in safe_names:
         raise HTTPException(status_code=404, detail="Log inconnu")
 
     log_path = LOGS_DIR / app_id / log_name
-    if not log_path.exists():
+    if log_path.resolve().parent.parent != LOGS_DIR.resolve() or not log_path.exists():
         raise HTTPException(status_code=404, detail="Fichier de log introuvable")
+    return log_path
+
+
+@app.get("/apps/{app_id}/logs/{log_name}", response_class=HTMLResponse)
+async def view_log(app_id: str, log_name: str) -> HTMLResponse:
+    await run_blocking(_log_path, app_id, log_name)
+    context = {"app_id": app_id, "log_name": log_name, "chunk_bytes": DEFAULT_CHUNK_BYTES}
+    return HTMLResponse(await run_blocking(_render, "log_view.html", context))
 
-    content = log_path.read_text(encoding="utf-8", errors="replace")
-    return PlainTextResponse(content)
+
+@app.get("/apps/{app_id}/logs/{log_name}/raw")
+async def download_log(app_id: str, log_name: str) -> FileResponse:
+    log_path = await run_blocking(_log_path, app_id, log_name)
+    return FileResponse(log_path, media_type="text/plain; charset=utf-8")
+
+
+@app.get("/apps/{app_id}/logs/{log_name}/tail")
+async def tail_log(
+    app_id: str, log_name: str, before: int | None = None, limit: int = DEFAULT_CHUNK_BYTES
+) -> Dict[str, Any]:
+    log_path = await run_blocking(_log_path, app_id, log_name)
+    return (await run_blocking(read_tail, log_path, limit=limit, before=before)).to_dict()
+
+
+@app.get("/apps/{app_id}/logs/{log_name}/stream")
+async def stream_log(
+    request: Request,
+    app_id: str,
+    log_name: str,
+    offset: int | None = None,
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    log_path = await run_blocking(_log_path, app_id, log_name)
+    if last_event_id and last_event_id.isdigit():
+        start = int(last_event_id)
+    elif offset is not None:
+        start = max(0, offset)
+    else:
+        start = (await run_blocking(log_path.stat)).st_size
+
+    return StreamingResponse(
+        follow(log_path, start, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: int) -> Dict[str, Any]:
+    job = await run_blocking(job_store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job inconnu")
+    return job.to_dict()
+
+
+@app.get("/jobs")
+async def list_jobs(app_id: str | None = None, limit: int = 20) -> Dict[str, Any]:
+    jobs, queue = await asyncio.gather(
+        run_blocking(job_store.list_jobs, app_id, limit=max(1, min(limit, 200))),
+        run_blocking(job_store.count_by_status),
+    )
+    return {
+        "jobs": [job.to_dict() for job in jobs],
+        "queue": queue,
+        "running": worker_pool.running_jobs,
+    }
 
 
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Métriques au format texte Prometheus ; les jauges de la file sont lues au moment du scrape."""
+    counts = await run_blocking(job_store.count_by_status)
+    for status in (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED):
+        JOBS.labels(status).set(counts.get(status, 0))
+    JOBS_RUNNING.set(worker_pool.running_jobs)
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
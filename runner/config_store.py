@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-import sqlite3
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.deploy.deploy_up import DB_PATH
+from core.store.db import get_database
 
 
 @dataclass
@@ -18,67 +18,78 @@ class AppConfig:
     type_app: str = "generic"
 
 
+_CONFIG_COLUMNS = "app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app"
+_JOINED_CONFIG_COLUMNS = ", ".join(f"c.{column}" for column in _CONFIG_COLUMNS.split(", "))
+
+
 class AppConfigStore:
     def __init__(self, db_path: Path = DB_PATH) -> None:
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.ensure_schema()
+        self.db = get_database(self.db_path)
 
     def ensure_schema(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS app_configs (
-                    app_id TEXT PRIMARY KEY,
-                    repo_git_url TEXT NOT NULL,
-                    branch TEXT NOT NULL,
-                    path_deploiement TEXT NOT NULL,
-                    migrations_dir TEXT,
-                    type_app TEXT NOT NULL
-                )
-                """
-            )
-            conn.commit()
+        self.db.migrate()
 
     def list_configs(self) -> List[AppConfig]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(
-                "SELECT app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app FROM app_configs ORDER BY app_id"
-            ).fetchall()
-            return [AppConfig(**dict(row)) for row in rows]
+        rows = self.db.execute(f"SELECT {_CONFIG_COLUMNS} FROM app_configs ORDER BY app_id").fetchall()
+        return [AppConfig(**dict(row)) for row in rows]
+
+    def list_with_deployments(self) -> Tuple[List[AppConfig], Dict[str, Dict[str, Any]]]:
+        """Configurations et dernier statut de déploiement de chaque app, en une requête."""
+
+        rows = self.db.execute(
+            f"""
+            SELECT {_JOINED_CONFIG_COLUMNS}, d.ref, d.status, d.message, d.updated_at
+            FROM app_configs AS c
+            LEFT JOIN deployments AS d ON d.app_id = c.app_id
+            ORDER BY c.app_id
+            """
+        ).fetchall()
+        configs: List[AppConfig] = []
+        deployments: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            config = AppConfig(*row[:6])
+            configs.append(config)
+            if row[7] is not None:
+                deployments[config.app_id] = {
+                    "app_id": config.app_id,
+                    "ref": row[6],
+                    "status": row[7],
+                    "message": row[8],
+                    "updated_at": row[9],
+                }
+        return configs, deployments
+
+    def list_version(self) -> int:
+        """Compteur incrémenté à chaque écriture dans `app_configs` ou `deployments`."""
+
+        row = self.db.execute("SELECT version FROM change_counters WHERE name = 'apps'").fetchone()
+        return int(row[0]) if row else 0
 
     def get(self, app_id: str) -> Optional[AppConfig]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            row = conn.execute(
-                "SELECT app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app FROM app_configs WHERE app_id = ?",
-                (app_id,),
-            ).fetchone()
-            if row:
-                return AppConfig(**dict(row))
-            return None
+        row = self.db.execute(f"SELECT {_CONFIG_COLUMNS} FROM app_configs WHERE app_id = ?", (app_id,)).fetchone()
+        if row:
+            return AppConfig(**dict(row))
+        return None
 
     def upsert(self, config: AppConfig) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO app_configs (app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(app_id) DO UPDATE SET
-                    repo_git_url=excluded.repo_git_url,
-                    branch=excluded.branch,
-                    path_deploiement=excluded.path_deploiement,
-                    migrations_dir=excluded.migrations_dir,
-                    type_app=excluded.type_app
-                """,
-                (
-                    config.app_id,
-                    config.repo_git_url,
-                    config.branch,
-                    config.path_deploiement,
-                    config.migrations_dir,
-                    config.type_app,
-                ),
-            )
-            conn.commit()
+        self.db.execute(
+            """
+            INSERT INTO app_configs (app_id, repo_git_url, branch, path_deploiement, migrations_dir, type_app)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(app_id) DO UPDATE SET
+                repo_git_url=excluded.repo_git_url,
+                branch=excluded.branch,
+                path_deploiement=excluded.path_deploiement,
+                migrations_dir=excluded.migrations_dir,
+                type_app=excluded.type_app
+            """,
+            (
+                config.app_id,
+                config.repo_git_url,
+                config.branch,
+                config.path_deploiement,
+                config.migrations_dir,
+                config.type_app,
+            ),
+        )
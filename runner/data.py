@@ -0,0 +1,85 @@
+"""Accès bloquants (SQLite, système de fichiers) du Runner hors de la boucle d'événements.
+
+Les routes `async` du Runner délèguent chaque lecture à un pool de threads
+dédié (`IKOMA_RUNNER_DB_THREADS`, 4 par défaut) plutôt qu'au pool partagé
+d'anyio, pour qu'une rafale de pages ne prive pas les autres appels bloquants.
+Chaque thread garde sa propre connexion SQLite (`core.store.db.Database`).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+DEFAULT_DB_THREADS = 4
+
+T = TypeVar("T")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def configured_db_threads() -> int:
+    return max(1, int(os.getenv("IKOMA_RUNNER_DB_THREADS", DEFAULT_DB_THREADS)))
+
+
+def executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=configured_db_threads(), thread_name_prefix="ikoma-runner-db")
+        return _EXECUTOR
+
+
+def shutdown_executor() -> None:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=True)
+            _EXECUTOR = None
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Exécute `fn` dans le pool du Runner et attend son résultat sans bloquer la boucle."""
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), functools.partial(fn, *args, **kwargs))
+
+
+class VersionedCache(Generic[T]):
+    """Valeur recalculée seulement quand `version_fn()` change.
+
+    `version_fn` doit être peu coûteux (une ligne lue en base) : il est appelé
+    à chaque accès. Les accès concurrents à une version périmée ne déclenchent
+    qu'un seul recalcul.
+    """
+
+    def __init__(self, version_fn: Callable[[], int]) -> None:
+        self._version_fn = version_fn
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        self._entries: Dict[Any, Tuple[int, Any]] = {}
+
+    def get(self, key: Any, compute: Callable[[], T]) -> T:
+        version = self._version_fn()
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Un verrou par clé : une entrée peut être calculée à partir d'une autre.
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = self._entries.get(key)
+            # Le compteur ne fait que croître : une valeur calculée pendant l'attente suffit.
+            if cached is not None and cached[0] >= version:
+                return cached[1]
+            value = compute()
+            self._entries[key] = (version, value)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
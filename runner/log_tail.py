@@ -0,0 +1,148 @@
+"""Lecture incrémentale des logs append-only du Runner.
+
+Aucune fonction ne charge le fichier entier : les lectures se font par blocs
+bornés à partir d'un offset en octets, ce qui garde une mémoire constante quelle
+que soit la taille du log. Les offsets renvoyés tombent sur une fin de ligne
+(ou, pour une ligne plus longue qu'un bloc, sur une frontière de caractère UTF-8)
+pour que le client puisse reprendre exactement là où il s'est arrêté.
+
+Les lectures passent par le pool du Runner (`runner.data.run_blocking`). Un
+fichier tronqué ou remplacé (rotation, inode différent) est relu depuis le début.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from runner.data import run_blocking
+
+DEFAULT_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 1024 * 1024
+FOLLOW_POLL_INTERVAL = 0.5  # secondes
+HEARTBEAT_INTERVAL = 15.0  # secondes
+
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))  # octets 10xxxxxx d'une séquence UTF-8
+
+
+@dataclass
+class LogChunk:
+    text: str
+    start: int  # offset du premier octet renvoyé
+    end: int  # offset juste après le dernier octet renvoyé
+    size: int  # taille du fichier au moment de la lecture
+
+    def to_dict(self) -> dict:
+        return {"text": self.text, "start": self.start, "end": self.end, "size": self.size}
+
+
+def read_tail(path: Path, limit: int = DEFAULT_CHUNK_BYTES, before: int | None = None) -> LogChunk:
+    """Renvoie au plus `limit` octets se terminant à `before` (fin du fichier par défaut).
+
+    La première ligne partielle est écartée (sauf en début de fichier), si bien que
+    `start` peut servir de `before` pour paginer vers le passé.
+    """
+
+    limit = max(1, min(limit, MAX_CHUNK_BYTES))
+    with path.open("rb") as handle:
+        size = handle.seek(0, 2)
+        end = size if before is None else max(0, min(before, size))
+        start = max(0, end - limit)
+        handle.seek(start)
+        data = handle.read(end - start)
+
+    if start > 0:
+        newline = data.find(b"\n")
+        if newline != -1 and newline + 1 < len(data):
+            data = data[newline + 1 :]
+            start += newline + 1
+        else:
+            skipped = len(data) - len(data.lstrip(_CONTINUATION_BYTES))
+            data, start = data[skipped:], start + skipped
+    return LogChunk(text=data.decode("utf-8", errors="replace"), start=start, end=end, size=size)
+
+
+def read_from(path: Path, offset: int, limit: int = DEFAULT_CHUNK_BYTES) -> LogChunk:
+    """Renvoie les lignes complètes écrites après `offset` (au plus `limit` octets)."""
+
+    limit = max(1, min(limit, MAX_CHUNK_BYTES))
+    with path.open("rb") as handle:
+        size = handle.seek(0, 2)
+        if offset > size:
+            # Fichier tronqué ou remplacé : on repart du début.
+            offset = 0
+        handle.seek(offset)
+        data = handle.read(limit)
+
+    newline = data.rfind(b"\n")
+    if newline == -1 and len(data) < limit:
+        data = b""  # ligne en cours d'écriture, on attend sa fin
+    elif newline != -1:
+        data = data[: newline + 1]
+    else:
+        # Ligne plus longue qu'un bloc : coupée sur une frontière de caractère.
+        data = data[: _complete_utf8(data) or len(data)]
+    return LogChunk(
+        text=data.decode("utf-8", errors="replace"),
+        start=offset,
+        end=offset + len(data),
+        size=size,
+    )
+
+
+def _complete_utf8(data: bytes) -> int:
+    """Longueur de `data` sans l'éventuelle séquence UTF-8 incomplète finale."""
+
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue  # octet de continuation
+        needed = 1 if byte < 0xC0 else 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+        return len(data) - back if back < needed else len(data)
+    return len(data)
+
+
+def _read_new(path: Path, offset: int, inode: Optional[int]) -> Tuple[Optional[LogChunk], Optional[int]]:
+    """`read_from` qui repart du début si le fichier a été remplacé ; None s'il n'existe pas."""
+
+    try:
+        current = path.stat().st_ino
+        if inode is not None and current != inode:
+            offset = 0
+        return read_from(path, offset), current
+    except FileNotFoundError:
+        return None, inode
+
+
+async def follow(
+    path: Path,
+    offset: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = FOLLOW_POLL_INTERVAL,
+) -> AsyncIterator[str]:
+    """Générateur d'événements Server-Sent Events suivant `path` depuis `offset`.
+
+    Chaque événement `log` porte en `id` l'offset de fin : un `EventSource` qui se
+    reconnecte renvoie `Last-Event-ID` et reprend sans trou ni doublon.
+    """
+
+    idle = 0.0
+    inode: Optional[int] = None
+    while not await is_disconnected():
+        chunk, inode = await run_blocking(_read_new, path, offset, inode)
+
+        if chunk and chunk.text:
+            offset = chunk.end
+            idle = 0.0
+            data = "\n".join(f"data: {line}" for line in chunk.text.rstrip("\n").split("\n"))
+            yield f"id: {offset}\nevent: log\n{data}\n\n"
+            continue
+
+        if chunk and chunk.start != offset:
+            offset = chunk.start
+        await asyncio.sleep(poll_interval)
+        idle += poll_interval
+        if idle >= HEARTBEAT_INTERVAL:
+            idle = 0.0
+            yield ": keep-alive\n\n"
@@ -0,0 +1,295 @@
+"""Surveillance des branches par `git ls-remote`, pour les remotes sans webhook.
+
+Un thread du Runner (activé par `IKOMA_REF_WATCH=1`) compare régulièrement la
+tête de la branche de chaque `AppConfig` au dernier SHA vu, et met en file un
+job `deploy` quand elle bouge. Ce job passe par `sync_repository` comme un
+déploiement manuel, et il partage la clé de fusion des webhooks
+(`core.scm.webhooks.coalesce_key`). Un push reçu par webhook et détecté par
+scrutation ne donne donc qu'un déploiement.
+
+Pour que le coût d'un scan ne croisse pas avec le nombre d'apps :
+- l'état (dernier SHA, intervalle, prochaine échéance) est persisté dans la
+  table `ref_watch` ; un scan ne lit que les lignes échues, via un index ;
+- les configurations ne sont relues que si le compteur `change_counters` a bougé ;
+- un seul `git ls-remote` par URL distante, qui couvre toutes les branches
+  suivies sur ce remote (monorepo, branches `main`/`staging`...) ; les remotes
+  sont interrogés en parallèle (`IKOMA_REF_WATCH_PARALLELISM`, 8 par défaut).
+
+L'intervalle est propre à chaque app. Un commit le ramène à
+`IKOMA_REF_WATCH_MIN_INTERVAL` (60 s). Chaque scan sans changement ou en
+échec le multiplie par 1,5, jusqu'à `IKOMA_REF_WATCH_MAX_INTERVAL` (900 s).
+Une branche active est donc scrutée souvent et une branche dormante
+rarement. Chaque échéance reçoit ±20 % d'aléa pour que les apps ne
+convergent pas toutes vers le même instant.
+
+Le premier passage sur une app (ou après un changement de dépôt ou de
+branche) enregistre le SHA courant sans déployer.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.deploy.deploy_up import DB_PATH, DeployError
+from core.pipelines.workers import env_number
+from core.scm import git_repo
+from core.scm.webhooks import coalesce_key
+from core.store.db import get_database
+from core.store.job_store import JobStore
+from runner.config_store import AppConfig, AppConfigStore
+
+DEFAULT_MIN_INTERVAL = 60.0  # secondes
+DEFAULT_MAX_INTERVAL = 900.0  # secondes
+DEFAULT_BACKOFF = 1.5
+DEFAULT_JITTER = 0.2
+DEFAULT_PARALLELISM = 8
+DEFAULT_TICK = 5.0  # secondes entre deux recherches d'échéances
+
+_WATCH_COLUMNS = "app_id, remote_url, branch, last_sha, interval, next_check, checked_at, changed_at, failures"
+
+_logger = logging.getLogger("ikoma.ref_watcher")
+
+
+@dataclass
+class WatchState:
+    app_id: str
+    remote_url: str
+    branch: str
+    last_sha: Optional[str]
+    interval: float
+    next_check: float
+    checked_at: Optional[float] = None
+    changed_at: Optional[float] = None
+    failures: int = 0
+
+
+@dataclass
+class ScanReport:
+    """Résultat d'un passage : remotes interrogés, apps vérifiées, déploiements déclenchés."""
+
+    remotes: int = 0
+    checked: int = 0
+    triggered: List[Tuple[str, str]] = field(default_factory=list)  # (app_id, sha)
+    failures: int = 0
+    duration: float = 0.0
+
+
+class RefWatchStore:
+    """Accès SQLite à la table `ref_watch`."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db = get_database(db_path)
+
+    def sync_configs(self, configs: Iterable[AppConfig], now: float, interval: float) -> None:
+        """Aligne `ref_watch` sur les configurations, en une transaction.
+
+        Une app nouvelle, ou dont le dépôt ou la branche a changé, repart de zéro
+        (SHA de référence à relever, échéance immédiate). Une app supprimée est oubliée.
+        """
+
+        wanted = {config.app_id: (config.repo_git_url, config.branch or "main") for config in configs}
+        with self.db.transaction() as conn:
+            known = {
+                row["app_id"]: (row["remote_url"], row["branch"])
+                for row in conn.execute("SELECT app_id, remote_url, branch FROM ref_watch")
+            }
+            conn.executemany(
+                """
+                INSERT INTO ref_watch(app_id, remote_url, branch, last_sha, interval, next_check, failures)
+                VALUES(?, ?, ?, NULL, ?, ?, 0)
+                ON CONFLICT(app_id) DO UPDATE SET
+                    remote_url = excluded.remote_url, branch = excluded.branch, last_sha = NULL,
+                    interval = excluded.interval, next_check = excluded.next_check,
+                    checked_at = NULL, changed_at = NULL, failures = 0
+                """,
+                [
+                    (app_id, remote, branch, interval, now)
+                    for app_id, (remote, branch) in wanted.items()
+                    if known.get(app_id) != (remote, branch)
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM ref_watch WHERE app_id = ?", [(app_id,) for app_id in known.keys() - wanted.keys()]
+            )
+
+    def due_remotes(self, now: float) -> List[str]:
+        rows = self.db.execute(
+            "SELECT DISTINCT remote_url FROM ref_watch WHERE next_check <= ?", (now,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def for_remotes(self, remotes: List[str]) -> List[WatchState]:
+        """Toutes les apps suivies sur ces remotes (un `ls-remote` les couvre toutes)."""
+
+        if not remotes:
+            return []
+        rows = self.db.execute(
+            f"SELECT {_WATCH_COLUMNS} FROM ref_watch WHERE remote_url IN ({', '.join('?' for _ in remotes)})",
+            remotes,
+        ).fetchall()
+        return [WatchState(**dict(row)) for row in rows]
+
+    def get(self, app_id: str) -> Optional[WatchState]:
+        row = self.db.execute(f"SELECT {_WATCH_COLUMNS} FROM ref_watch WHERE app_id = ?", (app_id,)).fetchone()
+        return WatchState(**dict(row)) if row else None
+
+    def save(self, states: List[WatchState]) -> None:
+        self.db.executemany(
+            """
+            UPDATE ref_watch SET last_sha = ?, interval = ?, next_check = ?, checked_at = ?, changed_at = ?, failures = ?
+            WHERE app_id = ? AND remote_url = ? AND branch = ?
+            """,
+            [
+                (
+                    state.last_sha,
+                    state.interval,
+                    state.next_check,
+                    state.checked_at,
+                    state.changed_at,
+                    state.failures,
+                    state.app_id,
+                    state.remote_url,
+                    state.branch,
+                )
+                for state in states
+            ],
+        )
+
+
+class RefWatcher:
+    """Scrute les branches suivies et met en file les déploiements des nouveaux commits."""
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        *,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        backoff: float = DEFAULT_BACKOFF,
+        jitter: float = DEFAULT_JITTER,
+        parallelism: int | None = None,
+        tick: float = DEFAULT_TICK,
+    ) -> None:
+        self.configs = AppConfigStore(db_path)
+        self.state = RefWatchStore(db_path)
+        self.jobs = JobStore(db_path)
+        self.min_interval = min_interval or env_number("IKOMA_REF_WATCH_MIN_INTERVAL", DEFAULT_MIN_INTERVAL, minimum=1.0)
+        self.max_interval = max(
+            self.min_interval,
+            max_interval or env_number("IKOMA_REF_WATCH_MAX_INTERVAL", DEFAULT_MAX_INTERVAL),
+        )
+        self.backoff = backoff
+        self.jitter = jitter
+        self.parallelism = max(1, parallelism or env_number("IKOMA_REF_WATCH_PARALLELISM", DEFAULT_PARALLELISM))
+        self.tick = min(tick, self.min_interval)
+        self._config_version: Optional[int] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="ikoma-ref-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.scan_once()
+            except Exception:  # noqa: BLE001 - le thread doit survivre à un scan raté
+                _logger.exception("Scan des branches en échec")
+            self._stopping.wait(self.tick)
+
+    def scan_once(self, now: float | None = None) -> ScanReport:
+        """Un passage : un `ls-remote` par remote dont au moins une app est échue."""
+
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        version = self.configs.list_version()
+        if version != self._config_version:
+            self.state.sync_configs(self.configs.list_configs(), now, self.min_interval)
+            self._config_version = version
+
+        report = ScanReport()
+        states = self.state.for_remotes(self.state.due_remotes(now))
+        if not states:
+            report.duration = time.perf_counter() - start
+            return report
+
+        by_remote: Dict[str, List[WatchState]] = defaultdict(list)
+        for state in states:
+            by_remote[state.remote_url].append(state)
+        report.remotes, report.checked = len(by_remote), len(states)
+        with ThreadPoolExecutor(max_workers=min(self.parallelism, len(by_remote))) as pool:
+            heads = dict(zip(by_remote, pool.map(self._heads, by_remote.items())))
+
+        for remote, remote_states in by_remote.items():
+            for state in remote_states:
+                sha = heads[remote].get(state.branch) if heads[remote] is not None else None
+                if sha is None:
+                    report.failures += 1
+                    self._reschedule(state, now, changed=False, failed=True)
+                elif state.last_sha is None:
+                    state.last_sha = sha
+                    self._reschedule(state, now, changed=False)
+                elif sha != state.last_sha:
+                    self._enqueue(state, sha)
+                    state.last_sha = sha
+                    report.triggered.append((state.app_id, sha))
+                    self._reschedule(state, now, changed=True)
+                else:
+                    self._reschedule(state, now, changed=False)
+        self.state.save(states)
+        report.duration = time.perf_counter() - start
+        return report
+
+    def _heads(self, item: Tuple[str, List[WatchState]]) -> Optional[Dict[str, str]]:
+        remote, states = item
+        try:
+            return git_repo.ls_remote_heads(remote, sorted({state.branch for state in states}))
+        except DeployError as exc:
+            _logger.warning("%s", exc)
+            return None
+
+    def _enqueue(self, state: WatchState, sha: str) -> None:
+        payload = {"ref": state.branch, "remote_url": state.remote_url, "trigger": "poll", "commit": sha}
+        job, created = self.jobs.enqueue_coalesced(
+            "deploy", state.app_id, payload, coalesce_key=coalesce_key(state.app_id, state.branch)
+        )
+        _logger.info(
+            "%s: %s → %s, déploiement %s (job %s)",
+            state.app_id,
+            (state.last_sha or "?")[:12],
+            sha[:12],
+            "en file" if created else "fusionné",
+            job.id,
+        )
+
+    def _reschedule(self, state: WatchState, now: float, *, changed: bool, failed: bool = False) -> None:
+        if changed:
+            state.interval = self.min_interval
+            state.changed_at = now
+        else:
+            state.interval = min(self.max_interval, state.interval * self.backoff)
+        state.failures = state.failures + 1 if failed else 0
+        state.checked_at = now
+        state.next_check = now + state.interval * (1 + random.uniform(-self.jitter, self.jitter))  # nosec - aléa
+
+
+def ref_watch_enabled() -> bool:
+    return os.getenv("IKOMA_REF_WATCH", "0").lower() in {"1", "true", "yes", "on"}
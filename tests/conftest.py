@@ -0,0 +1,95 @@
+import importlib
+import json
+import os
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+FAKE_DOCKER_DIR = Path(__file__).resolve().parents[1] / "fixtures" / "fake_docker"
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802 - API http.server
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _git(repo: Path, *args: str) -> str:
+    result = subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+@pytest.fixture
+def fake_deploy_env(tmp_path, monkeypatch):
+    """Déploiements de bout en bout sans Docker : faux binaire `docker`, remote Git local, serveur de santé."""
+
+    # `core.deploy.deploy_up` est masqué par la fonction du même nom réexportée par le package.
+    deploy_module = importlib.import_module("core.deploy.deploy_up")
+    from core.logging import logger as logger_module
+    from core.scm import git_repo
+    from core.store.sqlite_store import DeploymentState
+
+    data_dir = tmp_path / "data"
+    monkeypatch.setattr(deploy_module, "DATA_DIR", data_dir)
+    monkeypatch.setattr(deploy_module, "REPOS_DIR", data_dir / "repos")
+    monkeypatch.setattr(deploy_module, "LOGS_DIR", data_dir / "logs")
+    monkeypatch.setattr(deploy_module, "DB_PATH", data_dir / "ikoma.db")
+    monkeypatch.setattr(git_repo, "GIT_CACHE_DIR", data_dir / "git-cache")
+    store = DeploymentState(data_dir / "ikoma.db")
+    store.ensure_schema()
+    monkeypatch.setattr(logger_module, "_COMMAND_STORE", store)
+
+    docker_log = tmp_path / "docker-calls.jsonl"
+    monkeypatch.setenv("PATH", f"{FAKE_DOCKER_DIR}:{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_DOCKER_STATE", str(tmp_path / "docker-state.json"))
+    monkeypatch.setenv("FAKE_DOCKER_LOG", str(docker_log))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    health_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def make_remote(name: str = "app", compose: str = "services:\n  web:\n    image: demo:${APP_TAG:-latest}\n") -> Path:
+        remote = tmp_path / "remotes" / name
+        remote.mkdir(parents=True)
+        (remote / "docker-compose.yml").write_text(compose)
+        manifest = {"compose": "docker-compose.yml", "services": ["web"], "health": {"url": health_url, "timeout": 5}}
+        (remote / "ikoma.release.json").write_text(json.dumps(manifest))
+        _git(remote, "init", "-q", "-b", "main")
+        _git(remote, "add", ".")
+        _git(remote, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+        return remote
+
+    def commit(remote: Path, filename: str, content: str) -> str:
+        (remote / filename).write_text(content)
+        _git(remote, "add", ".")
+        _git(remote, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", f"update {filename}")
+        return _git(remote, "rev-parse", "HEAD")
+
+    def docker_calls(*prefix: str):
+        if not docker_log.exists():
+            return []
+        calls = [json.loads(line) for line in docker_log.read_text().splitlines()]
+        return [call for call in calls if all(part in call for part in prefix)]
+
+    try:
+        yield SimpleNamespace(
+            store=store,
+            data_dir=data_dir,
+            health_url=health_url,
+            fake_docker=FAKE_DOCKER_DIR / "docker",
+            make_remote=make_remote,
+            commit=commit,
+            docker_calls=docker_calls,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,49 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from api.app import create_app
+
+
+def _wait_finished(client, job_id):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        body = client.get(f"/deployments/{job_id}", params={"wait": 5}).json()
+        if body["status"] in ("SUCCEEDED", "FAILED"):
+            return body
+    raise AssertionError(f"job {job_id} non terminé")
+
+
+def test_deployment_jobs_rollback_and_conditional_gets(fake_deploy_env):
+    remote = fake_deploy_env.make_remote()
+    with TestClient(create_app(fake_deploy_env.data_dir / "ikoma.db", workers=1)) as client:
+        response = client.post("/deployments", json={"app_id": "app", "remote_url": str(remote)})
+        assert response.status_code == 202 and response.headers["Location"] == f"/deployments/{response.json()['id']}"
+        first = _wait_finished(client, response.json()["id"])
+        assert first["status"] == "SUCCEEDED" and first["run"]["status"] == "HEALTHY"
+        assert {"git_sync", "compose", "health"} <= set(first["run"]["stages"])
+
+        # ETag : un scrutateur à jour reçoit un 304 sans corps, même après un long-polling.
+        etag = client.get(f"/deployments/{first['id']}").headers["ETag"]
+        cached = client.get(f"/deployments/{first['id']}", params={"wait": 0.6}, headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+
+        fake_deploy_env.commit(remote, "README.md", "v2")
+        response = client.post("/deployments", json={"app_id": "app", "remote_url": str(remote)})
+        second = _wait_finished(client, response.json()["id"])
+        assert second["run"]["commit_sha"] != first["run"]["commit_sha"]
+
+        rollback = client.post(f"/deployments/{second['id']}/rollback", json={"reason": "test"})
+        assert rollback.status_code == 202 and rollback.json()["kind"] == "rollback"
+        restored = _wait_finished(client, rollback.json()["id"])
+        assert restored["status"] == "SUCCEEDED" and restored["run"]["commit_sha"] == first["run"]["commit_sha"]
+
+        with client.stream("GET", f"/deployments/{restored['id']}/events") as events:
+            body = "".join(events.iter_text())
+        assert body.count("event: status") == 1 and '"SUCCEEDED"' in body
+
+        page = client.get("/deployments", params={"app_id": "app", "limit": 2}).json()
+        assert [item["id"] for item in page["items"]] == [restored["id"], second["id"]]
+        rest = client.get("/deployments", params={"app_id": "app", "limit": 2, "cursor": page["next_cursor"]}).json()
+        assert [item["id"] for item in rest["items"]] == [first["id"]] and rest["next_cursor"] is None
+        assert client.get("/deployments/999").status_code == 404
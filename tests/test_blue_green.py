@@ -0,0 +1,57 @@
+import json
+import socket
+
+import pytest
+
+from core.deploy.deploy_up import DeployError, deploy_up
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_blue_green_switches_only_after_the_new_color_is_healthy(fake_deploy_env, tmp_path):
+    remote = fake_deploy_env.make_remote()
+    upstream = tmp_path / "nginx" / "app.conf"
+    healthy_port = int(fake_deploy_env.health_url.rsplit(":", 1)[1].strip("/"))
+    dead_port = _free_port()
+
+    def release(blue: int, green: int) -> None:
+        manifest = {
+            "compose": "docker-compose.yml",
+            "services": ["web"],
+            "health": {"url": "http://127.0.0.1:{port}/", "timeout": 1},
+            "blue_green": {
+                "ports": {"blue": blue, "green": green},
+                "port_env": "APP_PORT",
+                "upstream_file": str(upstream),
+                "reload_command": ["true"],
+            },
+        }
+        fake_deploy_env.commit(remote, "ikoma.release.json", json.dumps(manifest))
+
+    release(blue=healthy_port, green=dead_port)
+    first = deploy_up("app", "main", remote_url=str(remote))
+    assert upstream.read_text() == f"server 127.0.0.1:{healthy_port};\n"
+    assert "switch" in first.stage_durations()
+    assert fake_deploy_env.store.get_active_slot("app")["color"] == "blue"
+    assert fake_deploy_env.docker_calls("up")[-1][:4] == ["compose", "-p", "app-blue", "-f"]
+
+    # La couleur verte ne répond pas : l'upstream reste sur le bleu, seul le vert est retiré.
+    with pytest.raises(DeployError):
+        deploy_up("app", "main", remote_url=str(remote), force=True)
+    assert upstream.read_text() == f"server 127.0.0.1:{healthy_port};\n"
+    assert fake_deploy_env.store.get_active_slot("app")["color"] == "blue"
+    assert fake_deploy_env.docker_calls("down")[-1][:3] == ["compose", "-p", "app-green"]
+
+    release(blue=dead_port, green=healthy_port)
+    third = deploy_up("app", "main", remote_url=str(remote))
+    assert third.status == "HEALTHY"
+    slot = fake_deploy_env.store.get_active_slot("app")
+    assert slot["color"] == "green" and slot["switch_ms"] is not None
+    assert fake_deploy_env.docker_calls("down")[-1][:3] == ["compose", "-p", "app-blue"]
+
+    # Redéploiement sans changement : le chemin rapide vérifie le slot actif.
+    assert deploy_up("app", "main", remote_url=str(remote)).fast_path
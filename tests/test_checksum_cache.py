@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+import pytest
+
+from core.store.checksum_cache import ChecksumCache
+
+
+def test_unchanged_files_are_not_reread(tmp_path):
+    cache = ChecksumCache(tmp_path / "ikoma.db")
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "001_a.sql").write_text("CREATE TABLE a(id int);")
+    (migrations / "002_b.sql").write_text("CREATE TABLE b(id int);")
+
+    first = cache.checksums(migrations, "*.sql")
+    assert [f.name for f in first] == ["001_a.sql", "002_b.sql"]
+    assert all(f.content is not None for f in first)
+    assert first[0].sha256 == hashlib.sha256(b"CREATE TABLE a(id int);").hexdigest()
+
+    second = cache.checksums(migrations, "*.sql")
+    assert [f.sha256 for f in second] == [f.sha256 for f in first]
+    assert all(f.content is None for f in second)
+
+    path = migrations / "002_b.sql"
+    path.write_text("CREATE TABLE b(id bigint);")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    (migrations / "001_a.sql").unlink()
+    third = cache.checksums(migrations, "*.sql")
+    assert [f.name for f in third] == ["002_b.sql"]
+    assert third[0].content == b"CREATE TABLE b(id bigint);"
+    assert cache.db.query("SELECT COUNT(*) FROM file_checksums")[0][0] == 1
+
+
+def test_plan_uses_snapshot_without_postgres(tmp_path, monkeypatch):
+    pytest.importorskip("psycopg2")
+    from core.services import supabase
+    from core.store.sqlite_store import DeploymentState
+
+    monkeypatch.setattr(supabase, "DB_PATH", tmp_path / "ikoma.db")
+    monkeypatch.setattr(supabase, "supabase_connect", lambda: pytest.fail("Postgres ne doit pas être contacté"))
+    migrations = tmp_path / "repo" / "supabase" / "migrations"
+    migrations.mkdir(parents=True)
+    (migrations / "001_a.sql").write_text("CREATE TABLE a(id int);")
+    checksum = hashlib.sha256(b"CREATE TABLE a(id int);").hexdigest()
+    DeploymentState(tmp_path / "ikoma.db").record_migration_snapshot("app", str(migrations.resolve()), {"001_a.sql": checksum})
+
+    plan = supabase.plan_migrations("app", tmp_path / "repo")
+    assert plan.source == "cache" and plan.up_to_date and plan.files == ["001_a.sql"]
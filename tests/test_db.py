@@ -0,0 +1,24 @@
+import threading
+
+from core.store.db import MIGRATIONS, Database
+
+
+def test_database_migrates_once_and_shares_connections_per_thread(tmp_path):
+    database = Database(tmp_path / "ikoma.db")
+
+    conn = database.connection()
+    assert database.connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version")]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(database.connection()))
+    thread.start()
+    thread.join()
+    assert seen[0] is not conn
+
+    # Une seconde instance sur le même fichier ne ré-applique rien.
+    database.close()
+    assert Database(tmp_path / "ikoma.db").migrate() == MIGRATIONS[-1][0]
+    assert len(Database(tmp_path / "ikoma.db").query("SELECT version FROM schema_version")) == len(MIGRATIONS)
@@ -0,0 +1,54 @@
+import json
+
+from core.deploy.deploy_up import deploy_up
+from core.logging.events import RotatingJsonlWriter, iter_events, run_events_path, span_stats
+
+
+def test_each_stage_emits_a_span_and_stats_aggregate_runs(fake_deploy_env):
+    remote = fake_deploy_env.make_remote()
+    first = deploy_up("app", "main", remote_url=str(remote))
+    second = deploy_up("app", "main", remote_url=str(remote))
+    assert second.fast_path
+
+    logs_dir = fake_deploy_env.data_dir / "logs"
+    path = run_events_path(logs_dir, "app", first.run_id)
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert events[0]["event"] == "run_start" and events[-1]["event"] == "run_end"
+    assert {event["run_id"] for event in events} == {first.run_id}
+    ended = [event["span"] for event in events if event["event"] == "span_end"]
+    assert {"preflight", "git_sync", "manifest", "pull", "compose", "health", "db"} <= set(ended)
+    starts = [event["span"] for event in events if event["event"] == "span_start"]
+    assert sorted(starts) == sorted(ended)
+
+    stats = {item.span: item for item in span_stats(iter_events(logs_dir))}
+    assert stats["fast_path"].count == 1 and stats["compose"].count == 1
+    assert stats["compose"].p50_ms <= stats["compose"].p95_ms <= stats["compose"].max_ms
+
+
+def test_writer_rotates_by_size(tmp_path):
+    writer = RotatingJsonlWriter(tmp_path / "run-1.jsonl", max_bytes=200, backups=2)
+    for index in range(20):
+        writer.write({"event": "span_end", "span": "compose", "duration_ms": index})
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run-1.jsonl", "run-1.jsonl.1", "run-1.jsonl.2"]
+    assert all(path.stat().st_size <= 200 for path in tmp_path.iterdir())
+
+
+def test_compact_job_deletes_the_event_files_of_purged_runs(fake_deploy_env):
+    from core.pipelines.workers import _handle_compact
+    from core.store.job_store import Job
+
+    store, logs_dir = fake_deploy_env.store, fake_deploy_env.data_dir / "logs"
+    run_ids = [store.start_run("app", f"v{i}") for i in range(3)]
+    for run_id in run_ids:
+        store.finish_run(run_id, "FAILED", "ko")
+        path = run_events_path(logs_dir, "app", run_id)
+        RotatingJsonlWriter(path).write({"event": "run_end", "run_id": run_id})
+        path.with_name(f"{path.name}.1").write_text("{}\n")
+
+    job = Job(id=1, kind="compact", app_id="_history", payload={"keep_per_app": 1}, status="RUNNING", created_at="")
+    assert _handle_compact(job).startswith("2 run(s)")
+
+    remaining = sorted(path.name for path in (logs_dir / "app" / "events").iterdir())
+    assert remaining == [f"run-{run_ids[-1]}.jsonl", f"run-{run_ids[-1]}.jsonl.1"]
+    assert [event["run_id"] for event in iter_events(logs_dir) if event.get("run_id")] == [run_ids[-1]]
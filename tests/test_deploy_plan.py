@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from api.app import create_app
+from core.deploy.deploy_up import deploy_up, plan_deploy
+from core.scm.git_repo import head_commit
+
+
+def test_plan_predicts_the_deploy_without_side_effects(fake_deploy_env):
+    remote = fake_deploy_env.make_remote()
+
+    first = plan_deploy("app", "main", remote_url=str(remote))
+    assert first.action == "deploy" and first.current_run_id is None and first.target_commit
+
+    report = deploy_up("app", "main", remote_url=str(remote))
+    repo_dir = fake_deploy_env.data_dir / "repos" / "app"
+    runs = len(fake_deploy_env.store.list_runs("app"))
+
+    unchanged = plan_deploy("app", "main")
+    assert unchanged.action == "fast_path" and unchanged.fingerprint == report.fingerprint
+    assert unchanged.duration < 1.0
+
+    new_sha = fake_deploy_env.commit(remote, "docker-compose.yml", "services:\n  web:\n    image: demo:2.0\n  cache:\n    image: redis:7\n")
+    blind = plan_deploy("app", "main")
+    assert blind.action == "deploy" and blind.target_commit == new_sha and not blind.commit_available
+
+    plan = plan_deploy("app", "main", fetch=True)
+    assert plan.commit_available and plan.compose_changed and plan.manifest_changes == []
+    assert [(change.service, change.change, change.fields) for change in plan.services] == [("web", "changed", ["image"])]
+    assert plan.services[0].image_before == report.images["web"] and plan.services[0].image_after == "demo:2.0"
+
+    # Rien n'a bougé : ni checkout, ni run, ni `docker compose up`.
+    assert head_commit(repo_dir) == report.commit_sha
+    assert len(fake_deploy_env.store.list_runs("app")) == runs
+    assert len(fake_deploy_env.docker_calls("up")) == 1
+
+    with TestClient(create_app(fake_deploy_env.data_dir / "ikoma.db", workers=0)) as client:
+        response = client.post("/deployments", json={"app_id": "app", "ref": "main", "dry_run": True})
+        assert response.status_code == 200
+        assert response.json()["services"][0]["image_after"] == "demo:2.0"
+        assert client.get("/deployments").json()["items"] == []
@@ -0,0 +1,71 @@
+import os
+import socket
+import subprocess
+import time
+
+from core.pipelines.workers import WorkerPool
+from core.store.job_store import JobStore
+from core.store.sqlite_store import DeploymentState
+
+
+def test_runs_are_appended_and_compacted(tmp_path):
+    db = DeploymentState(tmp_path / "ikoma.db")
+    db.ensure_schema()
+
+    healthy = db.start_run("app-a", "v1")
+    db.finish_run(healthy, "HEALTHY", "ok", commit_sha="a" * 40, stages={"compose": {"duration_ms": 1200}}, duration=3.5)
+    failed = [db.start_run("app-a", f"v{i}") for i in range(2, 6)]
+    for run_id in failed:
+        db.finish_run(run_id, "FAILED", "ko")
+    running = db.start_run("app-a", "v6")
+    other = db.start_run("app-b", "main")
+    db.finish_run(other, "FAILED", "ko")
+
+    runs = db.list_runs("app-a")
+    assert [run["run_id"] for run in runs] == [running, *reversed(failed), healthy]
+    assert db.get_run(healthy)["stages"] == {"compose": {"duration_ms": 1200}}
+    assert db.last_run("app-a")["commit_sha"] == "a" * 40
+
+    deleted = db.compact_runs(keep_per_app=2)
+
+    remaining = {run["run_id"] for run in db.list_runs(limit=100)}
+    # Les 2 plus récents, le run en cours et le dernier HEALTHY sont conservés.
+    assert remaining == {running, failed[-1], healthy, other}
+    assert deleted == 3
+
+
+def test_old_command_timings_are_pruned(tmp_path):
+    db = DeploymentState(tmp_path / "ikoma.db")
+    db.ensure_schema()
+    db.record_command("app-a", "git fetch", "2020-01-01T00:00:00Z", 1.0, 0, False, 10)
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    db.record_command("app-a", "docker compose up", now, 2.0, 0, False, 10)
+
+    assert db.compact_commands(max_age_days=90) == 1
+    assert [row[0] for row in db.db.execute("SELECT command FROM command_runs")] == ["docker compose up"]
+
+
+def test_runs_left_running_by_an_interrupted_job_are_closed_on_worker_start(tmp_path):
+    db = DeploymentState(tmp_path / "ikoma.db")
+    jobs = JobStore(tmp_path / "ikoma.db")
+    interrupted, _ = jobs.enqueue("deploy", "app-a", {"ref": "main"})
+    live, _ = jobs.enqueue("deploy", "app-b", {"ref": "main"})
+    jobs.claim_next(f"{socket.gethostname()}:{_dead_pid()}:pool")
+    jobs.claim_next(f"{socket.gethostname()}:{os.getppid()}:pool")
+    orphan = db.start_run("app-a", "main", job_id=interrupted.id)
+    running = db.start_run("app-b", "main", job_id=live.id)
+    cli = db.start_run("app-c", "main")
+
+    pool = WorkerPool(jobs, {}, size=1)
+    pool.start()
+    pool.stop()
+
+    assert db.get_run(orphan)["status"] == "INTERRUPTED"
+    assert db.get_run(running)["status"] == db.get_run(cli)["status"] == "RUNNING"
+    assert db.compact_runs(keep_per_app=0) == 1 and db.get_run(orphan) is None
+
+
+def _dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
@@ -0,0 +1,38 @@
+import time
+
+from core.deploy.deploy_up import deploy_up
+
+
+def test_unchanged_redeploy_takes_the_fast_path(fake_deploy_env, monkeypatch):
+    remote = fake_deploy_env.make_remote()
+    monkeypatch.setenv("APP_TAG", "1.0")
+
+    first = deploy_up("app", "main", remote_url=str(remote))
+    assert first.status == "HEALTHY" and not first.fast_path and first.fingerprint
+    assert len(fake_deploy_env.docker_calls("up")) == 1
+
+    start = time.perf_counter()
+    second = deploy_up("app", "main", remote_url=str(remote))
+    assert time.perf_counter() - start < 1.0
+    assert second.fast_path and second.fingerprint == first.fingerprint
+    assert len(fake_deploy_env.docker_calls("up")) == 1
+    assert fake_deploy_env.store.get_run(second.run_id)["status"] == "HEALTHY"
+
+    # Une variable interpolée par le compose change l'empreinte.
+    monkeypatch.setenv("APP_TAG", "1.1")
+    third = deploy_up("app", "main", remote_url=str(remote))
+    assert not third.fast_path and third.fingerprint != first.fingerprint
+
+    # Nouveau commit sur le remote : détecté par ls-remote.
+    fake_deploy_env.commit(remote, "README.md", "v2")
+    assert not deploy_up("app", "main", remote_url=str(remote)).fast_path
+
+    assert not deploy_up("app", "main", remote_url=str(remote), force=True).fast_path
+    assert deploy_up("app", "main", remote_url=str(remote)).fast_path
+    # Un autre remote ne peut pas être validé par l'extraction existante.
+    fork = fake_deploy_env.make_remote("fork")
+    fork_sha = fake_deploy_env.commit(fork, "README.md", "fork")
+    moved = deploy_up("app", "main", remote_url=str(fork))
+    assert not moved.fast_path and moved.commit_sha == fork_sha
+    # Le commit README ne touche aucun service : le redéploiement partiel saute `compose up`.
+    assert len(fake_deploy_env.docker_calls("up")) == 3
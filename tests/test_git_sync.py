@@ -0,0 +1,114 @@
+import logging
+import subprocess
+import sys
+import time
+
+from core.scm import git_repo
+from core.scm.git_repo import sync_repository
+
+_logger = logging.getLogger("test.git_sync")
+
+
+def _git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def test_apps_share_one_mirror_and_get_pinned_worktrees(fake_deploy_env):
+    env = fake_deploy_env
+    remote = env.make_remote("mono")
+    _git(remote, "branch", "staging")
+    staging_sha = env.commit(remote, "README", "main only")
+    repos_dir, cache_dir = env.data_dir / "repos", env.data_dir / "git-cache"
+
+    # Premier clone : miroir bare + worktree, commit épinglé par une ref dédiée.
+    api_dir = sync_repository("api", "main", repos_dir, _logger, remote_url=str(remote))
+    [mirror] = list(cache_dir.glob("*.git"))
+    assert (api_dir / ".git").is_file() and (api_dir / "README").exists()
+    assert _git(mirror, "rev-parse", "refs/ikoma/apps/api") == staging_sha
+    assert _git(mirror, "rev-parse", git_repo.fetch_ref_name("main")) == staging_sha
+
+    # Seconde app du même remote, autre branche : même miroir, ref de fetch distincte.
+    staging_dir = sync_repository("api-staging", "staging", repos_dir, _logger, remote_url=str(remote))
+    assert list(cache_dir.glob("*.git")) == [mirror]
+    assert not (staging_dir / "README").exists()
+    assert _git(mirror, "rev-parse", "refs/ikoma/apps/api-staging") == _git(remote, "rev-parse", "staging")
+
+    # Worktree existant : nouveau commit récupéré et extrait, l'autre app reste épinglée.
+    new_sha = env.commit(remote, "README", "v2")
+    assert sync_repository("api", "main", repos_dir, _logger) == api_dir
+    assert _git(api_dir, "rev-parse", "HEAD") == new_sha and (api_dir / "README").read_text() == "v2"
+    assert _git(mirror, "rev-parse", "refs/ikoma/apps/api") == new_sha
+    assert _git(mirror, "rev-parse", "refs/ikoma/apps/api-staging") == _git(remote, "rev-parse", "staging")
+
+
+def test_changed_remote_moves_the_worktree_to_the_new_mirror(fake_deploy_env):
+    env = fake_deploy_env
+    old, new = env.make_remote("old"), env.make_remote("new")
+    new_sha = env.commit(new, "README", "from new")
+    repos_dir = env.data_dir / "repos"
+
+    repo_dir = sync_repository("app", "main", repos_dir, _logger, remote_url=str(old))
+    [old_mirror] = list((env.data_dir / "git-cache").glob("*.git"))
+
+    assert sync_repository("app", "main", repos_dir, _logger, remote_url=str(new)) == repo_dir
+    assert _git(repo_dir, "rev-parse", "HEAD") == new_sha and (repo_dir / "README").read_text() == "from new"
+    assert _git(repo_dir, "remote", "get-url", "origin") == str(new)
+    assert _git(old_mirror, "for-each-ref", "refs/ikoma/apps") == ""
+
+
+def test_cache_disabled_uses_a_standalone_clone(fake_deploy_env, monkeypatch):
+    env = fake_deploy_env
+    monkeypatch.setenv("IKOMA_GIT_CACHE", "0")
+    remote = env.make_remote("solo")
+    repos_dir = env.data_dir / "repos"
+
+    repo_dir = sync_repository("solo", "main", repos_dir, _logger, remote_url=str(remote))
+    assert (repo_dir / ".git").is_dir() and not (env.data_dir / "git-cache").exists()
+
+    new_sha = env.commit(remote, "README", "v2")
+    sync_repository("solo", "main", repos_dir, _logger)
+    assert _git(repo_dir, "rev-parse", "HEAD") == new_sha
+
+    other = env.make_remote("other")
+    other_sha = env.commit(other, "README", "other")
+    sync_repository("solo", "main", repos_dir, _logger, remote_url=str(other))
+    assert _git(repo_dir, "rev-parse", "HEAD") == other_sha
+
+
+def test_mirror_lock_excludes_other_processes(tmp_path):
+    mirror_dir = tmp_path / "repo-abc.git"
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time; from pathlib import Path; from core.scm.git_repo import _mirror_lock\n"
+            "with _mirror_lock(Path(sys.argv[1])):\n    print('locked', flush=True); time.sleep(0.5)",
+            str(mirror_dir),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        start = time.monotonic()
+        with git_repo._mirror_lock(mirror_dir):
+            waited = time.monotonic() - start
+    finally:
+        holder.wait(5)
+    assert waited > 0.2
+
+
+def test_fetch_refs_of_nested_branch_names_do_not_conflict(fake_deploy_env):
+    env = fake_deploy_env
+    remote = env.make_remote("nested")
+    repos_dir = env.data_dir / "repos"
+
+    # `feature` est supprimée puis remplacée par `feature/x` : sa ref de fetch reste dans le miroir.
+    _git(remote, "branch", "feature")
+    sync_repository("a", "feature", repos_dir, _logger, remote_url=str(remote))
+    _git(remote, "branch", "-D", "feature")
+    _git(remote, "branch", "feature/x")
+    sync_repository("b", "feature/x", repos_dir, _logger, remote_url=str(remote))
+
+    names = {git_repo.fetch_ref_name(ref) for ref in ("feature", "feature/x", "a.b", "a_b")}
+    assert len(names) == 4 and all(name.count("/") == 3 for name in names)
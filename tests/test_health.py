@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.deploy.deploy_up import DeployError
+from core.deploy.health import _HttpProbe, wait_for_health
+
+LOGGER = logging.getLogger("tests.health")
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures_left = 2
+    slow_left = 0
+    connections = set()
+
+    def do_GET(self):
+        type(self).connections.add(self.client_address)
+        if self.path in ("/moved", "/away"):
+            target = "/health" if self.path == "/moved" else "http://elsewhere.invalid/health"
+            self.send_response(302)
+            self.send_header("Location", target)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/slow" and type(self).slow_left > 0:
+            type(self).slow_left -= 1
+            time.sleep(0.5)
+        status = 503 if type(self).failures_left > 0 else 200
+        type(self).failures_left -= 1
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server():
+    _FlakyHandler.failures_left = 2
+    _FlakyHandler.slow_left = 0
+    _FlakyHandler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_legacy_url_polls_fast_and_reuses_connection(flaky_server):
+    url = f"http://127.0.0.1:{flaky_server.server_port}/health"
+
+    result = wait_for_health({"url": url, "timeout": 5, "interval": 1}, LOGGER)
+
+    assert result.healthy
+    assert result.probes[0].attempts == 3
+    assert result.duration < 1.5  # cadence initiale rapide, pas 2 x interval
+    assert len(_FlakyHandler.connections) == 1  # keep-alive
+
+
+def test_all_mode_mixes_http_tcp_and_command(flaky_server):
+    health = {
+        "timeout": 5,
+        "probes": [
+            {"type": "http", "url": f"http://127.0.0.1:{flaky_server.server_port}/"},
+            {"type": "tcp", "host": "127.0.0.1", "port": flaky_server.server_port},
+            {"type": "command", "command": [sys.executable, "-c", "pass"]},
+        ],
+    }
+
+    result = wait_for_health(health, LOGGER)
+
+    assert result.healthy
+    assert all(probe.healthy for probe in result.probes)
+
+
+def test_quorum_and_any_modes_tolerate_dead_probes(flaky_server):
+    dead = {"type": "tcp", "host": "127.0.0.1", "port": _free_port()}
+    alive = {"type": "tcp", "host": "127.0.0.1", "port": flaky_server.server_port}
+
+    assert wait_for_health({"timeout": 3, "mode": "any", "probes": [dead, alive]}, LOGGER).healthy
+    assert wait_for_health({"timeout": 3, "mode": "quorum", "quorum": 2, "probes": [alive, alive, dead]}, LOGGER).healthy
+
+
+def test_http_probe_follows_same_host_redirects_only(flaky_server):
+    _FlakyHandler.failures_left = 0
+    base = f"http://127.0.0.1:{flaky_server.server_port}"
+
+    assert wait_for_health({"url": f"{base}/moved", "timeout": 5}, LOGGER).healthy
+    assert len(_FlakyHandler.connections) == 1  # redirection suivie sur la même connexion
+    assert wait_for_health({"url": f"{base}/moved", "expected_status": 302, "timeout": 5}, LOGGER).healthy
+    with pytest.raises(DeployError, match="vers un autre hôte"):
+        wait_for_health({"url": f"{base}/away", "retries": 1, "timeout": 5}, LOGGER)
+
+
+def test_http_probe_drops_connection_after_timeout(flaky_server):
+    _FlakyHandler.failures_left, _FlakyHandler.slow_left = 0, 1
+    probe = _HttpProbe(f"http://127.0.0.1:{flaky_server.server_port}/slow", 200)
+
+    async def attempts():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(probe.check(2.0), timeout=0.1)
+        # Le thread abandonné attend encore sa réponse : sa connexion n'est pas réutilisée.
+        return await probe.check(2.0)
+
+    try:
+        assert asyncio.run(attempts()) is None
+    finally:
+        probe.close()
+    assert len(_FlakyHandler.connections) == 2
+
+
+def test_cancelled_command_probe_kills_its_process(flaky_server, tmp_path):
+    # Deux échecs HTTP laissent à la commande le temps de démarrer avant d'être annulée.
+    pid_file = tmp_path / "probe.pid"
+    script = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+    sleeper = [sys.executable, "-c", script]
+    health = {
+        "mode": "any",
+        "timeout": 5,
+        "probes": [
+            {"type": "command", "command": sleeper},
+            {"type": "http", "url": f"http://127.0.0.1:{flaky_server.server_port}/health"},
+        ],
+    }
+
+    result = wait_for_health(health, LOGGER)
+
+    assert result.healthy and pid_file.exists()
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_failure_reports_reason_after_retries():
+    health = {"retries": 2, "timeout": 5, "probes": [{"type": "command", "command": "false"}]}
+
+    with pytest.raises(DeployError, match="Code retour 1"):
+        wait_for_health(health, LOGGER)
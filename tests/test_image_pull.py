@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from core.deploy import images
+from core.deploy.deploy_up import DeployError, deploy_up
+
+COMPOSE = """services:
+  web:
+    image: demo/web:1.0
+    depends_on:
+      - api
+  api:
+    image: demo/api:1.0
+  worker:
+    build: .
+"""
+
+
+def test_images_are_pulled_in_parallel_and_cached(fake_deploy_env, monkeypatch):
+    remote = fake_deploy_env.make_remote(compose=COMPOSE)
+    monkeypatch.setenv("FAKE_DOCKER_PULL_DELAY", "1.0")
+
+    first = deploy_up("app", "main", remote_url=str(remote))
+    pulls = fake_deploy_env.docker_calls("pull")
+    # `web` dépend de `api` ; `worker` est construit localement.
+    assert sorted(call[-1] for call in pulls) == ["api", "web"]
+    # En série, les deux pulls prendraient au moins 2 s.
+    assert first.stage_durations()["pull"] < 2.0
+    assert set(first.images) == {"api", "web"} and first.images["web"].startswith("demo/web@sha256:")
+    assert fake_deploy_env.store.get_run(first.run_id)["images"] == first.images
+
+    # Digests connus et images présentes : le registre n'est pas consulté.
+    second = deploy_up("app", "main", remote_url=str(remote), force=True)
+    assert len(fake_deploy_env.docker_calls("pull")) == 2
+    assert second.images == first.images
+
+    # Vérification expirée : nouveau pull, nouveau digest publié par le registre.
+    monkeypatch.setenv("IKOMA_IMAGE_CHECK_TTL", "0")
+    monkeypatch.setenv("FAKE_DOCKER_REGISTRY_REV", "2")
+    third = deploy_up("app", "main", remote_url=str(remote), force=True)
+    assert len(fake_deploy_env.docker_calls("pull")) == 4
+    assert third.images["web"] != first.images["web"]
+
+
+def test_docker_queries_pick_the_image_repository_digest_and_time_out(tmp_path, monkeypatch):
+    docker = tmp_path / "bin" / "docker"
+    docker.parent.mkdir()
+    docker.write_text(
+        "#!/bin/sh\n"
+        'if [ "$1" = compose ]; then sleep 5; fi\n'
+        'echo \'["mirror.example.com/nginx@sha256:aaa", "nginx@sha256:bbb"]\'\n'
+    )
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{docker.parent}:{os.environ['PATH']}")
+    monkeypatch.setattr(images, "DOCKER_QUERY_TIMEOUT", 0.5)
+
+    assert images.local_digest("docker.io/library/nginx:1.27", tmp_path) == "sha256:bbb"
+    assert images.local_digest("mirror.example.com/nginx:1.27", tmp_path) == "sha256:aaa"
+    assert images.local_digest("nginx@sha256:aaa", tmp_path) is None
+    with pytest.raises(DeployError, match="expirée"):
+        images.compose_config(tmp_path, content=b"services: {}")
@@ -0,0 +1,146 @@
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from core.pipelines.workers import DEFAULT_HISTORY_KEEP, WorkerPool, history_retention_payload
+from core.store.job_store import JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobStore, process_owner
+
+
+def _store(tmp_path):
+    store = JobStore(tmp_path / "ikoma.db")
+    store.ensure_schema()
+    return store
+
+
+def test_enqueue_deduplicates_pending_jobs(tmp_path):
+    store = _store(tmp_path)
+
+    first, created_first = store.enqueue("deploy", "app-a", {"ref": "main"})
+    second, created_second = store.enqueue("deploy", "app-a", {"ref": "main"})
+    other, created_other = store.enqueue("deploy", "app-a", {"ref": "v2"})
+
+    assert created_first and not created_second and created_other
+    assert first.id == second.id
+    assert other.id != first.id
+
+
+def test_claim_serializes_jobs_per_app(tmp_path):
+    store = _store(tmp_path)
+    a1, _ = store.enqueue("deploy", "app-a", {"ref": "main"})
+    a2, _ = store.enqueue("sync", "app-a", {"ref": "main"})
+    b1, _ = store.enqueue("deploy", "app-b", {"ref": "main"})
+
+    assert store.claim_next().id == a1.id
+    # app-a est occupée : le job suivant réclamable est celui de app-b.
+    assert store.claim_next().id == b1.id
+    assert store.claim_next() is None
+
+    store.finish(a1.id, JOB_SUCCEEDED)
+    assert store.claim_next().id == a2.id
+
+
+def test_only_abandoned_running_jobs_are_requeued(tmp_path):
+    store = _store(tmp_path)
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    host = socket.gethostname()
+    crashed, _ = store.enqueue("deploy", "app-a", {"ref": "main"})
+    live, _ = store.enqueue("deploy", "app-b", {"ref": "main"})
+    assert store.claim_next(f"{host}:{dead.pid}:pool").status == JOB_RUNNING
+    # Job en cours dans un autre processus vivant (ex. le Runner pendant que l'API démarre).
+    assert store.claim_next(f"{host}:{os.getppid()}:pool", lease=60).status == JOB_RUNNING
+
+    restarted = JobStore(tmp_path / "ikoma.db")
+    assert restarted.requeue_interrupted() == 1
+    assert restarted.get(crashed.id).status == JOB_QUEUED
+    assert restarted.get(live.id).status == JOB_RUNNING
+
+    # Sans heartbeat, le bail finit par expirer.
+    assert restarted.renew_leases(f"{host}:{os.getppid()}:pool", lease=60) == 1
+    assert restarted.requeue_interrupted(now=time.time() + 61) == 1
+    assert restarted.get(live.id).status == JOB_QUEUED
+
+
+def test_jobs_of_a_previous_instance_with_the_same_pid_are_requeued(tmp_path):
+    store = _store(tmp_path)
+    previous, _ = store.enqueue("deploy", "app-a", {"ref": "main"})
+    current, _ = store.enqueue("deploy", "app-b", {"ref": "main"})
+    # Conteneur redémarré : même hôte, même pid (1), autre instance.
+    store.claim_next(f"{socket.gethostname()}:{os.getpid()}:0123456789ab:pool", lease=60)
+    store.claim_next(process_owner("pool"), lease=60)
+
+    assert store.requeue_interrupted() == 1
+    assert store.get(previous.id).status == JOB_QUEUED
+    assert store.get(current.id).status == JOB_RUNNING
+
+
+def test_invalid_retention_settings_fall_back_to_defaults(monkeypatch):
+    monkeypatch.setenv("IKOMA_HISTORY_KEEP", "deux-cents")
+    monkeypatch.setenv("IKOMA_HISTORY_MAX_AGE_DAYS", "30")
+
+    assert history_retention_payload() == {"keep_per_app": DEFAULT_HISTORY_KEEP, "max_age_days": 30.0}
+
+
+def test_worker_pool_bounds_concurrency(tmp_path):
+    store = _store(tmp_path)
+    lock = threading.Lock()
+    active = {"now": 0, "max": 0}
+
+    def handler(job):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return "ok"
+
+    pool = WorkerPool(store, {"deploy": handler}, size=2, poll_interval=0.01)
+    jobs = [pool.submit("deploy", f"app-{i}", {"ref": "main"})[0] for i in range(6)]
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if all(store.get(job.id).status == JOB_SUCCEEDED for job in jobs):
+                break
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+
+    assert all(store.get(job.id).status == JOB_SUCCEEDED for job in jobs)
+    assert active["max"] <= 2
+
+
+def test_worker_survives_queue_errors(tmp_path):
+    class FlakyStore(JobStore):
+        errors = {"claim_next": 2, "finish": 1}
+
+        def _flaky(self, name):
+            if self.errors[name]:
+                self.errors[name] -= 1
+                raise RuntimeError(f"{name}: database is locked")
+
+        def claim_next(self, *args, **kwargs):
+            self._flaky("claim_next")
+            return super().claim_next(*args, **kwargs)
+
+        def finish(self, *args, **kwargs):
+            self._flaky("finish")
+            return super().finish(*args, **kwargs)
+
+    store = FlakyStore(tmp_path / "ikoma.db")
+    store.ensure_schema()
+    pool = WorkerPool(store, {"deploy": lambda job: "ok"}, size=1, poll_interval=0.01)
+    job, _ = pool.submit("deploy", "app", {"ref": "main"})
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline and store.get(job.id).status != JOB_SUCCEEDED:
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+
+    assert store.get(job.id).status == JOB_SUCCEEDED
+    assert store.errors == {"claim_next": 0, "finish": 0}
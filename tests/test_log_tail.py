@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+from runner.log_tail import follow, read_from, read_tail
+
+
+def test_read_from_resumes_on_line_and_character_boundaries(tmp_path):
+    path = tmp_path / "deploy.log"
+    path.write_bytes(b"one\ntwo\nthr")
+    first = read_from(path, 0)
+    assert (first.text, first.end) == ("one\ntwo\n", 8)
+    assert read_from(path, first.end).text == ""  # ligne en cours d'écriture
+
+    with path.open("ab") as handle:
+        handle.write(b"ee\n")
+    assert read_from(path, first.end).text == "three\n"
+
+    # Ligne plus longue qu'un bloc : aucun caractère multi-octets n'est coupé.
+    line = "é€𝄞" * 50 + "\n"
+    path.write_text(line, encoding="utf-8")
+    offset, parts = 0, []
+    while offset < path.stat().st_size:
+        chunk = read_from(path, offset, limit=7)
+        assert "�" not in chunk.text
+        parts.append(chunk.text)
+        offset = chunk.end
+    assert "".join(parts) == line
+
+    tail = read_tail(path, limit=10)
+    assert "�" not in tail.text and line.endswith(tail.text)
+
+
+def test_read_from_restarts_after_truncation(tmp_path):
+    path = tmp_path / "deploy.log"
+    path.write_text("a long first line\n")
+    end = read_from(path, 0).end
+    path.write_text("new\n")
+    chunk = read_from(path, end)
+    assert (chunk.text, chunk.start, chunk.end) == ("new\n", 0, 4)
+
+
+def test_follow_streams_sse_events_across_rotation(tmp_path):
+    path = tmp_path / "deploy.log"
+    path.write_text("old 1\nold 2\n")
+
+    async def collect():
+        events = []
+
+        async def disconnected():
+            return len(events) >= 2
+
+        async for event in follow(path, 6, disconnected, poll_interval=0.01):
+            if event.startswith(":"):
+                continue
+            events.append(event)
+            if len(events) == 1:
+                # Rotation : le log est remplacé par un nouveau fichier plus long que l'offset.
+                rotated = tmp_path / "deploy.log.new"
+                rotated.write_text("new 1 after rotation\n")
+                os.replace(rotated, path)
+        return events
+
+    events = asyncio.run(collect())
+    assert events == [
+        "id: 12\nevent: log\ndata: old 2\n\n",
+        "id: 21\nevent: log\ndata: new 1 after rotation\n\n",
+    ]
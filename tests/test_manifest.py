@@ -0,0 +1,51 @@
+import dataclasses
+import json
+
+import pytest
+
+from core.deploy import manifest
+from core.deploy.manifest import ManifestError, parse_release_manifest
+
+
+def test_schema_reports_every_error_with_its_path():
+    payload = {
+        "services": ["web", ""],
+        "health": {
+            "probes": [{"type": "http", "url": "http://x"}, {"type": "tcp", "port": "80"}, {"type": "dns"}],
+            "mode": "quorum",
+            "quorum": 4,
+            "jitter": 1.5,
+            "timeout": True,
+        },
+        "blue_green": {"ports": {"blue": 8081, "green": 8081}, "upstream_file": "upstream.conf"},
+    }
+    with pytest.raises(ManifestError) as excinfo:
+        parse_release_manifest(json.dumps(payload).encode())
+
+    assert dict(excinfo.value.errors) == {
+        "services[1]": "doit être une chaîne non vide",
+        "health.probes[1].port": "doit être un entier",
+        "health.probes[2].type": "doit valoir http, tcp, command",
+        "health.quorum": "doit être compris entre 1 et 3",
+        "health.jitter": "doit être strictement inférieur à 1",
+        "health.timeout": "doit être un nombre",
+        "blue_green.ports": "blue et green doivent utiliser deux ports distincts",
+        "blue_green.upstream_file": "doit être un chemin absolu",
+    }
+
+
+def test_valid_manifest_is_frozen_and_cached_by_content(tmp_path):
+    manifest.clear_cache()
+    raw = json.dumps({"compose": "stack.yml", "services": ["web"], "health": {"url": "http://x/health"}}).encode()
+
+    first = parse_release_manifest(raw)
+    assert parse_release_manifest(raw) is first
+    assert parse_release_manifest(raw + b"\n") is not first
+
+    release = first.release_config(tmp_path)
+    assert release.compose_file == tmp_path / "stack.yml"
+    assert release.services == ("web",)
+    with pytest.raises(TypeError):
+        release.health["url"] = "http://y"  # type: ignore[index]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        release.services = ()  # type: ignore[misc]
@@ -0,0 +1,41 @@
+import re
+
+from core.deploy.deploy_up import deploy_up
+from core.logging.metrics import REGISTRY, Registry
+
+
+def _value(text: str, sample: str) -> float:
+    match = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Démo.", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.labels("compose").observe(value)
+    registry.counter("demo_failures", "Échecs.").inc()
+
+    text = registry.render()
+    assert 'demo_seconds_bucket{stage="compose",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="compose",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="compose",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="compose"} 3' in text
+    assert "# TYPE demo_failures_total counter\ndemo_failures_total 1" in text
+
+
+def test_deploy_records_stage_command_and_health_metrics(fake_deploy_env):
+    before = REGISTRY.render()
+    deploy_up("app", "main", remote_url=str(fake_deploy_env.make_remote()))
+    after = REGISTRY.render()
+
+    for sample in (
+        'ikoma_deploy_stage_seconds_count{stage="compose"}',
+        'ikoma_deploy_duration_seconds_count{status="HEALTHY"}',
+        'ikoma_command_duration_seconds_count{command="docker compose"}',
+        'ikoma_health_attempts_count{probe="http",result="ok"}',
+        'ikoma_git_sync_seconds_count{result="ok"}',
+        "ikoma_git_fetch_bytes_count",
+    ):
+        assert _value(after, sample) > _value(before, sample), sample
+    assert _value(after, "ikoma_git_fetch_bytes_sum") > _value(before, "ikoma_git_fetch_bytes_sum")
@@ -0,0 +1,52 @@
+import json
+
+from core.deploy.deploy_up import deploy_up
+
+COMPOSE = """services:
+  db:
+    image: postgres:{db}
+  api:
+    image: api:1
+    depends_on:
+      - db
+  web:
+    image: web:{web}
+"""
+
+
+def _manifest(probe_log):
+    probes = [
+        {"type": "command", "service": name, "command": ["sh", "-c", f"echo {name} >> {probe_log}"]}
+        for name in ("db", "api", "web")
+    ]
+    return json.dumps({"compose": "docker-compose.yml", "health": {"probes": probes, "timeout": 5}})
+
+
+def test_only_changed_services_and_their_dependents_are_redeployed(fake_deploy_env, tmp_path):
+    probe_log = tmp_path / "probes.log"
+    remote = fake_deploy_env.make_remote(compose=COMPOSE.format(db=16, web=1))
+    fake_deploy_env.commit(remote, "ikoma.release.json", _manifest(probe_log))
+
+    def deploy(**kwargs):
+        probe_log.write_text("")
+        report = deploy_up("app", "main", remote_url=str(remote), **kwargs)
+        up = fake_deploy_env.docker_calls("up")[-1]
+        return report, up[up.index("up") + 1 :], sorted(probe_log.read_text().split())
+
+    report, _, probed = deploy()
+    assert report.updated_services is None and probed == ["api", "db", "web"]
+
+    fake_deploy_env.commit(remote, "docker-compose.yml", COMPOSE.format(db=16, web=2))
+    report, args, probed = deploy()
+    assert report.updated_services == ["web"] and args[-1] == "web" and "api" not in args
+    assert probed == ["web"]
+
+    # `api` dépend de `db` : il est relancé avec lui.
+    fake_deploy_env.commit(remote, "docker-compose.yml", COMPOSE.format(db=17, web=2))
+    report, args, probed = deploy()
+    assert report.updated_services == ["api", "db"] and args[-2:] == ["api", "db"]
+    assert probed == ["api", "db"]
+    assert fake_deploy_env.store.get_run(report.run_id)["service_hashes"].keys() == {"api", "db", "web"}
+
+    report, _, probed = deploy(force=True)
+    assert report.updated_services is None and probed == ["api", "db", "web"]
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from core.deploy.deploy_up import DeployError, DeployReport, PreparedRelease
+from core.pipelines.engine import APP_FAILED, APP_HEALTHY, APP_SKIPPED, PipelineApp, run_pipeline
+
+
+class FakePhases:
+    """Phases factices : durées fixes et trace de l'ordre d'exécution."""
+
+    def __init__(self, delay=0.05, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.events = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def _enter(self, label):
+        with self.lock:
+            self.events.append(label)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+
+    def prepare(self, app_id, ref, *, remote_url=None, report=None):
+        self._enter(f"prepare:{app_id}")
+        return PreparedRelease(app_id, ref, Path("."), None, report or DeployReport(app_id, ref), None)
+
+    def apply(self, prepared):
+        self._enter(f"apply:{prepared.app_id}")
+        if prepared.app_id in self.failing:
+            raise DeployError(f"{prepared.app_id} KO")
+        prepared.report.status = "HEALTHY"
+        return prepared.report
+
+
+def _run(apps, phases, **kwargs):
+    return run_pipeline(apps, prepare=phases.prepare, apply=phases.apply, **kwargs)
+
+
+def test_dependencies_apply_in_order_and_prepare_in_parallel():
+    phases = FakePhases()
+    apps = [
+        PipelineApp("frontend", "main", depends_on=["backend"]),
+        PipelineApp("backend", "main"),
+        PipelineApp("worker", "main"),
+    ]
+
+    report = _run(apps, phases, max_parallel=3)
+
+    assert report.succeeded
+    assert phases.events.index("apply:backend") < phases.events.index("apply:frontend")
+    # Les trois préparations démarrent avant tout `apply`.
+    assert all(event.startswith("prepare") for event in phases.events[:3])
+    assert report.critical_path_apps == ["backend", "frontend"]
+    assert report.critical_path <= report.wall_clock + 0.01
+
+
+def test_concurrency_cap_is_respected():
+    phases = FakePhases(delay=0.02)
+    apps = [PipelineApp(f"app-{i}", "main") for i in range(8)]
+
+    report = _run(apps, phases, max_parallel=2)
+
+    assert report.succeeded
+    assert phases.max_active <= 2
+
+
+def test_continue_on_error_skips_only_dependents():
+    phases = FakePhases(failing={"backend"})
+    apps = [
+        PipelineApp("backend", "main"),
+        PipelineApp("frontend", "main", depends_on=["backend"]),
+        PipelineApp("worker", "main"),
+    ]
+
+    report = _run(apps, phases, fail_fast=False)
+
+    assert report.outcomes["backend"].status == APP_FAILED
+    assert report.outcomes["frontend"].status == APP_SKIPPED
+    assert report.outcomes["worker"].status == APP_HEALTHY
+
+
+def test_cycles_are_rejected():
+    apps = [PipelineApp("a", "main", depends_on=["b"]), PipelineApp("b", "main", depends_on=["a"])]
+    with pytest.raises(DeployError):
+        run_pipeline(apps)
+
+
+def test_duplicate_app_ids_are_rejected():
+    apps = [PipelineApp("api", "main"), PipelineApp("web", "main"), PipelineApp("api", "v2", depends_on=["web"])]
+    phases = FakePhases()
+    with pytest.raises(DeployError, match="deux fois.*api"):
+        _run(apps, phases)
+    assert phases.events == []
+
+
+def test_prepared_app_skipped_after_upstream_failure_closes_its_run(fake_deploy_env):
+    backend = fake_deploy_env.make_remote("backend")
+    frontend = fake_deploy_env.make_remote("frontend")
+    manifest = {"compose": "docker-compose.yml", "services": ["web"], "health": {"url": "http://127.0.0.1:1/", "timeout": 1}}
+    fake_deploy_env.commit(backend, "ikoma.release.json", json.dumps(manifest))
+
+    report = run_pipeline(
+        [
+            PipelineApp("backend", "main", remote_url=str(backend)),
+            PipelineApp("frontend", "main", depends_on=["backend"], remote_url=str(frontend)),
+        ],
+        fail_fast=False,
+    )
+
+    assert {app_id: outcome.status for app_id, outcome in report.outcomes.items()} == {
+        "backend": APP_FAILED,
+        "frontend": APP_SKIPPED,
+    }
+    [run] = fake_deploy_env.store.list_runs("frontend")
+    assert run["status"] == "SKIPPED" and "backend" in run["exit_reason"]
+    events = (fake_deploy_env.data_dir / "logs" / "frontend" / "events" / f"run-{run['run_id']}.jsonl").read_text()
+    assert '"run_end"' in events and '"SKIPPED"' in events
+    assert not fake_deploy_env.docker_calls("frontend", "up")
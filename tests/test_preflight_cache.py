@@ -0,0 +1,29 @@
+import os
+import shutil
+
+from core.deploy.deploy_up import deploy_up
+
+
+def test_docker_probe_is_cached_until_the_binary_changes(fake_deploy_env, monkeypatch, tmp_path):
+    # Copie du faux binaire : on peut toucher son mtime sans modifier la fixture.
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    docker = bin_dir / "docker"
+    shutil.copy2(fake_deploy_env.fake_docker, docker)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    remote = fake_deploy_env.make_remote()
+
+    deploy_up("app", "main", remote_url=str(remote))
+    assert len(fake_deploy_env.docker_calls("--version")) == 1
+    assert fake_deploy_env.docker_calls("up")[-1][-4:] == ["--wait", "--wait-timeout", "5", "web"]
+
+    deploy_up("app", "main", remote_url=str(remote), force=True)
+    assert len(fake_deploy_env.docker_calls("--version")) == 1
+
+    # Nouveau binaire (Compose trop ancien pour `--wait`) : la sonde est rejouée.
+    monkeypatch.setenv("FAKE_DOCKER_COMPOSE_VERSION", "2.0.3")
+    stat = docker.stat()
+    os.utime(docker, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    deploy_up("app", "main", remote_url=str(remote), force=True)
+    assert len(fake_deploy_env.docker_calls("--version")) == 2
+    assert "--wait" not in fake_deploy_env.docker_calls("up")[-1]
@@ -0,0 +1,71 @@
+import subprocess
+
+from core.scm import git_repo
+from core.store.job_store import JobStore
+from runner.config_store import AppConfig, AppConfigStore
+from runner.ref_watcher import RefWatcher
+
+
+def _git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(repo, message):
+    _git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", message)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+def _remote(path):
+    path.mkdir(parents=True)
+    _git(path, "init", "-q", "-b", "main")
+    _commit(path, "init")
+    _git(path, "branch", "staging")
+    return path
+
+
+def test_watcher_batches_ls_remote_per_remote_and_deploys_new_commits(tmp_path, monkeypatch):
+    db_path = tmp_path / "ikoma.db"
+    mono, other = _remote(tmp_path / "mono"), _remote(tmp_path / "other")
+    configs = AppConfigStore(db_path)
+    configs.upsert(AppConfig(app_id="api", repo_git_url=str(mono)))
+    configs.upsert(AppConfig(app_id="api-staging", repo_git_url=str(mono), branch="staging"))
+    configs.upsert(AppConfig(app_id="web", repo_git_url=str(other)))
+
+    calls = []
+    ls_remote = git_repo.ls_remote_heads
+    monkeypatch.setattr(git_repo, "ls_remote_heads", lambda url, branches: calls.append(url) or ls_remote(url, branches))
+    watcher = RefWatcher(db_path, min_interval=10, max_interval=40, jitter=0)
+    jobs = JobStore(db_path)
+
+    # Premier passage : SHA de référence relevés, un ls-remote par remote, aucun déploiement.
+    baseline = watcher.scan_once(now=1000)
+    assert (baseline.remotes, baseline.checked, baseline.triggered) == (2, 3, [])
+    assert sorted(calls) == sorted([str(mono), str(other)])
+    assert watcher.scan_once(now=1001).checked == 0
+
+    new_sha = _commit(mono, "feature")
+    calls.clear()
+    report = watcher.scan_once(now=1100)
+    assert report.triggered == [("api", new_sha)] and calls.count(str(mono)) == 1
+    [job] = jobs.list_jobs()
+    assert (job.app_id, job.payload["ref"], job.payload["commit"]) == ("api", "main", new_sha)
+
+    # Intervalle adaptatif : ramené au minimum par le commit, allongé pour les branches calmes.
+    assert watcher.state.get("api").interval == 10
+    assert watcher.state.get("web").interval == 22.5
+
+    # L'état est persisté : un nouveau Runner ne redéclenche rien.
+    restarted = RefWatcher(db_path, min_interval=10, max_interval=40, jitter=0)
+    assert restarted.scan_once(now=2000).triggered == []
+
+    # Une branche changée repart d'une référence, sans déploiement.
+    configs.upsert(AppConfig(app_id="web", repo_git_url=str(other), branch="staging"))
+    assert restarted.scan_once(now=3000).triggered == [] and restarted.state.get("web").branch == "staging"
+    assert len(jobs.list_jobs()) == 1
+
+
+def test_invalid_interval_settings_fall_back_to_defaults(tmp_path, monkeypatch):
+    monkeypatch.setenv("IKOMA_REF_WATCH_MIN_INTERVAL", "1m")
+    monkeypatch.setenv("IKOMA_REF_WATCH_PARALLELISM", "huit")
+    watcher = RefWatcher(tmp_path / "ikoma.db")
+    assert watcher.min_interval == 60.0 and watcher.parallelism == 8
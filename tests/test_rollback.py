@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from core.deploy.deploy_up import DeployError, deploy_up, rollback_release
+
+
+def test_rollback_restores_commit_and_pinned_digests_without_network(fake_deploy_env, monkeypatch):
+    remote = fake_deploy_env.make_remote()
+    first = deploy_up("app", "main", remote_url=str(remote))
+
+    fake_deploy_env.commit(remote, "README.md", "v2")
+    monkeypatch.setenv("IKOMA_IMAGE_CHECK_TTL", "0")
+    monkeypatch.setenv("FAKE_DOCKER_REGISTRY_REV", "2")
+    second = deploy_up("app", "main", remote_url=str(remote))
+    assert second.commit_sha != first.commit_sha and second.images != first.images
+
+    # Remote supprimé : le rollback ne doit rien télécharger.
+    shutil.rmtree(remote)
+    report = rollback_release("app", reason="régression")
+    assert report.status == "HEALTHY"
+    assert report.commit_sha == first.commit_sha and report.images == first.images
+    assert not {"git_sync", "pull"} & set(report.stage_durations())
+
+    up = fake_deploy_env.docker_calls("up")[-1]
+    assert "--no-build" in up and up.count("-f") == 2
+    state = json.loads(Path(os.environ["FAKE_DOCKER_STATE"]).read_text())
+    assert state["_containers"]["app"]["web"] == first.images["web"]
+    assert fake_deploy_env.store.get_deployment("app")["message"].startswith(f"Rollback vers le run #{first.run_id}")
+
+    with pytest.raises(DeployError):
+        rollback_release("app", to_run_id=9999)
+
+
+def test_service_rollback_rejects_a_ref_as_release_id():
+    from core.services.deploy import DeployContext, rollback
+
+    with pytest.raises(DeployError, match="numéro de run"):
+        rollback(DeployContext(environment="prod", service="app", release_id="main"))
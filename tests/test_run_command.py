@@ -0,0 +1,83 @@
+import logging
+import sqlite3
+import sys
+import time
+
+import pytest
+
+from core.deploy.deploy_up import DeployError
+from core.logging import logger as logger_module
+from core.logging.logger import build_logger, run_command, subscribe_output, unsubscribe_output
+from core.store.sqlite_store import DeploymentState
+
+
+@pytest.fixture
+def command_store(tmp_path, monkeypatch):
+    store = DeploymentState(tmp_path / "ikoma.db")
+    store.ensure_schema()
+    monkeypatch.setattr(logger_module, "_COMMAND_STORE", store)
+    return store
+
+
+def test_output_is_streamed_capped_and_timed(tmp_path, command_store):
+    logger = build_logger("stream-app", tmp_path / "logs")
+    subscriber = subscribe_output("stream-app")
+    script = "for i in range(2000): print('line', i, 'x' * 50)"
+    try:
+        result = run_command([sys.executable, "-c", script], logger=logger, max_output_bytes=4096)
+    finally:
+        unsubscribe_output("stream-app", subscriber)
+
+    assert result.returncode == 0
+    assert result.truncated
+    assert result.output.startswith("line 0 ")
+    assert result.output.rstrip().endswith("line 1999 " + "x" * 50)
+    assert len(result.output) < 5000
+    assert subscriber.qsize() == 1000  # file bornée, les lignes en trop sont abandonnées
+    assert "line 1999" in (tmp_path / "logs" / "stream-app" / "deploy.log").read_text(encoding="utf-8")
+
+    with sqlite3.connect(command_store.db_path) as conn:
+        row = conn.execute("SELECT app_id, returncode, output_bytes FROM command_runs").fetchone()
+    assert row[0] == "stream-app" and row[1] == 0 and row[2] == result.output_bytes
+
+
+def test_output_cap_holds_without_newlines(command_store):
+    script = "import sys; sys.stdout.write('x' * 2_000_000 + 'END')"
+    logger = logging.getLogger("tests.run_command")
+    result = run_command([sys.executable, "-c", script], logger=logger, max_output_bytes=4096)
+
+    assert result.truncated and result.output_bytes == 2_000_003
+    assert len(result.output) < 5000 and result.output.endswith("END")
+
+
+def test_timeout_kills_the_whole_process_group(command_store):
+    logger = logging.getLogger("tests.run_command")
+    # Le petit-fils hérite du groupe : il doit être tué avec le parent.
+    script = (
+        "import subprocess, sys, time; "
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); time.sleep(30)"
+    )
+
+    start = time.monotonic()
+    with pytest.raises(DeployError, match="expirée"):
+        run_command([sys.executable, "-c", script], logger=logger, timeout=0.5)
+
+    assert time.monotonic() - start < 5
+
+
+def test_timeout_kills_descendants_that_ignore_sigterm(command_store, monkeypatch):
+    monkeypatch.setattr(logger_module, "KILL_GRACE_PERIOD", 0.5)
+    # Le leader meurt au SIGTERM, mais le petit-fils l'ignore en gardant stdout ouvert.
+    grandchild = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"
+    script = f"import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', {grandchild!r}]); time.sleep(30)"
+
+    start = time.monotonic()
+    with pytest.raises(DeployError, match="expirée"):
+        run_command([sys.executable, "-c", script], logger=logging.getLogger("tests.run_command"), timeout=0.5)
+
+    assert time.monotonic() - start < 5
+
+
+def test_non_zero_exit_raises(command_store):
+    with pytest.raises(DeployError, match=r"Commande échouée \(3\)"):
+        run_command([sys.executable, "-c", "raise SystemExit(3)"], logger=logging.getLogger("tests.run_command"))
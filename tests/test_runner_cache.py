@@ -0,0 +1,31 @@
+from core.store.db import Database
+from core.store.sqlite_store import DeploymentState
+from runner.config_store import AppConfig, AppConfigStore
+from runner.data import VersionedCache
+
+
+def test_overview_cache_is_invalidated_by_writes_from_any_connection(tmp_path):
+    db_path = tmp_path / "ikoma.db"
+    store = AppConfigStore(db_path)
+    store.ensure_schema()
+    store.upsert(AppConfig(app_id="app", repo_git_url="https://git.example.com/app.git"))
+    cache = VersionedCache(store.list_version)
+    calls = []
+
+    def overview():
+        calls.append(1)
+        return store.list_with_deployments()
+
+    configs, deployments = cache.get("overview", overview)
+    assert [config.app_id for config in configs] == ["app"] and deployments == {}
+    assert cache.get("overview", overview)[0] is configs and len(calls) == 1
+
+    DeploymentState(db_path).upsert_status("app", "main", "HEALTHY", "ok")
+    assert cache.get("overview", overview)[1]["app"]["status"] == "HEALTHY" and len(calls) == 2
+
+    # Écriture par un autre processus (autre connexion) : le trigger incrémente aussi le compteur.
+    other = Database(db_path)
+    with other.transaction() as conn:
+        conn.execute("UPDATE app_configs SET branch = 'prod' WHERE app_id = 'app'")
+    other.close()
+    assert cache.get("overview", overview)[0][0].branch == "prod" and len(calls) == 3